@@ -1,17 +1,112 @@
 # pip install flask peewee bcrypt wtforms waitress
 import os
-from datetime import datetime
+import atexit
+import hmac
+import json
+import mimetypes
+import re
+import threading
+from datetime import datetime, timedelta
 from functools import wraps
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory
 from peewee import *
-from bcrypt import hashpw, gensalt, checkpw
 from wtforms import Form, StringField, PasswordField, validators
+import click
+from archive import MONTH_PATTERN, ArchiveReader, ScoreArchiver, incremental_vacuum
+from database import create_database
+from export import FORMATS, ExportError, encode, gzip_chunks
+from leaderboard import LeaderboardCache
+from leaderboard_stream import LeaderboardBroadcaster, TooManySubscribers
+from markupsafe import Markup
+from metrics import Metrics, SlowRequestProfiler
+from page_cache import PageCache
+from passwords import POOL_ERRORS, PasswordHasher
+from periods import PERIODS, period_start, previous_start
+from rank_index import RankIndex
+from replay_format import decode_replay, encode_replay
+from replay_verifier import ReplayJob, ReplayVerifier, parse_replay, simulate_batch
+from score_writer import ScoreWriter, WriterBusy
+from static.physics import ReplayError
 
 # --- 1. 資料庫與模型配置 ---
-DB_PATH = 'database.db'
-db = SqliteDatabase(DB_PATH)
+DB_PATH = os.environ.get('DB_PATH', 'database.db')
+# 每條連線套用的 pragmas (歸檔作業的專用連線也使用同一組設定)
+DB_PRAGMAS = dict(
+    journal_mode=os.environ.get('DB_JOURNAL_MODE', 'wal'),
+    synchronous=os.environ.get('DB_SYNCHRONOUS', 'normal'),
+    cache_size=int(os.environ.get('DB_CACHE_SIZE', -16000)),
+    mmap_size=int(os.environ.get('DB_MMAP_SIZE', 256 * 1024 * 1024)),
+    auto_vacuum=os.environ.get('DB_AUTO_VACUUM', 'incremental'),
+)
+# DB_POOL=0 時改用每個請求各自開關的單一連線
+db = create_database(
+    DB_PATH,
+    pooled=os.environ.get('DB_POOL', '1') == '1',
+    max_connections=int(os.environ.get('DB_MAX_CONNECTIONS', 16)),
+    stale_timeout=int(os.environ.get('DB_STALE_TIMEOUT', 300)),
+    **DB_PRAGMAS,
+)
 # 請務必設置一個安全的 SECRET_KEY
 SECRET_KEY = os.environ.get('SECRET_KEY', 'a_very_secret_and_long_key_for_flask_session_security')
+# bcrypt 設定：cost factor、行程池大小 (0 代表在請求執行緒內計算) 與排隊上限
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', os.cpu_count() or 1))
+BCRYPT_MAX_PENDING = int(os.environ.get('BCRYPT_MAX_PENDING', 0)) or None
+# 英雄榜快取：保留的名次數與過期秒數 (<= 0 代表不過期)
+LEADERBOARD_SIZE = int(os.environ.get('LEADERBOARD_SIZE', 10))
+LEADERBOARD_TTL = float(os.environ.get('LEADERBOARD_TTL', 300))
+# waitress 的請求執行緒數 (server.py)
+WAITRESS_THREADS = int(os.environ.get('WAITRESS_THREADS', 8))
+# 即時英雄榜 (SSE)：每個連線會佔住一個 waitress 執行緒，上限最多為執行緒數減一 (預設一半)，額滿時回 503 請客戶端改用輪詢
+STREAM_MAX_CLIENTS = min(int(os.environ.get('STREAM_MAX_CLIENTS', max(WAITRESS_THREADS // 2, 1))),
+                         max(WAITRESS_THREADS - 1, 1))
+# 額滿時建議客戶端輪詢 /api/leaderboard/all 的間隔 (Retry-After)
+STREAM_POLL_SECONDS = int(os.environ.get('STREAM_POLL_SECONDS', 30))
+STREAM_HEARTBEAT = float(os.environ.get('STREAM_HEARTBEAT', 15))
+# 日榜 / 週榜結算時保留的名次數
+PERIOD_RESULT_SIZE = int(os.environ.get('PERIOD_RESULT_SIZE', 100))
+# 分數寫入模式：sync 為每次請求各自寫入；behind 為排入佇列後由單一執行緒批次寫入
+SCORE_WRITE_MODE = os.environ.get('SCORE_WRITE_MODE', 'sync')
+SCORE_BATCH_SIZE = int(os.environ.get('SCORE_BATCH_SIZE', 200))
+SCORE_FLUSH_MS = float(os.environ.get('SCORE_FLUSH_MS', 50))
+# 重播驗證：REQUIRE_REPLAY=0 時仍接受沒有附上重播的舊版客戶端分數
+REQUIRE_REPLAY = os.environ.get('REQUIRE_REPLAY', '1') == '1'
+REPLAY_BATCH_SIZE = int(os.environ.get('REPLAY_BATCH_SIZE', 256))
+REPLAY_FLUSH_MS = float(os.environ.get('REPLAY_FLUSH_MS', 100))
+# /submit_scores 單次請求最多接受的分數筆數
+SUBMIT_BATCH_MAX = int(os.environ.get('SUBMIT_BATCH_MAX', 50))
+# 冪等鍵保留天數，須長於客戶端離線佇列可能重送的時間；每日結算與 archive-scores 時清除更舊的鍵
+SUBMISSION_KEEP_DAYS = int(os.environ.get('SUBMISSION_KEEP_DAYS', 30))
+# 管理功能 (資料匯出、/metrics 與重播統計)：ADMIN_USERS 為逗號分隔的使用者名稱；EXPORT_TOKEN 供腳本與 Prometheus 以 Authorization: Bearer 存取
+ADMIN_USERS = frozenset(name.strip() for name in os.environ.get('ADMIN_USERS', '').split(',') if name.strip())
+EXPORT_TOKEN = os.environ.get('EXPORT_TOKEN', '')
+# 匯出每批讀取的列數
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 5000))
+# 增量匯出只到 EXPORT_SETTLE_SECONDS 秒以前，且不晚於本行程寫入佇列 / 重播驗證中最早的待寫入分數；
+# 這段時間要涵蓋時間戳產生到提交的最長延遲：同步寫入等連線池 (10 秒) 加上 busy_timeout (5 秒)，
+# 以及 CLI 匯出時看不到的伺服器行程佇列 (寫入佇列與重播驗證通常在 1 秒內完成)
+EXPORT_SETTLE_SECONDS = float(os.environ.get('EXPORT_SETTLE_SECONDS', 30))
+# 分數歸檔 (flask --app app archive-scores)：超過 ARCHIVE_AFTER_DAYS 天的分數搬到 ARCHIVE_DIR 下每月一個的 SQLite 檔
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', 'archive')
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 5000))
+# 歸檔後每次 incremental_vacuum 釋放的頁數 (每次只短暫持有寫入鎖)
+ARCHIVE_VACUUM_PAGES = int(os.environ.get('ARCHIVE_VACUUM_PAGES', 1000))
+# 效能指標 (/metrics)：寫入語句超過 SQLITE_BUSY_MS 毫秒視為曾等待寫入鎖
+SQLITE_BUSY_MS = float(os.environ.get('SQLITE_BUSY_MS', 5))
+# 取樣分析器 (預設關閉)：保留最慢的 PROFILE_KEEP 個請求的呼叫堆疊 (/metrics/slow)
+METRICS_PROFILE = os.environ.get('METRICS_PROFILE', '0') == '1'
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 20))
+
+profiler = SlowRequestProfiler(interval=PROFILE_INTERVAL_MS / 1000, keep=PROFILE_KEEP) if METRICS_PROFILE else None
+metrics = Metrics(busy_threshold_ms=SQLITE_BUSY_MS, profiler=profiler)
+metrics.instrument_db(db)
+
+# bcrypt worker 由 server.py / asgi.py 啟動服務前建立，import app 本身 (flask CLI 等) 不會建立行程池
+password_hasher = PasswordHasher(rounds=BCRYPT_ROUNDS, workers=BCRYPT_WORKERS,
+                                 max_pending=BCRYPT_MAX_PENDING, observer=metrics.observe_bcrypt)
+atexit.register(password_hasher.shutdown)
 
 class BaseModel(Model):
     class Meta:
@@ -22,12 +117,25 @@ class User(BaseModel):
     password_hash = CharField()
     @staticmethod
     def create_user(username, password):
-        # 由於我們在 before_request/after_request 中處理連線，這裡不需要 connect/close
+        # 連線在第一次查詢時自動開啟，並於 teardown_request 歸還，這裡不需要 connect/close
         if User.select().where(User.username == username).exists():
             raise ValueError("Username already exists.")
-        hashed_password = hashpw(password.encode('utf-8'), gensalt()).decode('utf-8')
+        hashed_password = password_hasher.hash(password)
         return User.create(username=username, password_hash=hashed_password)
 
+    def check_password(self, password):
+        """驗證密碼；cost factor 與目前設定不同時順便以新設定重新雜湊"""
+        if not password_hasher.verify(password, self.password_hash):
+            return False
+        if password_hasher.needs_rehash(self.password_hash):
+            try:
+                self.password_hash = password_hasher.hash(password)
+                self.save(only=[User.password_hash])
+            except POOL_ERRORS:
+                # 忙碌時略過，下次登入再升級
+                pass
+        return True
+
 class Score(BaseModel):
     user = ForeignKeyField(User, backref='scores')
     score_value = IntegerField()
@@ -35,20 +143,514 @@ class Score(BaseModel):
     class Meta:
         indexes = (
             (('score_value', 'timestamp'), False),
+            # 匯出的 keyset 分頁依 (timestamp, id) 排序；SQLite 索引本身就帶 rowid
+            (('timestamp',), False),
         )
 
+class UserBest(BaseModel):
+    """每位玩家的最高分，由 submit_score() 在同一交易內 upsert，英雄榜只需掃描玩家數量的資料"""
+    user = ForeignKeyField(User, primary_key=True, backref='best')
+    best_score = IntegerField(index=True)
+    achieved_at = DateTimeField(default=datetime.now)
+
+class Replay(BaseModel):
+    """一局的發射紀錄 (replay_format 二進位格式)，供稽核與重新驗證"""
+    score = ForeignKeyField(Score, primary_key=True, backref='replay')
+    data = BlobField()
+
+class ReplayRejection(BaseModel):
+    """每位玩家重播驗證失敗的次數"""
+    user = ForeignKeyField(User, primary_key=True, backref='replay_rejections')
+    count = IntegerField(default=0)
+    last_rejected_at = DateTimeField(default=datetime.now)
+
+class ScoreSubmission(BaseModel):
+    """/submit_scores 的冪等鍵：客戶端重送同一個 key 時不會重複計分"""
+    user = ForeignKeyField(User, backref='submissions')
+    key = CharField(max_length=64)
+    created_at = DateTimeField(default=datetime.now)
+    class Meta:
+        primary_key = CompositeKey('user', 'key')
+        indexes = (
+            (('created_at',), False),
+        )
+
+class PeriodBest(BaseModel):
+    """每位玩家在目前日 / 週區間的最高分，由 submit_score() 在同一交易內 upsert；區間結束後由 rollover 結算刪除"""
+    period = CharField(max_length=8)
+    period_start = DateField()
+    user = ForeignKeyField(User, backref='period_bests')
+    best_score = IntegerField()
+    achieved_at = DateTimeField(default=datetime.now)
+    class Meta:
+        primary_key = CompositeKey('period', 'period_start', 'user')
+
+# 涵蓋日榜 / 週榜查詢的索引：依名次順序直接掃描，不需回表也不需排序
+PeriodBest.add_index(PeriodBest.index(PeriodBest.period, PeriodBest.period_start, PeriodBest.best_score.desc(),
+                                      PeriodBest.achieved_at, PeriodBest.user, name='periodbest_board'))
+
+class PeriodResult(BaseModel):
+    """已結束日 / 週區間的最終名次"""
+    period = CharField(max_length=8)
+    period_start = DateField()
+    rank = IntegerField()
+    user = ForeignKeyField(User, backref='period_results')
+    score = IntegerField()
+    class Meta:
+        primary_key = CompositeKey('period', 'period_start', 'rank')
+
+class ArchiveSummary(BaseModel):
+    """已歸檔月份每位玩家的局數與最高分 (由 archive.py 維護)；Score 搬到歸檔檔後總局數與月榜仍可查詢"""
+    month = CharField(max_length=7)
+    user = ForeignKeyField(User, backref='archive_summaries')
+    games = IntegerField()
+    best_score = IntegerField()
+    best_at = DateTimeField()
+    class Meta:
+        primary_key = CompositeKey('month', 'user')
+        indexes = (
+            (('month', 'best_score'), False),
+        )
+
+def record_user_best(user_id, score_value, timestamp):
+    """新分數高於既有最高分時才更新 UserBest"""
+    (UserBest
+     .insert(user=user_id, best_score=score_value, achieved_at=timestamp)
+     .on_conflict(conflict_target=[UserBest.user],
+                  update={UserBest.best_score: EXCLUDED.best_score,
+                          UserBest.achieved_at: EXCLUDED.achieved_at},
+                  where=(EXCLUDED.best_score > UserBest.best_score))
+     .execute())
+
+def record_period_best(period, start, user_id, score_value, timestamp):
+    """新分數高於該區間既有最高分時才更新 PeriodBest"""
+    (PeriodBest
+     .insert(period=period, period_start=start, user=user_id, best_score=score_value, achieved_at=timestamp)
+     .on_conflict(conflict_target=[PeriodBest.period, PeriodBest.period_start, PeriodBest.user],
+                  update={PeriodBest.best_score: EXCLUDED.best_score,
+                          PeriodBest.achieved_at: EXCLUDED.achieved_at},
+                  where=(EXCLUDED.best_score > PeriodBest.best_score))
+     .execute())
+
+def save_scores(rows):
+    """在單一交易內寫入一批 (user_id, score_value, timestamp, replay_blob)，並同步更新 UserBest 與 PeriodBest"""
+    best = {}
+    period_best = {}
+    plain = []
+    for user_id, score_value, timestamp, replay in rows:
+        if user_id not in best or score_value > best[user_id][0]:
+            best[user_id] = (score_value, timestamp)
+        for period in PERIODS:
+            key = (period, period_start(period, timestamp), user_id)
+            if key not in period_best or score_value > period_best[key][0]:
+                period_best[key] = (score_value, timestamp)
+        if replay is None:
+            plain.append((user_id, score_value, timestamp))
+    with db.atomic():
+        for chunk in chunked(plain, 100):
+            Score.insert_many(chunk, fields=[Score.user, Score.score_value, Score.timestamp]).execute()
+        # 附重播的分數需要取得 Score id 才能建立關聯
+        for user_id, score_value, timestamp, replay in rows:
+            if replay is not None:
+                score_id = Score.insert(user=user_id, score_value=score_value, timestamp=timestamp).execute()
+                Replay.insert(score=score_id, data=replay).execute()
+        for user_id, (score_value, timestamp) in best.items():
+            record_user_best(user_id, score_value, timestamp)
+        for (period, start, user_id), (score_value, timestamp) in period_best.items():
+            record_period_best(period, start, user_id, score_value, timestamp)
+    # write-behind / 重播驗證延遲寫入、落在已結算區間的分數：只做標記，由下一次 period_board 在寫入路徑外併入最終名次
+    if any(start < period_start(period) for period, start, _ in period_best):
+        late_rollover.set()
+
+def backfill_user_best():
+    """從 Score 歷史重建 UserBest，回傳寫入的玩家數"""
+    # SQLite 在 MAX() 聚合時，timestamp 會取自最高分那一列
+    best_per_user = (Score
+                     .select(Score.user, fn.MAX(Score.score_value), Score.timestamp)
+                     .group_by(Score.user))
+    archived_best = (ArchiveSummary
+                     .select(ArchiveSummary.user, fn.MAX(ArchiveSummary.best_score), ArchiveSummary.best_at)
+                     .group_by(ArchiveSummary.user)
+                     .tuples())
+    with db.atomic():
+        UserBest.delete().execute()
+        UserBest.insert_from(best_per_user,
+                             [UserBest.user, UserBest.best_score, UserBest.achieved_at]).execute()
+        # 已歸檔的分數不在 Score 中，以歸檔彙總補上
+        for user_id, best_score, best_at in archived_best:
+            record_user_best(user_id, best_score, best_at)
+    return UserBest.select().count()
+
+def backfill_period_best(now=None):
+    """從 Score 歷史重建目前日 / 週區間的 PeriodBest"""
+    with db.atomic():
+        for period in PERIODS:
+            start = period_start(period, now)
+            PeriodBest.delete().where((PeriodBest.period == period) & (PeriodBest.period_start == start)).execute()
+            best_per_user = (Score
+                             .select(Value(period), Value(start), Score.user, fn.MAX(Score.score_value), Score.timestamp)
+                             .where(Score.timestamp >= datetime.combine(start, datetime.min.time()))
+                             .group_by(Score.user))
+            PeriodBest.insert_from(best_per_user, [PeriodBest.period, PeriodBest.period_start, PeriodBest.user,
+                                                   PeriodBest.best_score, PeriodBest.achieved_at]).execute()
+
+def load_period_top(period, start, limit):
+    """某個日 / 週區間的前幾名 [(user_id, username, best_score), ...]，走 periodbest_board 索引"""
+    top_scores = (PeriodBest
+                  .select(PeriodBest.user, User.username, PeriodBest.best_score)
+                  .join(User)
+                  .where((PeriodBest.period == period) & (PeriodBest.period_start == start))
+                  .order_by(PeriodBest.best_score.desc(), PeriodBest.achieved_at)
+                  .limit(limit))
+    return list(top_scores.tuples())
+
+def load_period_results(period, start, limit):
+    """已結算區間的最終名次 [{'username': ..., 'score': ...}, ...]"""
+    results = (PeriodResult
+               .select(PeriodResult.score, User.username)
+               .join(User)
+               .where((PeriodResult.period == period) & (PeriodResult.period_start == start))
+               .order_by(PeriodResult.rank)
+               .limit(limit))
+    return [{'username': r.user.username, 'score': r.score} for r in results]
+
+# 結算 (含 period_board 切換區間) 在同一個行程內一次只執行一個
+period_lock = threading.RLock()
+# save_scores 寫入了落在已結算區間的分數，等待 period_board 重新結算
+late_rollover = threading.Event()
+
+def rollover_periods(now=None):
+    """結算已結束的日 / 週區間：前 PERIOD_RESULT_SIZE 名寫入 PeriodResult，並刪除該區間的 PeriodBest
+
+    區間已結算過時 (結算後才寫入的延遲分數)，與既有的 PeriodResult 合併後重新排名。
+    回傳結算的區間數；重複執行是安全的。
+    """
+    closed = 0
+    with period_lock:
+        for period in PERIODS:
+            current = period_start(period, now)
+            finished = (PeriodBest
+                        .select(PeriodBest.period_start)
+                        .where((PeriodBest.period == period) & (PeriodBest.period_start < current))
+                        .distinct()
+                        .tuples())
+            for (start,) in list(finished):
+                with db.atomic():
+                    in_period = (PeriodResult.period == period) & (PeriodResult.period_start == start)
+                    # 既有名次在前，同分時保持原本的先後
+                    best = {}
+                    previous = (PeriodResult
+                                .select(PeriodResult.user, PeriodResult.score)
+                                .where(in_period)
+                                .order_by(PeriodResult.rank)
+                                .tuples())
+                    for user_id, score in previous:
+                        best[user_id] = score
+                    for user_id, _, score in load_period_top(period, start, PERIOD_RESULT_SIZE):
+                        if score > best.get(user_id, 0):
+                            best.pop(user_id, None)
+                            best[user_id] = score
+                    rows = sorted(best.items(), key=lambda item: -item[1])[:PERIOD_RESULT_SIZE]
+                    PeriodResult.delete().where(in_period).execute()
+                    if rows:
+                        PeriodResult.insert_many([(period, start, rank, user_id, score)
+                                                  for rank, (user_id, score) in enumerate(rows, 1)],
+                                                 fields=[PeriodResult.period, PeriodResult.period_start, PeriodResult.rank,
+                                                         PeriodResult.user, PeriodResult.score]).execute()
+                    PeriodBest.delete().where((PeriodBest.period == period) & (PeriodBest.period_start == start)).execute()
+                closed += 1
+    return closed
+
+def prune_submissions(days=SUBMISSION_KEEP_DAYS, now=None):
+    """刪除超過 days 天的冪等鍵，回傳刪除筆數"""
+    cutoff = (now or datetime.now()) - timedelta(days=days)
+    return ScoreSubmission.delete().where(ScoreSubmission.created_at < cutoff).execute()
+
+def iter_replays(batch_size=500):
+    """逐批讀出所有已儲存的重播，產生 (score_id, user_id, score_value, seed, shots)
+
+    以 Score id 做 keyset 分頁，每次只載入 batch_size 筆，不會一次把所有重播讀進記憶體。
+    """
+    last_id = 0
+    while True:
+        page = list(Replay
+                    .select(Replay.score, Replay.data, Score.user, Score.score_value)
+                    .join(Score)
+                    .where(Replay.score > last_id)
+                    .order_by(Replay.score)
+                    .limit(batch_size)
+                    .tuples())
+        if not page:
+            return
+        for score_id, data, user_id, score_value in page:
+            try:
+                seed, shots = decode_replay(data)
+            except ReplayError as e:
+                print(f"Corrupt replay for score ID {score_id}: {e}")
+                continue
+            yield score_id, user_id, score_value, seed, shots
+        last_id = page[-1][0]
+
+def reverify_replays(batch_size=500):
+    """把所有已儲存的重播串流送回模擬器，產生分數不符的 (score_id, user_id, stored, simulated)"""
+    batch = []
+    for item in iter_replays(batch_size):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield from _mismatches(batch)
+            batch = []
+    if batch:
+        yield from _mismatches(batch)
+
+def _mismatches(batch):
+    simulated = simulate_batch([(seed, shots) for _, _, _, seed, shots in batch])
+    for (score_id, user_id, score_value, _, _), result in zip(batch, simulated):
+        if result != score_value:
+            yield score_id, user_id, score_value, result
+
+SCORE_EXPORT_COLUMNS = ('id', 'user_id', 'username', 'score_value', 'timestamp')
+USER_EXPORT_COLUMNS = ('id', 'username')
+
+def iter_score_batches(since=None, until=None, batch_size=EXPORT_BATCH_SIZE):
+    """依 (timestamp, id) 逐批讀出 since <= timestamp < until 的分數，每批是 SCORE_EXPORT_COLUMNS 順序的 tuple 列表
+
+    每批都是獨立的短查詢，批次之間把連線還給連線池：不持有寫入鎖，也不會讓長時間的讀取交易擋住 WAL checkpoint。
+    已歸檔 (archive-scores) 的分數不在 Score 中，需直接讀取 ARCHIVE_DIR 下的歸檔檔。
+    """
+    condition = Value(True)
+    if since is not None:
+        condition &= Score.timestamp >= since
+    if until is not None:
+        condition &= Score.timestamp < until
+    cursor = None
+    while True:
+        where = condition if cursor is None else condition & (Tuple(Score.timestamp, Score.id) > cursor)
+        with db.connection_context():
+            page = list(Score
+                        .select(Score.id, Score.user, User.username, Score.score_value, Score.timestamp)
+                        .join(User, JOIN.LEFT_OUTER)
+                        .where(where)
+                        .order_by(Score.timestamp, Score.id)
+                        .limit(batch_size)
+                        .tuples())
+        if not page:
+            return
+        yield page
+        cursor = (page[-1][4], page[-1][0])
+
+def iter_user_batches(batch_size=EXPORT_BATCH_SIZE):
+    """依 id 逐批讀出玩家 (不含密碼雜湊)"""
+    last_id = 0
+    while True:
+        with db.connection_context():
+            page = list(User
+                        .select(User.id, User.username)
+                        .where(User.id > last_id)
+                        .order_by(User.id)
+                        .limit(batch_size)
+                        .tuples())
+        if not page:
+            return
+        yield page
+        last_id = page[-1][0]
+
+def export_stream(table, fmt, since=None, compress=False):
+    """匯出 (WSGI、asgi.py 與 CLI 共用)，回傳 (標頭列表, 位元組區塊 generator)；參數不合法時拋出 ExportError
+
+    分數只匯出到 until (現在減去 EXPORT_SETTLE_SECONDS，且不晚於尚未寫入的分數) 為止，
+    X-Export-Next-Since 標頭即下次增量匯出的 since。
+    """
+    if fmt not in FORMATS:
+        raise ExportError(f'Unknown export format: {fmt}.')
+    headers = []
+    if table == 'scores':
+        if since is not None and not isinstance(since, datetime):
+            try:
+                since = datetime.fromisoformat(since)
+            except ValueError:
+                raise ExportError('since must be an ISO 8601 timestamp.') from None
+        until = datetime.now() - timedelta(seconds=EXPORT_SETTLE_SECONDS)
+        for writer in (score_writer, replay_verifier):
+            oldest = writer.oldest_pending() if writer is not None else None
+            if oldest is not None and oldest < until:
+                until = oldest
+        columns, batches = SCORE_EXPORT_COLUMNS, iter_score_batches(since, until)
+        headers.append(('X-Export-Next-Since', until.isoformat()))
+        filename = f'scores-{until:%Y%m%dT%H%M%S}.{fmt}'
+    elif table == 'users':
+        if since is not None:
+            raise ExportError('since is only supported for scores.')
+        columns, batches = USER_EXPORT_COLUMNS, iter_user_batches()
+        filename = f'users.{fmt}'
+    else:
+        raise ExportError(f'Unknown export table: {table}.')
+    chunks = encode(fmt, columns, batches)
+    mimetype = FORMATS[fmt] + ('; charset=utf-8' if fmt == 'csv' else '')
+    if compress:
+        chunks = gzip_chunks(chunks)
+        headers.append(('Content-Encoding', 'gzip'))
+    headers += [('Content-Type', mimetype), ('Content-Disposition', f'attachment; filename={filename}')]
+    return headers, chunks
+
+def archive_cutoff(days=ARCHIVE_AFTER_DAYS, now=None):
+    """歸檔的時間界線：days 天前，且不晚於目前日 / 週區間的起點 (backfill_period_best 仍會讀取這些分數)"""
+    if now is None:
+        now = datetime.now()
+    starts = [datetime.combine(period_start(period, now), datetime.min.time()) for period in PERIODS]
+    return min([now - timedelta(days=days)] + starts)
+
+def archive_scores(cutoff, progress=None):
+    """把 cutoff 之前的分數搬到歸檔檔後以 incremental vacuum 縮小主資料庫，回傳 ({月份: 筆數}, 釋放的頁數或 None)
+
+    UserBest、PeriodResult 與 ArchiveSummary 不受影響，英雄榜與名次不需要重建。
+    """
+    # 作業專用連線：會 ATTACH 歸檔檔並建立 TEMP 資料表，不能混進連線池
+    job_db = create_database(DB_PATH, pooled=False, **DB_PRAGMAS)
+    job_db.connect()
+    try:
+        archiver = ScoreArchiver(ARCHIVE_DIR, summary_table=ArchiveSummary._meta.table_name,
+                                 batch_size=ARCHIVE_BATCH_SIZE)
+        moved = archiver.archive(job_db, cutoff, progress)
+        freed = incremental_vacuum(job_db, ARCHIVE_VACUUM_PAGES)
+    finally:
+        job_db.close()
+    return moved, freed
+
 def initialize_db(db):
     """連接資料庫並創建表格 (如果不存在)"""
     db.connect()
     try:
         # 確保在嘗試創建表格時資料庫是可用的
-        db.create_tables([User, Score], safe=True)
+        db.create_tables([User, Score, UserBest, ScoreSubmission, PeriodBest, PeriodResult, Replay, ReplayRejection,
+                          ArchiveSummary], safe=True)
     except Exception as e:
         print(f"Error creating tables: {e}")
+    try:
+        # 舊版資料庫升級後 UserBest 是空的：在英雄榜快取與名次索引載入前自動從 Score 歷史回填
+        if not UserBest.select().exists() and Score.select().exists():
+            count = backfill_user_best()
+            backfill_period_best()
+            print(f"UserBest was empty; backfilled {count} users from Score history.")
+    except Exception as e:
+        print(f"UserBest backfill error: {e}")
     finally:
         if not db.is_closed():
             db.close()
 
+def load_top_scores(limit):
+    """英雄榜快取的載入函式：每位玩家一列，回傳 [(user_id, username, best_score), ...]"""
+    top_scores = (UserBest
+                  .select(UserBest.user, UserBest.best_score, User.username)
+                  .join(User)
+                  .order_by(UserBest.best_score.desc(), UserBest.achieved_at)
+                  .limit(limit))
+    return [(b.user_id, b.user.username, b.best_score) for b in top_scores]
+
+leaderboard_cache = LeaderboardCache(load_top_scores, size=LEADERBOARD_SIZE, ttl=LEADERBOARD_TTL)
+# 即時英雄榜的發布者：前 N 名變動時由單一執行緒計算 diff 並扇出給所有 SSE 連線
+leaderboard_stream = LeaderboardBroadcaster(lambda: leaderboard_cache.top(10), max_clients=STREAM_MAX_CLIENTS,
+                                            heartbeat=STREAM_HEARTBEAT)
+atexit.register(leaderboard_stream.stop)
+
+# 日榜 / 週榜快取：區間切換時清空並觸發結算
+period_caches = {period: LeaderboardCache(lambda limit, period=period: load_period_top(period, period_start(period), limit),
+                                          size=LEADERBOARD_SIZE, ttl=LEADERBOARD_TTL)
+                 for period in PERIODS}
+period_cache_starts = {period: period_start(period) for period in PERIODS}
+
+def period_board(period, n=10):
+    """目前日 / 週榜的前 n 名 [{'username': ..., 'score': ...}, ...]"""
+    start = period_start(period)
+    if period_cache_starts[period] != start or late_rollover.is_set():
+        with period_lock:
+            # 同時有多個請求發現區間切換時，只有第一個執行結算
+            switched = period_cache_starts[period] != start
+            if switched or late_rollover.is_set():
+                if switched:
+                    period_cache_starts[period] = start
+                    period_caches[period].invalidate()
+                # 先清除標記：結算期間又寫入的延遲分數會再次標記；結算失敗時留在 PeriodBest，下次結算仍會併入
+                late_rollover.clear()
+                try:
+                    rollover_periods()
+                    if switched and period == 'day':
+                        prune_submissions()
+                except Exception as e:
+                    print(f"Period rollover error: {e}")
+    return period_caches[period].top(n)
+# 全體玩家名次索引 (以 UserBest 為基礎)
+rank_index = RankIndex()
+
+# write-behind 模式下的批次寫入器；sync 模式為 None
+score_writer = None
+if SCORE_WRITE_MODE == 'behind':
+    score_writer = ScoreWriter(save_scores, batch_size=SCORE_BATCH_SIZE, interval_ms=SCORE_FLUSH_MS,
+                               timestamp_fn=lambda row: row[2]).start()
+    # 關閉時先把佇列中的分數寫完
+    atexit.register(score_writer.stop)
+
+def record_score(user_id, username, score_value, replay=None):
+    """寫入一筆已確認的分數 (可附重播 blob) 並更新英雄榜快取與名次索引；write-behind 佇列滿載時拋出 WriterBusy"""
+    # 直接傳入 user_id 作為外鍵值；Score、Replay 與 UserBest 在同一個交易內寫入
+    row = (user_id, score_value, datetime.now(), replay)
+    if score_writer is not None:
+        score_writer.submit(row)
+    else:
+        save_scores([row])
+    publish_score(user_id, username, score_value, row[2])
+
+def publish_score(user_id, username, score_value, timestamp):
+    """分數寫入 (或排入寫入佇列) 後更新英雄榜快取、日 / 週榜快取與名次索引"""
+    # 分數夠高時就地更新英雄榜快取 (每位玩家只佔一列)，前 N 名有變動才通知即時英雄榜
+    if leaderboard_cache.offer(user_id, username, score_value):
+        leaderboard_stream.notify()
+    for period in PERIODS:
+        if period_start(period, timestamp) == period_cache_starts[period]:
+            period_caches[period].offer(user_id, username, score_value)
+    rank_index.update(user_id, score_value)
+
+def accept_replay(job, score_value):
+    try:
+        record_score(job.user_id, job.username, score_value, encode_replay(job.seed, job.shots))
+        print(f"Success: Verified score {score_value} saved for user ID {job.user_id}.")
+    except Exception as e:
+        print(f"CRITICAL DB ERROR saving verified score: {e}")
+
+def reject_replay(job, computed_score):
+    """重播結果與回報分數不符 (或重播不合法)，累計該玩家的拒絕次數"""
+    print(f"Rejected replay from user ID {job.user_id}: claimed {job.score}, simulated {computed_score}.")
+    try:
+        (ReplayRejection
+         .insert(user=job.user_id, count=1, last_rejected_at=datetime.now())
+         .on_conflict(conflict_target=[ReplayRejection.user],
+                      update={ReplayRejection.count: ReplayRejection.count + 1,
+                              ReplayRejection.last_rejected_at: EXCLUDED.last_rejected_at})
+         .execute())
+    except Exception as e:
+        print(f"CRITICAL DB ERROR recording replay rejection: {e}")
+
+# 重播驗證在背景執行緒批次進行；須在 score_writer 之後註冊 atexit，關閉時才會先驗證完再寫入
+replay_verifier = ReplayVerifier(accept_replay, reject_replay,
+                                 batch_size=REPLAY_BATCH_SIZE, interval_ms=REPLAY_FLUSH_MS).start()
+atexit.register(replay_verifier.stop)
+
+# 各元件既有的 stats() 也一併輸出到 /metrics
+metrics.collect('leaderboard_cache', leaderboard_cache.stats)
+metrics.collect('leaderboard_stream', leaderboard_stream.stats)
+metrics.collect('replay_verifier', replay_verifier.stats)
+if score_writer is not None:
+    metrics.collect('score_writer', score_writer.stats)
+
+# 渲染後頁面的快取 (匿名頁面整頁 + gzip、英雄榜片段)；代號每次啟動重新產生
+page_cache = PageCache(token=os.urandom(8).hex())
+metrics.collect('page_cache', page_cache.stats)
+
+# 歸檔的唯讀查詢：用到哪個月份才 ATTACH
+archive_reader = ArchiveReader(ARCHIVE_DIR)
+
+def warm_rank_index():
+    rank_index.load(UserBest.select(UserBest.user, UserBest.best_score).tuples().iterator())
+
 # --- 2. 表單驗證 (WTForms) ---
 class RegistrationForm(Form):
     username = StringField('使用者名稱', [validators.Length(min=4, max=25, message='長度必須介於 4 到 25 個字元')])
@@ -66,10 +668,40 @@ class LoginForm(Form):
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = SECRET_KEY
+metrics.instrument_app(app)
+
+# build_assets.py 產生的 Brython bundle (內容雜湊檔名)；尚未建置時 /game 改用 CDN
+DIST_DIR = os.path.join(app.static_folder, 'dist')
+DIST_MAX_AGE = 365 * 24 * 3600
+# build_assets.py 的檔名格式 name.<sha256 前 12 碼>.ext；只有這種檔名內容不會改變，可以永久快取
+HASHED_ASSET = re.compile(r'\.([0-9a-f]{12})\.[^./]+$')
+
+def load_asset_manifest():
+    try:
+        with open(os.path.join(DIST_DIR, 'manifest.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+asset_manifest = load_asset_manifest()
+
 
-# 在 app 實例化後立即執行初始化，確保資料表存在
 initialize_db(db)
 
+# 啟動時預先載入英雄榜，之後首頁讀取直接使用快取
+try:
+    leaderboard_cache.rebuild()
+    warm_rank_index()
+    rollover_periods()
+except Exception as e:
+    print(f"Leaderboard warm-up error: {e}")
+finally:
+    if not db.is_closed():
+        db.close()
+leaderboard_stream.start()
+if profiler is not None:
+    profiler.start()
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -79,40 +711,91 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-@app.before_request
-def before_request():
-    """在每次請求前連接資料庫"""
-    if db.is_closed():
-        db.connect()
+def is_admin(username, authorization):
+    """session 中的使用者在 ADMIN_USERS 內，或 Authorization 標頭帶有正確的 EXPORT_TOKEN"""
+    if username is not None and username in ADMIN_USERS:
+        return True
+    if EXPORT_TOKEN and authorization and authorization.startswith('Bearer '):
+        return hmac.compare_digest(authorization[7:].strip().encode(), EXPORT_TOKEN.encode())
+    return False
+
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        username = session.get('username') if 'user_id' in session else None
+        if not is_admin(username, request.headers.get('Authorization')):
+            return jsonify({'success': False, 'message': 'Administrator access required.'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+def serve_page(name, version, render, shows_flashes=True):
+    """GET 頁面的條件式回應：If-None-Match 相符時直接回 304；匿名使用者共用整頁快取 (含 gzip)
+
+    render() 回傳 HTML 字串。會顯示 flash 訊息的頁面 (base.html) 有待顯示的訊息時照常渲染，不快取也不加 ETag
+    (訊息只能顯示一次，不能被 304 或共用快取吃掉)；登入狀態下頁面含使用者名稱，只做條件式 GET。
+    """
+    if request.method != 'GET' or (shows_flashes and '_flashes' in session):
+        return render()
+    user = session.get('username') if 'user_id' in session else None
+    etag = page_cache.etag(name, version, user)
+    if request.if_none_match.contains_weak(etag):
+        page_cache.count('not_modified')
+        response = app.response_class(status=304)
+    elif user is not None:
+        page_cache.count('private_renders')
+        response = app.response_class(render())
+    else:
+        entry = page_cache.get(name, version)
+        if entry is None:
+            entry = page_cache.put(name, version, render())
+        if entry.gzip_body is not None and 'gzip' in request.accept_encodings:
+            response = app.response_class(entry.gzip_body)
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = app.response_class(entry.body)
+        response.vary.add('Accept-Encoding')
+    # 讀過 session，Flask 會自動加上 Vary: Cookie；每次都要向伺服器確認 ETag
+    response.set_etag(etag, weak=True)
+    response.cache_control.no_cache = True
+    if user is not None:
+        response.cache_control.private = True
+    return response
 
-@app.after_request
-def after_request(response):
-    """在每次請求後關閉資料庫連接"""
+@app.teardown_request
+def teardown_request(exc):
+    """請求結束後把連線還給連線池；peewee 在第一次查詢時才會連線，靜態檔與轉址路由不會開啟連線"""
     if not db.is_closed():
         db.close()
-    return response
 
 # --- 4. 路由定義 ---
 
+def index_page(version, leaderboard_data):
+    """首頁回應 (WSGI 與 asgi.py 共用)；英雄榜表格依英雄榜版本快取，version 為 None 時 (載入失敗) 不快取"""
+    def table():
+        return Markup(render_template('leaderboard_table.html', leaderboard=leaderboard_data))
+
+    def render():
+        html = table() if version is None else page_cache.fragment('leaderboard_table', version, table)
+        return render_template('index.html', leaderboard_html=html, session=session,
+                               stream_poll_seconds=STREAM_POLL_SECONDS)
+
+    if version is None:
+        return render()
+    # index.html 不顯示 flash 訊息，有待顯示的訊息時仍可使用快取
+    return serve_page('index', version, render, shows_flashes=False)
+
 @app.route('/')
 def index():
     try:
-        # 使用 select 和 join 來高效地提取數據
-        top_scores = (Score
-                      .select(Score.score_value, User.username)
-                      .join(User)
-                      .order_by(Score.score_value.desc())
-                      .limit(10))
-        
-        # leaderboard_data 為字典列表，包含 'username' 和 'score'
-        leaderboard_data = [{'username': s.user.username, 'score': s.score_value} for s in top_scores]
+        # leaderboard_data 為字典列表，包含 'username' 和 'score'；快取命中時不會查詢資料庫
+        version, leaderboard_data = leaderboard_cache.top_with_version(10)
     except Exception as e:
         # 這會捕捉到 peewee.OperationalError: no such table，如果初始化失敗
         print(f"Leaderboard error (DB init issue?): {e}")
         flash('無法加載英雄榜數據。請確認資料庫已初始化。', 'danger')
-        leaderboard_data = []
+        version, leaderboard_data = None, []
 
-    return render_template('index.html', leaderboard=leaderboard_data, session=session)
+    return index_page(version, leaderboard_data)
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -125,12 +808,15 @@ def register():
         except ValueError as e:
             # 處理使用者名稱已存在
             flash(str(e), 'danger')
+        except POOL_ERRORS:
+            flash('伺服器忙碌中，請稍後再試。', 'warning')
+            return render_template('register.html', form=form), 503
         except Exception as e:
             # 處理其他資料庫錯誤 (例如表不存在)
             print(f"Registration DB Error: {e}")
             flash('註冊失敗，伺服器或資料庫錯誤。', 'danger')
             
-    return render_template('register.html', form=form)
+    return serve_page('register', None, lambda: render_template('register.html', form=form))
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -142,7 +828,13 @@ def login():
             flash('無效的使用者名稱或密碼。', 'danger')
             return render_template('login.html', form=form)
 
-        if checkpw(form.password.data.encode('utf-8'), user.password_hash.encode('utf-8')):
+        try:
+            password_ok = user.check_password(form.password.data)
+        except POOL_ERRORS:
+            flash('伺服器忙碌中，請稍後再試。', 'warning')
+            return render_template('login.html', form=form), 503
+
+        if password_ok:
             session['username'] = user.username
             session['user_id'] = user.id
             flash('登入成功！', 'success')
@@ -150,7 +842,7 @@ def login():
         else:
             flash('無效的使用者名稱或密碼。', 'danger')
 
-    return render_template('login.html', form=form)
+    return serve_page('login', None, lambda: render_template('login.html', form=form))
 
 @app.route('/logout')
 def logout():
@@ -162,40 +854,451 @@ def logout():
 @app.route('/game')
 @login_required
 def game():
-    return render_template('game.html')
+    bundle = asset_manifest.get('game.js')
+    bundle_url = url_for('dist_asset', filename=bundle) if bundle else None
+    return serve_page('game', bundle, lambda: render_template('game.html', bundle_url=bundle_url))
 
-@app.route('/submit_score', methods=['POST'])
-@login_required
-def submit_score():
-    """接收 Brython 傳來分數的 API """
-    if not request.is_json:
-        return jsonify({'success': False, 'message': 'Request must be JSON format.'}), 415
+@app.route('/static/dist/<path:filename>')
+def dist_asset(filename):
+    """build_assets.py 的建置產物：依 Accept-Encoding 送出預先壓縮的檔案
+
+    內容雜湊命名的檔案設為一年的 immutable 快取，ETag 就是雜湊；
+    manifest.json 等其他檔案每次都要重新驗證 (no-cache)，ETag 由 Flask 依檔案內容資訊產生。
+    """
+    mimetype = mimetypes.guess_type(filename)[0]
+    hashed = HASHED_ASSET.search(filename)
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in request.accept_encodings and os.path.isfile(os.path.join(DIST_DIR, filename + suffix)):
+            served, etag = filename + suffix, hashed and f'{hashed.group(1)}-{encoding}'
+            break
+    else:
+        served, encoding, etag = filename, None, hashed and hashed.group(1)
+    if hashed:
+        response = send_from_directory(DIST_DIR, served, mimetype=mimetype, etag=etag, max_age=DIST_MAX_AGE)
+        response.cache_control.immutable = True
+    else:
+        response = send_from_directory(DIST_DIR, served, mimetype=mimetype, max_age=0)
+        response.cache_control.no_cache = True
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+def handle_score_submission(user_id, username, payload):
+    """/submit_score 的處理邏輯 (WSGI 與 asgi.py 共用)，回傳 (回應內容, HTTP 狀態碼)"""
+    if not isinstance(payload, dict):
+        return {'success': False, 'message': 'Invalid or non-integer score value provided.'}, 400
     try:
-        score_value = int(request.json.get('score'))
+        score_value = int(payload.get('score'))
     except (ValueError, TypeError):
-        return jsonify({'success': False, 'message': 'Invalid or non-integer score value provided.'}), 400
+        return {'success': False, 'message': 'Invalid or non-integer score value provided.'}, 400
 
     if score_value <= 0:
-         return jsonify({'success': False, 'message': 'Score must be positive.'}), 400
+         return {'success': False, 'message': 'Score must be positive.'}, 400
 
     try:
-        user_id = session.get('user_id')
         if user_id is None:
-            return jsonify({'success': False, 'message': 'Authentication failed or session expired (No user_id).'}), 401
-        
-        # 直接傳入 user_id 作為外鍵值
-        Score.create(
-            user=user_id,
-            score_value=score_value,
-            timestamp=datetime.now()
-        )
+            return {'success': False, 'message': 'Authentication failed or session expired (No user_id).'}, 401
+
+        if 'seed' in payload or 'shots' in payload:
+            # 附上重播時由伺服器重新模擬，分數相符才會寫入
+            try:
+                seed, shots = parse_replay(payload.get('seed'), payload.get('shots'))
+            except ReplayError as e:
+                return {'success': False, 'message': str(e)}, 400
+            try:
+                replay_verifier.submit(ReplayJob(user_id, username, seed, shots, score_value))
+            except WriterBusy as e:
+                return {'success': False, 'message': str(e)}, 503
+            return {'success': True, 'message': 'Score queued for verification.'}, 202
+
+        if REQUIRE_REPLAY:
+            return {'success': False, 'message': 'Replay (seed and shots) is required.'}, 400
+        try:
+            record_score(user_id, username, score_value)
+        except WriterBusy as e:
+            return {'success': False, 'message': str(e)}, 503
+        if score_writer is not None:
+            return {'success': True, 'message': 'Score queued.'}, 202
         print(f"Success: Score {score_value} saved for user ID {user_id}.")
-        return jsonify({'success': True, 'message': 'Score saved successfully!'})
+        return {'success': True, 'message': 'Score saved successfully!'}, 200
         
     except Exception as e:
         print(f"CRITICAL DB ERROR saving score: {e}")
         # 如果發生 DB 錯誤，提示用戶重新登入
-        return jsonify({'success': False, 'message': 'Database error occurred. Please log in again.'}), 401
+        return {'success': False, 'message': 'Database error occurred. Please log in again.'}, 401
+
+def handle_bulk_submission(user_id, username, payload):
+    """/submit_scores 的處理邏輯：[{key, score[, seed, shots]}, ...]，回傳 (回應內容, HTTP 狀態碼)
+
+    冪等鍵與不需驗證的分數在同一個交易內寫入；附重播的分數在交易完成後排入重播驗證。
+    每筆結果為 saved / queued (等待重播驗證) / duplicate (key 已處理過) / invalid / retry (稍後重送)。
+    """
+    items = payload.get('scores') if isinstance(payload, dict) else payload
+    if not isinstance(items, list) or not items:
+        return {'success': False, 'message': 'Request must contain a non-empty list of scores.'}, 400
+    if len(items) > SUBMIT_BATCH_MAX:
+        return {'success': False, 'message': f'At most {SUBMIT_BATCH_MAX} scores per request.'}, 413
+    if user_id is None:
+        return {'success': False, 'message': 'Authentication failed or session expired (No user_id).'}, 401
+
+    results = {}
+    plain, jobs = {}, {}
+    for index, item in enumerate(items):
+        key = item.get('key') if isinstance(item, dict) else None
+        if not isinstance(key, str) or not 0 < len(key) <= 64:
+            # 只有這一筆無效，其餘照常處理 (客戶端遇到 4xx 會丟掉整批)
+            results[(None, index)] = {'key': key if isinstance(key, str) else None, 'status': 'invalid',
+                                      'message': 'Each score needs a key of 1-64 characters.'}
+            continue
+        if key in results:
+            continue
+        results[key] = {'key': key, 'status': 'invalid'}
+        try:
+            score_value = int(item.get('score'))
+        except (ValueError, TypeError):
+            results[key]['message'] = 'Invalid or non-integer score value provided.'
+            continue
+        if score_value <= 0:
+            results[key]['message'] = 'Score must be positive.'
+        elif 'seed' in item or 'shots' in item:
+            try:
+                seed, shots = parse_replay(item.get('seed'), item.get('shots'))
+            except ReplayError as e:
+                results[key]['message'] = str(e)
+                continue
+            jobs[key] = ReplayJob(user_id, username, seed, shots, score_value)
+        elif REQUIRE_REPLAY:
+            results[key]['message'] = 'Replay (seed and shots) is required.'
+        else:
+            plain[key] = score_value
+
+    now = datetime.now()
+    try:
+        # IMMEDIATE 交易一開始就取得寫入鎖，同一批 key 並行重送時不會兩邊都判定為新的
+        with db.atomic('IMMEDIATE'):
+            keys = list(plain) + list(jobs)
+            seen = set()
+            if keys:
+                seen = {key for key, in (ScoreSubmission
+                                         .select(ScoreSubmission.key)
+                                         .where((ScoreSubmission.user == user_id) & (ScoreSubmission.key.in_(keys)))
+                                         .tuples())}
+            for key in seen:
+                results[key] = {'key': key, 'status': 'duplicate'}
+                plain.pop(key, None)
+                jobs.pop(key, None)
+            new_keys = list(plain) + list(jobs)
+            if new_keys:
+                ScoreSubmission.insert_many([(user_id, key, now) for key in new_keys],
+                                            fields=[ScoreSubmission.user, ScoreSubmission.key,
+                                                    ScoreSubmission.created_at]).execute()
+            if plain:
+                save_scores([(user_id, score_value, now, None) for score_value in plain.values()])
+    except Exception as e:
+        print(f"CRITICAL DB ERROR saving score batch: {e}")
+        return {'success': False, 'message': 'Database error occurred. Please try again.'}, 503
+
+    for key, score_value in plain.items():
+        publish_score(user_id, username, score_value, now)
+        results[key] = {'key': key, 'status': 'saved'}
+    busy = []
+    for key, job in jobs.items():
+        try:
+            replay_verifier.submit(job)
+            results[key] = {'key': key, 'status': 'queued'}
+        except WriterBusy:
+            busy.append(key)
+            results[key] = {'key': key, 'status': 'retry'}
+    if busy:
+        # 沒排進驗證佇列的分數要讓客戶端之後重送，所以撤銷它們的 key
+        try:
+            (ScoreSubmission
+             .delete()
+             .where((ScoreSubmission.user == user_id) & (ScoreSubmission.key.in_(busy)))
+             .execute())
+        except Exception as e:
+            print(f"CRITICAL DB ERROR releasing score keys: {e}")
+    if plain:
+        print(f"Success: {len(plain)} scores saved for user ID {user_id}.")
+    return {'success': True, 'results': list(results.values())}, 200
+
+@app.route('/submit_score', methods=['POST'])
+@login_required
+def submit_score():
+    """接收 Brython 傳來分數的 API """
+    if not request.is_json:
+        return jsonify({'success': False, 'message': 'Request must be JSON format.'}), 415
+    body, status = handle_score_submission(session.get('user_id'), session.get('username'), request.json)
+    return jsonify(body), status
+
+@app.route('/submit_scores', methods=['POST'])
+@login_required
+def submit_scores():
+    """批次送出分數 (客戶端離線佇列使用)"""
+    if not request.is_json:
+        return jsonify({'success': False, 'message': 'Request must be JSON format.'}), 415
+    body, status = handle_bulk_submission(session.get('user_id'), session.get('username'), request.json)
+    return jsonify(body), status
+
+# 英雄榜頁面的區間：日榜、週榜與總榜
+BOARD_TITLES = {'day': '今日英雄榜', 'week': '本週英雄榜', 'all': '總英雄榜'}
+
+def load_board(period, n=10):
+    if period == 'all':
+        return leaderboard_cache.top(n)
+    return period_board(period, n)
+
+@app.route('/leaderboard/<period>')
+def leaderboard(period):
+    """日榜 / 週榜 / 總榜頁面；日榜與週榜另外列出上一期的最終名次"""
+    if period not in BOARD_TITLES:
+        return redirect(url_for('leaderboard', period='all'))
+    try:
+        board = load_board(period)
+        previous = []
+        if period != 'all':
+            previous = load_period_results(period, previous_start(period, period_start(period)), 10)
+    except Exception as e:
+        print(f"Leaderboard error: {e}")
+        flash('無法加載英雄榜數據。', 'danger')
+        board, previous = [], []
+    return render_template('leaderboard.html', period=period, titles=BOARD_TITLES,
+                           leaderboard=board, previous=previous)
+
+@app.route('/leaderboard/stream')
+def leaderboard_events():
+    """即時英雄榜 (Server-Sent Events)：先送完整快照，之後只在前 N 名變動時送 diff"""
+    try:
+        subscription = leaderboard_stream.subscribe()
+    except TooManySubscribers as e:
+        response = jsonify({'success': False, 'message': str(e), 'poll': url_for('leaderboard_api', period='all'),
+                            'poll_seconds': STREAM_POLL_SECONDS})
+        response.headers['Retry-After'] = str(STREAM_POLL_SECONDS)
+        return response, 503
+    response = Response(leaderboard_stream.stream(subscription), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # 反向代理 (nginx) 不要緩衝，事件才會即時送達
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/leaderboard/<period>')
+def leaderboard_api(period):
+    """日榜 / 週榜 / 總榜 JSON：/api/leaderboard/day?n=10"""
+    if period not in BOARD_TITLES:
+        return jsonify({'success': False, 'message': 'Unknown leaderboard period.'}), 404
+    n = min(request.args.get('n', 10, type=int), LEADERBOARD_SIZE)
+    start = period_start(period).isoformat() if period != 'all' else None
+    return jsonify({'success': True, 'period': period, 'period_start': start, 'leaderboard': load_board(period, n)})
+
+@app.route('/api/leaderboard/stats')
+def leaderboard_stats():
+    """英雄榜快取的命中/未命中統計，用於確認快取在負載下是否生效"""
+    return jsonify(leaderboard_cache.stats())
+
+@app.route('/api/leaderboard/stream/stats')
+def leaderboard_stream_stats():
+    """即時英雄榜的連線數與發布次數"""
+    return jsonify(leaderboard_stream.stats())
+
+@app.route('/api/score_writer/stats')
+def score_writer_stats():
+    """write-behind 佇列深度與批次寫入延遲"""
+    if score_writer is None:
+        return jsonify({'mode': SCORE_WRITE_MODE})
+    return jsonify({'mode': SCORE_WRITE_MODE, **score_writer.stats()})
+
+@app.route('/api/replays/stats')
+@admin_required
+def replay_stats():
+    """重播驗證的吞吐量、佇列深度，以及被拒絕次數最多的玩家"""
+    rejected_by_user = (ReplayRejection
+                        .select(ReplayRejection.count, User.username)
+                        .join(User)
+                        .order_by(ReplayRejection.count.desc())
+                        .limit(20))
+    return jsonify({**replay_verifier.stats(),
+                    'rejected_by_user': {r.user.username: r.count for r in rejected_by_user}})
+
+@app.route('/metrics')
+@admin_required
+def metrics_endpoint():
+    """Prometheus 文字格式的效能指標"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/metrics/slow')
+@admin_required
+def slow_requests():
+    """最慢請求的 folded stacks (flamegraph.pl / speedscope 可直接讀取)；需設定 METRICS_PROFILE=1"""
+    if profiler is None:
+        return jsonify({'success': False, 'message': 'Profiler is disabled (set METRICS_PROFILE=1).'}), 404
+    return Response(profiler.folded(), mimetype='text/plain')
+
+@app.route('/admin/export/<table>')
+@admin_required
+def export_table(table):
+    """串流匯出分數或玩家：/admin/export/scores?format=csv&since=2024-01-01T00:00:00"""
+    compress = 'gzip' in request.accept_encodings
+    try:
+        headers, chunks = export_stream(table, request.args.get('format', 'ndjson'), request.args.get('since'), compress)
+    except ExportError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    response = Response(chunks, headers=headers)
+    response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/archive')
+def archive_months():
+    """已歸檔的月份與各月的玩家數、局數、最高分 (主資料庫的彙總，不需打開歸檔檔)"""
+    months = (ArchiveSummary
+              .select(ArchiveSummary.month, fn.COUNT(ArchiveSummary.user).alias('players'),
+                      fn.SUM(ArchiveSummary.games).alias('games'), fn.MAX(ArchiveSummary.best_score).alias('top'))
+              .group_by(ArchiveSummary.month)
+              .order_by(ArchiveSummary.month)
+              .dicts())
+    return jsonify({'success': True, 'months': list(months)})
+
+@app.route('/api/archive/<month>/top')
+def archive_top(month):
+    """已歸檔月份的月榜：/api/archive/2024-01/top?n=10"""
+    if not MONTH_PATTERN.match(month):
+        return jsonify({'success': False, 'message': 'Month must be YYYY-MM.'}), 404
+    n = min(request.args.get('n', 10, type=int), PERIOD_RESULT_SIZE)
+    top = (ArchiveSummary
+           .select(ArchiveSummary.best_score, ArchiveSummary.games, User.username)
+           .join(User)
+           .where(ArchiveSummary.month == month)
+           .order_by(ArchiveSummary.best_score.desc(), ArchiveSummary.best_at)
+           .limit(n))
+    return jsonify({'success': True, 'month': month,
+                    'leaderboard': [{'username': r.user.username, 'score': r.best_score, 'games': r.games} for r in top]})
+
+@app.route('/api/archive/<month>/scores')
+def archive_month_scores(month):
+    """已歸檔月份的分數明細 (唯讀，依 id 分頁)：/api/archive/2024-01/scores?user=alice&after=0&limit=100"""
+    user_id = None
+    if request.args.get('user'):
+        user = User.get_or_none(User.username == request.args['user'])
+        if user is None:
+            return jsonify({'success': False, 'message': 'Unknown user.'}), 404
+        user_id = user.id
+    limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+    try:
+        rows = archive_reader.scores(month, user_id, request.args.get('after', 0, type=int), limit)
+    except KeyError:
+        return jsonify({'success': False, 'message': 'No archive for this month.'}), 404
+    names = dict(User.select(User.id, User.username).where(User.id.in_({row[1] for row in rows})).tuples()) if rows else {}
+    scores = [{'id': score_id, 'username': names.get(uid), 'score': value, 'timestamp': timestamp}
+              for score_id, uid, value, timestamp in rows]
+    return jsonify({'success': True, 'month': month, 'scores': scores,
+                    'next_after': rows[-1][0] if len(rows) == limit else None})
+
+@app.route('/api/players/<username>/stats')
+def player_stats(username):
+    """玩家的最高分與總局數 (近期 Score 加上歸檔彙總)"""
+    user = User.get_or_none(User.username == username)
+    if user is None:
+        return jsonify({'success': False, 'message': 'Unknown user.'}), 404
+    best = UserBest.get_or_none(UserBest.user == user.id)
+    archived = list(ArchiveSummary
+                    .select(ArchiveSummary.month, ArchiveSummary.games)
+                    .where(ArchiveSummary.user == user.id)
+                    .order_by(ArchiveSummary.month)
+                    .tuples())
+    archived_games = sum(games for _, games in archived)
+    recent_games = Score.select().where(Score.user == user.id).count()
+    return jsonify({'success': True, 'username': username,
+                    'best_score': best.best_score if best is not None else None,
+                    'games': recent_games + archived_games, 'archived_games': archived_games,
+                    'archived_months': [month for month, _ in archived]})
+
+@app.route('/api/rank/<username>')
+def player_rank(username):
+    """查詢玩家的全球名次與百分位"""
+    user = User.get_or_none(User.username == username)
+    best = rank_index.best_of(user.id) if user is not None else None
+    if best is None:
+        return jsonify({'success': False, 'message': 'No score recorded for this user.'}), 404
+    return jsonify({'success': True, 'username': username, 'score': best, **rank_index.rank_of(best)})
+
+@app.route('/api/rank')
+def score_rank():
+    """查詢某個分數可排到的名次：/api/rank?score=N"""
+    try:
+        score_value = int(request.args.get('score'))
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'message': 'Invalid or non-integer score value provided.'}), 400
+    return jsonify({'success': True, 'score': score_value, **rank_index.rank_of(score_value)})
+
+@app.cli.command('backfill-best')
+def backfill_best_command():
+    """從既有 Score 歷史回填 UserBest：flask --app app backfill-best
+
+    英雄榜快取與名次索引在伺服器行程的記憶體中，CLI 無法讓它們失效；回填後需重新啟動伺服器才會重新載入。
+    (UserBest 為空時伺服器啟動會自動回填，這個指令只在需要強制重建時使用。)
+    """
+    count = backfill_user_best()
+    backfill_period_best()
+    print(f"UserBest backfilled for {count} users. Restart the server to reload its leaderboard caches and rank index.")
+
+@app.cli.command('rollover-boards')
+def rollover_boards_command():
+    """結算已結束的日榜 / 週榜：flask --app app rollover-boards"""
+    closed = rollover_periods()
+    print(f"Closed {closed} finished leaderboard periods.")
+
+@app.cli.command('verify-replays')
+def verify_replays_command():
+    """重新模擬所有已儲存的重播並列出分數不符者：flask --app app verify-replays"""
+    mismatches = 0
+    for score_id, user_id, stored, simulated in reverify_replays():
+        mismatches += 1
+        print(f"Score ID {score_id} (user ID {user_id}): stored {stored}, simulated {simulated}")
+    print(f"Replay verification finished, {mismatches} mismatches.")
+
+@app.cli.command('export')
+@click.argument('table', type=click.Choice(['scores', 'users']))
+@click.argument('output')
+@click.option('--format', 'fmt', type=click.Choice(sorted(FORMATS)), default='ndjson')
+@click.option('--since', default=None, help='只匯出此時間 (ISO 8601) 之後的分數')
+def export_command(table, output, fmt, since):
+    """串流匯出分數或玩家：flask --app app export scores scores.csv.gz --format csv
+
+    OUTPUT 的副檔名為 .gz 時以 gzip 壓縮；"-" 為標準輸出 (啟動訊息也會印到標準輸出，建議寫入檔案)。
+    """
+    try:
+        headers, chunks = export_stream(table, fmt, since, compress=output.endswith('.gz'))
+    except ExportError as e:
+        raise click.UsageError(str(e))
+    with click.open_file(output, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+    for name, value in headers:
+        if name == 'X-Export-Next-Since':
+            click.echo(f"Next incremental export: --since {value}", err=True)
+
+@app.cli.command('archive-scores')
+@click.option('--days', type=int, default=None, help='覆寫 ARCHIVE_AFTER_DAYS')
+@click.option('--full-vacuum', is_flag=True,
+              help='先把 auto_vacuum 切換為 INCREMENTAL (執行一次完整 VACUUM，期間會鎖住資料庫)')
+def archive_scores_command(days, full_vacuum):
+    """把舊分數搬到每月的歸檔檔並縮小資料庫：flask --app app archive-scores [--days 90]"""
+    if full_vacuum:
+        db.execute_sql('PRAGMA auto_vacuum = INCREMENTAL')
+        db.execute_sql('VACUUM')
+        db.close()
+    rollover_periods()
+    print(f"Pruned {prune_submissions()} score submission keys older than {SUBMISSION_KEEP_DAYS} days.")
+    cutoff = archive_cutoff(ARCHIVE_AFTER_DAYS if days is None else days)
+    moved, freed = archive_scores(cutoff)
+    for month, count in moved.items():
+        print(f"Archived {count} scores from {month} into {ARCHIVE_DIR}.")
+    print(f"Archived {sum(moved.values())} scores older than {cutoff:%Y-%m-%d %H:%M}.")
+    if freed is None:
+        print("auto_vacuum is not INCREMENTAL; run `flask --app app archive-scores --full-vacuum` once to enable it.")
+    else:
+        print(f"Incremental vacuum freed {freed} pages.")
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
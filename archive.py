@@ -0,0 +1,181 @@
+"""分數歸檔：把舊的 Score (連同 Replay) 搬到每月一個的 SQLite 檔，熱資料庫只保留近期資料
+
+- <目錄>/scores-YYYY-MM.db：score、replay 與該月每位玩家的 user_summary (局數、最高分)，只會新增不會修改
+- 主資料庫的彙總表 (app.ArchiveSummary) 保存同樣的每月彙總，總局數與月榜不必打開歸檔檔就能查詢
+- 每一批先提交到歸檔檔，再於主資料庫更新彙總並刪除原資料；中途中斷時重跑即可
+  (歸檔保留原本的 Score id 並以 INSERT OR IGNORE 去重，彙總每次都從歸檔內容重新計算)
+"""
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+
+MONTH_PATTERN = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+_ARCHIVE_FILE = re.compile(r'^scores-(\d{4}-\d{2})\.db$')
+
+ARCHIVE_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS {schema}.score ('
+    'id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, score_value INTEGER NOT NULL, timestamp DATETIME NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS {schema}.score_user_id ON score (user_id, timestamp)',
+    'CREATE TABLE IF NOT EXISTS {schema}.replay (score_id INTEGER PRIMARY KEY, data BLOB NOT NULL)',
+    'CREATE TABLE IF NOT EXISTS {schema}.user_summary ('
+    'user_id INTEGER PRIMARY KEY, games INTEGER NOT NULL, best_score INTEGER NOT NULL, best_at DATETIME NOT NULL)',
+)
+
+
+def month_bounds(month):
+    """'YYYY-MM' -> (該月第一天, 下個月第一天)，與 Score.timestamp 相同的文字格式，可直接比較"""
+    year, mon = int(month[:4]), int(month[5:7])
+    start = datetime(year, mon, 1)
+    end = datetime(year + mon // 12, mon % 12 + 1, 1)
+    return str(start), str(end)
+
+
+class ScoreArchiver:
+    """歸檔作業；db 必須是作業專用的連線 (不能是連線池中的連線)，因為會 ATTACH 歸檔檔並使用 TEMP 資料表"""
+
+    def __init__(self, directory, summary_table='archivesummary', batch_size=5000):
+        self.directory = directory
+        self.summary_table = summary_table
+        self.batch_size = batch_size
+
+    def path(self, month):
+        return os.path.join(self.directory, f'scores-{month}.db')
+
+    def _move_batch(self, db, month):
+        """搬移一批 (最舊的 batch_size 筆已選入 temp.archive_batch)"""
+        batch_users = 'SELECT DISTINCT user_id FROM main.score WHERE id IN temp.archive_batch'
+        # 第一個交易只寫入歸檔檔，主資料庫的寫入者不受影響
+        with db.atomic():
+            db.execute_sql('INSERT OR IGNORE INTO archive.score (id, user_id, score_value, timestamp) '
+                           'SELECT id, user_id, score_value, timestamp FROM main.score WHERE id IN temp.archive_batch')
+            db.execute_sql('INSERT OR IGNORE INTO archive.replay (score_id, data) '
+                           'SELECT score_id, data FROM main.replay WHERE score_id IN temp.archive_batch')
+            # SQLite 在 MAX() 聚合時，timestamp 會取自最高分那一列
+            db.execute_sql('INSERT OR REPLACE INTO archive.user_summary (user_id, games, best_score, best_at) '
+                           'SELECT user_id, COUNT(*), MAX(score_value), timestamp FROM archive.score '
+                           f'WHERE user_id IN ({batch_users}) GROUP BY user_id')
+        # 歸檔已提交，才在主資料庫更新彙總並刪除；兩者在同一個交易內
+        with db.atomic():
+            db.execute_sql(f'INSERT OR REPLACE INTO main.{self.summary_table} (month, user_id, games, best_score, best_at) '
+                           f'SELECT ?, user_id, games, best_score, best_at FROM archive.user_summary '
+                           f'WHERE user_id IN ({batch_users})', (month,))
+            db.execute_sql('DELETE FROM main.replay WHERE score_id IN temp.archive_batch')
+            db.execute_sql('DELETE FROM main.score WHERE id IN temp.archive_batch')
+
+    def archive(self, db, cutoff, progress=None):
+        """把 timestamp < cutoff 的分數依月份搬到歸檔檔，回傳 {月份: 搬移筆數}；progress(月份, 累計筆數) 於每批後呼叫"""
+        os.makedirs(self.directory, exist_ok=True)
+        cutoff = str(cutoff)
+        months = [month for month, in db.execute_sql(
+            'SELECT DISTINCT substr(timestamp, 1, 7) FROM main.score WHERE timestamp < ?', (cutoff,)).fetchall()]
+        db.execute_sql('CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)')
+        moved = {}
+        for month in sorted(months):
+            start, end = month_bounds(month)
+            end = min(end, cutoff)
+            db.execute_sql('ATTACH DATABASE ? AS archive', (self.path(month),))
+            try:
+                for statement in ARCHIVE_SCHEMA:
+                    db.execute_sql(statement.format(schema='archive'))
+                moved[month] = 0
+                while True:
+                    db.execute_sql('DELETE FROM temp.archive_batch')
+                    count = db.execute_sql('INSERT INTO temp.archive_batch (id) SELECT id FROM main.score '
+                                           'WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp, id LIMIT ?',
+                                           (start, end, self.batch_size)).rowcount
+                    if count <= 0:
+                        break
+                    self._move_batch(db, month)
+                    moved[month] += count
+                    if progress is not None:
+                        progress(month, moved[month])
+            finally:
+                db.execute_sql('DETACH DATABASE archive')
+        return moved
+
+
+def incremental_vacuum(db, pages=1000):
+    """把主資料庫的空閒頁分批歸還給檔案系統 (每批只短暫持有寫入鎖)，回傳釋放的頁數
+
+    auto_vacuum 不是 INCREMENTAL 時回傳 None：既有資料庫需要一次完整的 VACUUM 才能切換。
+    """
+    if db.execute_sql('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        return None
+    freed = 0
+    while True:
+        free = db.execute_sql('PRAGMA freelist_count').fetchone()[0]
+        if not free:
+            break
+        db.execute_sql(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+        remaining = db.execute_sql('PRAGMA freelist_count').fetchone()[0]
+        if remaining >= free:
+            break
+        freed += free - remaining
+    # WAL 檔中已搬移的頁面寫回主檔後截斷
+    db.execute_sql('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+    return freed
+
+
+class ArchiveReader:
+    """唯讀查詢歸檔：共用一條記憶體連線，查到哪個月份才以唯讀模式 ATTACH 該月的檔案
+
+    SQLite 同時可 ATTACH 的資料庫數有限 (預設 10)，超過 max_attached 時先 DETACH 最久沒用到的月份。
+    """
+
+    def __init__(self, directory, max_attached=8):
+        self.directory = directory
+        self.max_attached = max_attached
+        self._lock = threading.Lock()
+        self._conn = None
+        self._attached = OrderedDict()  # 月份 -> schema 名稱，最久沒用的在前
+        self.attaches = 0
+
+    def path(self, month):
+        return os.path.join(self.directory, f'scores-{month}.db')
+
+    def months(self):
+        """已有歸檔檔的月份 (由舊到新)"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted(m.group(1) for m in map(_ARCHIVE_FILE.match, names) if m)
+
+    def _schema(self, month):
+        schema = self._attached.pop(month, None)
+        if schema is None:
+            if self._conn is None:
+                self._conn = sqlite3.connect('file::memory:', uri=True, check_same_thread=False)
+            if len(self._attached) >= self.max_attached:
+                _, oldest = self._attached.popitem(last=False)
+                self._conn.execute(f'DETACH DATABASE {oldest}')
+            schema = 'm' + month.replace('-', '_')
+            uri = Path(self.path(month)).resolve().as_uri() + '?mode=ro'
+            self._conn.execute(f'ATTACH DATABASE ? AS {schema}', (uri,))
+            self.attaches += 1
+        self._attached[month] = schema
+        return schema
+
+    def query(self, month, sql, params=()):
+        """在某個月份的歸檔上執行查詢，sql 中以 {schema} 代表該月的 schema 名稱；月份不存在時拋出 KeyError"""
+        if not MONTH_PATTERN.match(month) or not os.path.isfile(self.path(month)):
+            raise KeyError(month)
+        with self._lock:
+            schema = self._schema(month)
+            return self._conn.execute(sql.format(schema=schema), params).fetchall()
+
+    def scores(self, month, user_id=None, after_id=0, limit=100):
+        """某月歸檔的分數 [(id, user_id, score_value, timestamp), ...]，依 id 排序，以 after_id 分頁"""
+        if user_id is None:
+            return self.query(month, 'SELECT id, user_id, score_value, timestamp FROM {schema}.score '
+                                     'WHERE id > ? ORDER BY id LIMIT ?', (after_id, limit))
+        return self.query(month, 'SELECT id, user_id, score_value, timestamp FROM {schema}.score '
+                                 'WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?', (user_id, after_id, limit))
+
+    def stats(self):
+        with self._lock:
+            return {'attached': len(self._attached), 'attaches': self.attaches}
@@ -0,0 +1,347 @@
+# pip install uvicorn
+"""ASGI 進入點：uvicorn asgi:application --host 127.0.0.1 --port 8497
+
+熱門路由 (/、/submit_score、/submit_scores、英雄榜 JSON 與 /leaderboard/stream) 與資料匯出直接以 async 處理，
+資料庫工作交給專用的執行緒池；閒置或慢速的連線只佔用事件迴圈上的一個 socket，不會佔住執行緒。
+其他路由原封不動轉交給 app.py 的 Flask (WSGI) app，在另一個執行緒池執行，兩種部署方式可以並存。
+"""
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from itsdangerous import BadSignature
+from werkzeug.http import parse_accept_header, parse_cookie
+import app as web
+from export import ExportError
+from leaderboard_stream import TooManySubscribers
+
+# 資料庫執行緒池大小 (建議不超過 DB_MAX_CONNECTIONS)
+ASGI_DB_WORKERS = int(os.environ.get('ASGI_DB_WORKERS', 8))
+# 轉交 Flask 的其他路由使用的執行緒池大小
+ASGI_WSGI_WORKERS = int(os.environ.get('ASGI_WSGI_WORKERS', 8))
+# ASGI 模式下即時英雄榜的連線只佔事件迴圈，上限可以遠高於 waitress
+ASGI_STREAM_MAX_CLIENTS = int(os.environ.get('ASGI_STREAM_MAX_CLIENTS', 5000))
+MAX_BODY_BYTES = 1024 * 1024
+
+db_executor = ThreadPoolExecutor(ASGI_DB_WORKERS, thread_name_prefix='asgi-db')
+wsgi_executor = ThreadPoolExecutor(ASGI_WSGI_WORKERS, thread_name_prefix='asgi-wsgi')
+web.leaderboard_stream.max_clients = ASGI_STREAM_MAX_CLIENTS
+
+
+def _run_db(fn, args):
+    # 與 teardown_request 相同：用完就把連線還給連線池
+    try:
+        return fn(*args)
+    finally:
+        if not web.db.is_closed():
+            web.db.close()
+
+
+async def db_call(fn, *args):
+    """在資料庫執行緒池中執行 fn(*args)"""
+    return await asyncio.get_running_loop().run_in_executor(db_executor, _run_db, fn, args)
+
+
+# --- WSGI 轉接 ---
+
+def build_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client')
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0] if client else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1')
+        value = value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'content-length':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+def run_wsgi(wsgi_app, environ):
+    """執行一個 WSGI app，回傳 (狀態碼, 標頭, 完整內容)"""
+    response = []
+    chunks = []
+
+    def start_response(status, headers, exc_info=None):
+        response[:] = [int(status.split(' ', 1)[0]), headers]
+        return chunks.append
+
+    result = wsgi_app(environ, start_response)
+    try:
+        for chunk in result:
+            chunks.append(chunk)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    status, headers = response
+    return status, headers, b''.join(chunks)
+
+
+async def send_response(send, status, headers, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json(send, payload, status=200, headers=()):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    await send_response(send, status, [('Content-Type', 'application/json'),
+                                       ('Content-Length', str(len(body))), *headers], body)
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body += message.get('body', b'')
+        if len(body) > MAX_BODY_BYTES:
+            return None
+        if not message.get('more_body'):
+            return body
+
+
+async def forward(scope, receive, send, body=None):
+    """轉交給 Flask app (在 wsgi 執行緒池中執行)"""
+    if body is None:
+        body = await read_body(receive)
+        if body is None:
+            await send_json(send, {'success': False, 'message': 'Request body too large.'}, 413)
+            return
+    # Flask 的 after_request 會自行記錄這個請求的指標
+    scope['forwarded'] = True
+    environ = build_environ(scope, body)
+    status, headers, content = await asyncio.get_running_loop().run_in_executor(
+        wsgi_executor, run_wsgi, web.app, environ)
+    await send_response(send, status, headers, content)
+
+
+# --- async 路由 ---
+
+def load_session(scope):
+    """解開 Flask 的 session cookie (不需要 request context)；無效或過期時回傳空字典"""
+    cookies = {}
+    for name, value in scope['headers']:
+        if name == b'cookie':
+            cookies.update(parse_cookie(value.decode('latin-1')))
+    value = cookies.get(web.app.config['SESSION_COOKIE_NAME'])
+    if not value:
+        return {}
+    serializer = web.app.session_interface.get_signing_serializer(web.app)
+    try:
+        return serializer.loads(value, max_age=int(web.app.permanent_session_lifetime.total_seconds()))
+    except BadSignature:
+        return {}
+
+
+async def index(scope, receive, send):
+    # 英雄榜快取未命中時才會查詢資料庫，放在資料庫執行緒池；樣板渲染 (頁面快取未命中時) 不涉及 I/O，直接在事件迴圈執行
+    try:
+        version, leaderboard = await db_call(web.leaderboard_cache.top_with_version, 10)
+    except Exception:
+        # 錯誤處理 (flash 訊息) 交給原本的 Flask 路由
+        await forward(scope, receive, send)
+        return
+    environ = build_environ(scope, b'')
+    with web.app.request_context(environ):
+        response = web.app.make_response(web.index_page(version, leaderboard))
+        response = web.app.process_response(response)
+    await send_response(send, *run_wsgi(response, environ))
+
+
+async def submit_score(scope, receive, send, handler):
+    """/submit_score 與 /submit_scores；handler 為 app.py 中對應的處理函式"""
+    body = await read_body(receive)
+    if body is None:
+        await send_json(send, {'success': False, 'message': 'Request body too large.'}, 413)
+        return
+    session = load_session(scope)
+    content_type = dict(scope['headers']).get(b'content-type', b'').split(b';')[0].strip()
+    if 'user_id' not in session or content_type != b'application/json':
+        # 未登入 (轉址並顯示 flash) 或格式錯誤的情況與 Flask 版完全相同
+        await forward(scope, receive, send, body)
+        return
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        await forward(scope, receive, send, body)
+        return
+    result, status = await db_call(handler, session['user_id'], session.get('username'), payload)
+    await send_json(send, result, status)
+
+
+async def leaderboard_api(scope, receive, send, period):
+    if period not in web.BOARD_TITLES:
+        await forward(scope, receive, send)
+        return
+    query = parse_qs(scope['query_string'].decode('latin-1'))
+    try:
+        n = min(int(query.get('n', ['10'])[0]), web.LEADERBOARD_SIZE)
+    except ValueError:
+        n = 10
+    start = web.period_start(period).isoformat() if period != 'all' else None
+    board = await db_call(web.load_board, period, n)
+    await send_json(send, {'success': True, 'period': period, 'period_start': start, 'leaderboard': board})
+
+
+async def leaderboard_stream(scope, receive, send):
+    """即時英雄榜：每個連線只是事件迴圈上的一個 async generator"""
+    broadcaster = web.leaderboard_stream
+    try:
+        subscription = broadcaster.subscribe(asyncio.get_running_loop())
+    except TooManySubscribers as e:
+        await send_json(send, {'success': False, 'message': str(e), 'poll': '/api/leaderboard/all',
+                               'poll_seconds': web.STREAM_POLL_SECONDS}, 503,
+                        [('Retry-After', str(web.STREAM_POLL_SECONDS))])
+        return
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'text/event-stream; charset=utf-8'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no')],
+    })
+
+    async def pump():
+        async for chunk in broadcaster.astream(subscription):
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+
+    async def disconnected():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(disconnected())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        broadcaster.unsubscribe(subscription)
+
+
+async def export_table(scope, receive, send, table):
+    """資料匯出：每一批在資料庫執行緒池讀取並編碼，送出之後才讀下一批 (不經 WSGI 轉接，不會整份緩衝在記憶體)"""
+    session = load_session(scope)
+    headers = dict(scope['headers'])
+    username = session.get('username') if 'user_id' in session else None
+    if not web.is_admin(username, headers.get(b'authorization', b'').decode('latin-1')):
+        await send_json(send, {'success': False, 'message': 'Administrator access required.'}, 403)
+        return
+    query = parse_qs(scope['query_string'].decode('latin-1'))
+    compress = 'gzip' in parse_accept_header(headers.get(b'accept-encoding', b'').decode('latin-1'))
+    try:
+        response_headers, chunks = web.export_stream(table, query.get('format', ['ndjson'])[0],
+                                                     query.get('since', [None])[0], compress)
+    except ExportError as e:
+        await send_json(send, {'success': False, 'message': str(e)}, 400)
+        return
+    response_headers += [('Vary', 'Accept-Encoding'), ('Cache-Control', 'no-store')]
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response_headers],
+    })
+
+    async def pump():
+        while True:
+            chunk = await db_call(next, chunks, None)
+            if chunk is None:
+                break
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def disconnected():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    # 客戶端中斷時停止讀取下一批
+    tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(disconnected())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def timed(endpoint, handler, scope, receive, send, *args):
+    """執行 async 路由並記錄到 /metrics (與 Flask 路由相同的 endpoint 名稱)"""
+    started = time.perf_counter()
+    status = 500
+
+    async def send_with_status(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        await send(message)
+
+    try:
+        await handler(scope, receive, send_with_status, *args)
+    finally:
+        if not scope.get('forwarded'):
+            web.metrics.observe_request(endpoint, scope['method'], status, time.perf_counter() - started)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            web.password_hasher.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # 結束所有即時英雄榜連線；佇列的寫入由 app.py 的 atexit 處理
+            web.leaderboard_stream.stop()
+            db_executor.shutdown(wait=True)
+            wsgi_executor.shutdown(wait=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    path, method = scope['path'], scope['method']
+    if path == '/' and method == 'GET':
+        await timed('index', index, scope, receive, send)
+    elif path == '/submit_score' and method == 'POST':
+        await timed('submit_score', submit_score, scope, receive, send, web.handle_score_submission)
+    elif path == '/submit_scores' and method == 'POST':
+        await timed('submit_scores', submit_score, scope, receive, send, web.handle_bulk_submission)
+    elif path == '/leaderboard/stream' and method == 'GET':
+        await leaderboard_stream(scope, receive, send)
+    elif path.startswith('/admin/export/') and path.count('/') == 3 and method == 'GET':
+        await timed('export_table', export_table, scope, receive, send, path.rsplit('/', 1)[1])
+    elif path.startswith('/api/leaderboard/') and path.count('/') == 3 and method == 'GET':
+        await timed('leaderboard_api', leaderboard_api, scope, receive, send, path.rsplit('/', 1)[1])
+    else:
+        await forward(scope, receive, send)
@@ -0,0 +1,196 @@
+"""高並發連線基準測試：比較 waitress (server.py，執行緒) 與 uvicorn (asgi.py，事件迴圈)
+
+requests 情境：同時維持 --connections 個客戶端，輪流送出 GET /、GET /api/leaderboard/all 與
+(已登入的) POST /submit_score，統計成功數、錯誤數、延遲百分位數與每秒請求數。
+stream 情境：同時開啟 --connections 個 /leaderboard/stream 連線，送出一筆新分數後量測
+每個連線收到 diff 的延遲。
+每個伺服器都在獨立的子行程與暫存資料庫中啟動 (REQUIRE_REPLAY=0)。
+用法：python benchmarks/bench_asgi.py [--connections 1000] [--requests 5] [--servers waitress,uvicorn]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOST = '127.0.0.1'
+
+SERVERS = {
+    'waitress': lambda port: [sys.executable, '-c',
+                              'import app; from waitress import serve; '
+                              f'serve(app.app, host="{HOST}", port={port}, threads=8)'],
+    'uvicorn': lambda port: [sys.executable, '-m', 'uvicorn', 'asgi:application',
+                             '--host', HOST, '--port', str(port), '--log-level', 'warning'],
+}
+
+
+def start_server(name, port, tmp):
+    env = dict(os.environ, PYTHONPATH=ROOT, REQUIRE_REPLAY='0', BCRYPT_ROUNDS='4',
+               STREAM_MAX_CLIENTS='100000', ASGI_STREAM_MAX_CLIENTS='100000')
+    process = subprocess.Popen(SERVERS[name](port), cwd=tmp, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f'http://{HOST}:{port}/login', timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{name} did not start')
+
+
+def login_cookie(port):
+    """註冊並登入測試帳號，回傳 Cookie 標頭"""
+    jar = CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    form = urllib.parse.urlencode({'username': 'bench_user', 'password': 'bench_password',
+                                   'confirm': 'bench_password'}).encode()
+    opener.open(f'http://{HOST}:{port}/register', form).close()
+    opener.open(f'http://{HOST}:{port}/login', form).close()
+    return '; '.join(f'{c.name}={c.value}' for c in jar)
+
+
+def build_request(method, path, cookie='', body=b''):
+    lines = [f'{method} {path} HTTP/1.1', f'Host: {HOST}', 'Connection: close']
+    if cookie:
+        lines.append(f'Cookie: {cookie}')
+    if body:
+        lines += ['Content-Type: application/json', f'Content-Length: {len(body)}']
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode() + body
+
+
+async def fetch(port, payload, timeout):
+    """送出一個請求並讀到連線關閉，回傳狀態碼"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(HOST, port), timeout)
+    try:
+        writer.write(payload)
+        data = await asyncio.wait_for(reader.read(), timeout)
+        return int(data.split(b' ', 2)[1])
+    finally:
+        writer.close()
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 1)
+    return {'p50_ms': pick(0.50), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99)}
+
+
+async def run_requests(port, connections, per_client, cookie, timeout):
+    payloads = [build_request('GET', '/'),
+                build_request('GET', '/api/leaderboard/all'),
+                None]
+    latencies, errors = [], []
+
+    async def client(c):
+        for i in range(per_client):
+            payload = payloads[(c + i) % 3]
+            if payload is None:
+                body = json.dumps({'score': 50 + (c * per_client + i) % 500}).encode()
+                payload = build_request('POST', '/submit_score', cookie, body)
+            started = time.perf_counter()
+            try:
+                status = await fetch(port, payload, timeout)
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError) as e:
+                errors.append(type(e).__name__)
+                continue
+            if status == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors.append(str(status))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(connections)))
+    elapsed = time.perf_counter() - started
+    return {'ok': len(latencies), 'errors': len(errors), 'error_kinds': sorted(set(errors)),
+            'req_per_s': round(len(latencies) / elapsed, 1), **percentiles(latencies)}
+
+
+async def run_stream(port, connections, cookie, timeout):
+    connected = asyncio.Event()
+    ready, delays, errors = [], [], []
+    submitted = {}
+
+    async def listen():
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(HOST, port), timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            errors.append(type(e).__name__)
+            return
+        try:
+            writer.write(build_request('GET', '/leaderboard/stream'))
+            status = int((await asyncio.wait_for(reader.readline(), timeout)).split(b' ', 2)[1])
+            if status != 200:
+                errors.append(str(status))
+                return
+            await asyncio.wait_for(reader.readuntil(b'event: snapshot'), timeout)
+            ready.append(1)
+            if len(ready) + len(errors) >= connections:
+                connected.set()
+            # 前一個情境的分數可能還有 diff 在路上，只計算送出新分數之後收到的
+            while True:
+                await asyncio.wait_for(reader.readuntil(b'event: diff'), timeout)
+                if 'at' in submitted:
+                    break
+            delays.append(time.perf_counter() - submitted['at'])
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, IndexError, ValueError) as e:
+            errors.append(type(e).__name__)
+        finally:
+            if len(ready) + len(errors) >= connections:
+                connected.set()
+            writer.close()
+
+    tasks = [asyncio.ensure_future(listen()) for _ in range(connections)]
+    try:
+        await asyncio.wait_for(connected.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    submitted['at'] = time.perf_counter()
+    body = json.dumps({'score': 99999}).encode()
+    try:
+        # 執行緒全被串流佔住時，這個請求本身也會排不進去
+        submit = await fetch(port, build_request('POST', '/submit_score', cookie, body), timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        submit = type(e).__name__
+    await asyncio.gather(*tasks)
+    return {'connected': len(ready), 'submit': submit, 'received_diff': len(delays), 'errors': len(errors),
+            'error_kinds': sorted(set(errors)), **percentiles(delays)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=5, help='每個客戶端送出的請求數')
+    parser.add_argument('--servers', default='waitress,uvicorn')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--port', type=int, default=8600)
+    args = parser.parse_args()
+
+    results = {}
+    for offset, name in enumerate(args.servers.split(',')):
+        port = args.port + offset
+        with tempfile.TemporaryDirectory() as tmp:
+            process = start_server(name, port, tmp)
+            try:
+                cookie = login_cookie(port)
+                results[name] = {
+                    'requests': asyncio.run(run_requests(port, args.connections, args.requests, cookie, args.timeout)),
+                    'stream': asyncio.run(run_stream(port, args.connections, cookie, args.timeout)),
+                }
+            finally:
+                process.terminate()
+                process.wait()
+        print(name, json.dumps(results[name]), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""資料庫層基準測試：比較調校前後 (單一連線 + 預設 journal vs 連線池 + WAL) 的每秒請求數
+
+用法：python benchmarks/bench_db.py [--requests 2000] [--threads 8]
+每種設定都在獨立的子行程與暫存資料庫中執行，因為 app.py 在匯入時就會讀取環境變數。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIGS = {
+    'before': {'DB_POOL': '0', 'DB_JOURNAL_MODE': 'delete', 'DB_SYNCHRONOUS': 'full',
+               'DB_CACHE_SIZE': '-2000', 'DB_MMAP_SIZE': '0'},
+    'after': {'DB_POOL': '1', 'DB_JOURNAL_MODE': 'wal', 'DB_SYNCHRONOUS': 'normal'},
+}
+
+ROUTES = {
+    'index': lambda c, i: c.get('/'),
+    'rank': lambda c, i: c.get('/api/rank/bench_user'),
+    'submit_score': lambda c, i: c.post('/submit_score', json={'score': 50 + i % 500}),
+    'static': lambda c, i: c.get('/static/images/pig.png'),
+}
+
+
+def run_worker(requests, threads):
+    sys.path.insert(0, ROOT)
+    import app as game_app
+
+    game_app.User.create_user('bench_user', 'bench_password')
+    user = game_app.User.get(game_app.User.username == 'bench_user')
+    game_app.db.close()
+
+    def make_client():
+        client = game_app.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = user.id
+            sess['username'] = user.username
+        return client
+
+    results = {}
+    for name, call in ROUTES.items():
+        per_thread = requests // threads
+
+        def work(_):
+            client = make_client()
+            for i in range(per_thread):
+                response = call(client, i)
+                response.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            list(pool.map(work, range(threads)))
+        elapsed = time.perf_counter() - started
+        results[name] = round(per_thread * threads / elapsed, 1)
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        run_worker(args.requests, args.threads)
+        return
+
+    report = {}
+    for name, overrides in CONFIGS.items():
+        with tempfile.TemporaryDirectory() as tmp:
+            # 基準測試直接送分數，不附重播
+            env = dict(os.environ, DB_PATH=os.path.join(tmp, 'bench.db'), REQUIRE_REPLAY='0', **overrides)
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--worker',
+                 '--requests', str(args.requests), '--threads', str(args.threads)],
+                env=env, cwd=tmp, check=True, capture_output=True, text=True).stdout
+            report[name] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'route':<14}{'before req/s':>14}{'after req/s':>14}")
+    for route in ROUTES:
+        print(f"{route:<14}{report['before'][route]:>14}{report['after'][route]:>14}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""大型關卡的物理基準測試：比較逐一比對、空間索引與欄位儲存在不同小豬數量下的耗時
+
+分別量測 Poisson-disk 擺放、鳥與小豬的碰撞判定 (一律逐一比對)、被打中後的重新定位，以及完整的一步
+(最後一欄為 column_world.ColumnWorld 的一步)。
+用法：python benchmarks/bench_pigs.py [--counts 10,50,100,250,500,1000] [--repeat 2000]
+"""
+import argparse
+import os
+import sys
+import time
+from random import Random
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from static import physics
+import column_world
+
+
+def per_call(fn, repeat):
+    started = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def measure(pig_count, use_grid, repeat):
+    started = time.perf_counter()
+    world = physics.World(1, pig_count, use_grid=use_grid)
+    layout_ms = (time.perf_counter() - started) * 1000
+    world.step()
+
+    # 鳥中心隨機落在小豬活動範圍附近 (碰撞判定最貴的區域)
+    rng = Random(0)
+    points = [(rng.uniform(physics.PIG_MIN_X - 60, physics.PIG_MAX_X + 60),
+               rng.uniform(physics.PIG_MIN_Y - 60, physics.PIG_MAX_Y + 60)) for _ in range(repeat)]
+    bird = physics.Bird(0, 0, 0, 0)
+    half = physics.BIRD_SIZE / 2
+    hits = []
+
+    def hit(i):
+        x, y = points[i]
+        bird.active = True
+        bird.x, bird.y, bird.vy = x - half, y - half, -physics.GRAVITY
+        hits.append(bird.update(world.pigs))
+
+    hit_us = per_call(hit, repeat)
+    relocate_us = per_call(lambda i: world.pigs[i % pig_count].relocate(world.pigs), repeat // 10 or 1)
+
+    # 持續往小豬區發射，讓每一步都有鳥在飛
+    world.shots_fired = -10 ** 9
+
+    def step(i):
+        if world.projectile is None:
+            world.launch(150 + i % 40, -60 - i % 50)
+        world.step()
+
+    step_us = per_call(step, repeat)
+    return layout_ms, hit_us, relocate_us, step_us, [p.index if p else None for p in hits]
+
+
+def measure_columns(pig_count, repeat):
+    world = column_world.ColumnWorld(1, pig_count)
+    world.shots_fired = -10 ** 9
+
+    def step(i):
+        if world.projectile is None:
+            world.launch(150 + i % 40, -60 - i % 50)
+        world.step()
+
+    return per_call(step, repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--counts', default='10,50,100,250,500,1000')
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'pigs':>6} {'layout ms':>10} {'hit us':>8} {'relocate us (linear/grid)':>26} "
+          f"{'step us (linear/grid/columns)':>30}")
+    for pig_count in (int(n) for n in args.counts.split(',')):
+        layout, hit, relocate, step, _ = measure(pig_count, False, args.repeat)
+        _, _, grid_relocate, grid_step, _ = measure(pig_count, True, args.repeat)
+        columns_step = measure_columns(pig_count, args.repeat)
+        print(f"{pig_count:>6} {layout:>10.2f} {hit:>8.1f} "
+              f"{relocate:>12.1f} /{grid_relocate:>11.1f} {step:>10.1f} /{grid_step:>8.1f} /{columns_step:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
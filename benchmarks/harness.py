@@ -0,0 +1,336 @@
+"""Web 層基準測試工具：以暫存資料庫重播請求軌跡，輸出每個路由的延遲、吞吐量與資料庫鎖等待 (JSON)
+
+流程：
+1. 在暫存目錄建立 SQLite 資料庫，預先建立 --users 個玩家 (bench_user_<i>，密碼 bench_password)
+   與 --scores 筆分數 (分散在最近 --days 天)。
+2. 以全新的子行程匯入 app.py (讓啟動時的快取暖機讀到預先建立的資料)，
+   用 --threads 個執行緒以 Flask test client 重播軌跡。
+3. 輸出 JSON：每個路由的 count / errors / p50 / p95 / p99 (毫秒) / 每秒請求數，
+   以及該路由的 SQL 次數、SQL 耗時、連線池等待與鎖等待。
+
+軌跡為 JSONL，每行一個請求：
+    {"op": "index"}                              GET /
+    {"op": "game", "user": 3}                    GET /game (尚未登入時直接設定 session，不計入)
+    {"op": "login", "user": 3}                   POST /login
+    {"op": "register", "user": 1000001}          POST /register (使用者名稱 trace_user_<user>)
+    {"op": "submit_score", "user": 3, "score": 120}
+user 為預先建立的玩家編號 (register 除外)；同一位玩家的請求依軌跡順序在同一個執行緒送出。
+
+鎖等待：沿用 /metrics 的判定 (metrics.Metrics)，把耗時超過 --lock-threshold-ms 的寫入語句
+(INSERT / UPDATE / DELETE / BEGIN / COMMIT) 視為曾等待寫入鎖，另計 "database is locked" 錯誤。
+write-behind 模式 (SCORE_WRITE_MODE=behind) 的寫入發生在背景執行緒，統計在 "background"。
+
+用法：
+    python benchmarks/harness.py [--users 1000] [--scores 20000] [--threads 8] [--trace trace.jsonl]
+                                 [--requests 5000] [--mix index=10,game=3,login=2,register=1,submit_score=8]
+                                 [--env SCORE_WRITE_MODE=behind] [--output result.json] [--compare base.json]
+    python benchmarks/harness.py --write-trace trace.jsonl --requests 5000   # 只產生合成軌跡
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from random import Random
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'bench_password'
+DEFAULT_MIX = 'index=10,game=3,login=2,register=1,submit_score=8'
+DB_KEYS = ('db_queries', 'db_writes', 'db_ms', 'db_pool_wait_ms', 'db_lock_waits', 'db_lock_wait_ms', 'db_locked_errors')
+
+# 每種請求的路徑、成功時的狀態碼 (200 代表任何 2xx，write-behind 模式的分數回應 202) 與是否需要登入
+OPS = {
+    'index': ('/', 200, False),
+    'game': ('/game', 200, True),
+    'login': ('/login', 302, False),
+    'register': ('/register', 302, False),
+    'submit_score': ('/submit_score', 200, True),
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        op, _, weight = part.partition('=')
+        if op not in OPS:
+            raise SystemExit(f'Unknown op in --mix: {op}')
+        mix[op] = float(weight or 1)
+    return mix
+
+
+def generate_trace(count, users, mix, seed=0):
+    """依比例產生合成軌跡；玩家以 80/20 的方式集中 (少數玩家貢獻大部分請求)"""
+    rng = Random(seed)
+    ops, weights = zip(*mix.items())
+    hot = max(1, users // 5)
+    trace = []
+    for i in range(count):
+        op = rng.choices(ops, weights)[0]
+        user = rng.randrange(hot) if rng.random() < 0.8 else rng.randrange(users)
+        if op == 'register':
+            trace.append({'op': op, 'user': users + i})
+        elif op == 'submit_score':
+            trace.append({'op': op, 'user': user, 'score': rng.randrange(10, 1000, 10)})
+        elif op == 'index':
+            trace.append({'op': op})
+        else:
+            trace.append({'op': op, 'user': user})
+    return trace
+
+
+def load_trace(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 3)
+    return {'p50_ms': pick(0.50), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99)}
+
+
+# --- 子行程：建立資料 ---
+
+def seed_worker(users, scores, days):
+    sys.path.insert(0, ROOT)
+    import app as game_app
+
+    rng = Random(1)
+    password_hash = game_app.password_hasher.hash(PASSWORD)
+    with game_app.db.atomic():
+        for start in range(0, users, 500):
+            rows = [(f'bench_user_{i}', password_hash) for i in range(start, min(users, start + 500))]
+            game_app.User.insert_many(rows, fields=[game_app.User.username, game_app.User.password_hash]).execute()
+    ids = [user_id for user_id, in game_app.User.select(game_app.User.id).order_by(game_app.User.id).tuples()]
+    now = datetime.now()
+    rows = [(rng.choice(ids), rng.randrange(0, 1000, 10), now - timedelta(seconds=rng.uniform(0, days * 86400)), None)
+            for _ in range(scores)]
+    rows.sort(key=lambda row: row[2])
+    for start in range(0, len(rows), 5000):
+        game_app.save_scores(rows[start:start + 5000])
+    game_app.db.close()
+
+
+# --- 子行程：重播 ---
+
+class DbProbe:
+    """訂閱 app.metrics 的資料庫觀測 (Metrics.observe_db)，依目前執行緒的路由累計 SQL 次數與等待時間"""
+
+    def __init__(self, metrics, lock_threshold):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.stats = defaultdict(lambda: defaultdict(float))
+        metrics.busy_threshold = lock_threshold / 1000
+        metrics.observe_db(self.observe)
+
+    def route(self):
+        return getattr(self.local, 'route', 'background')
+
+    def observe(self, operation, seconds, write, busy, error):
+        with self.lock:
+            stats = self.stats[self.route()]
+            if operation == 'CONNECT':
+                stats['db_pool_wait_ms'] += seconds * 1000
+                return
+            if operation != 'COMMIT':
+                stats['db_queries'] += 1
+            stats['db_ms'] += seconds * 1000
+            if write:
+                stats['db_writes'] += 1
+            if busy:
+                stats['db_lock_waits'] += 1
+                stats['db_lock_wait_ms'] += seconds * 1000
+            if error == 'locked':
+                stats['db_locked_errors'] += 1
+
+
+def run_worker(trace, users, threads, lock_threshold):
+    sys.path.insert(0, ROOT)
+    import app as game_app
+
+    probe = DbProbe(game_app.metrics, lock_threshold)
+    ids = dict(game_app.User.select(game_app.User.username, game_app.User.id).tuples())
+    game_app.db.close()
+
+    # 同一位玩家的請求固定由同一個執行緒依序送出，保留登入狀態的先後關係
+    lanes = [[] for _ in range(threads)]
+    for i, entry in enumerate(trace):
+        lanes[entry.get('user', i) % threads].append(entry)
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    statuses = defaultdict(lambda: defaultdict(int))
+    lock = threading.Lock()
+
+    def send(client, entry):
+        op = entry['op']
+        path, expected, _ = OPS[op]
+        if op in ('login', 'register'):
+            name = f"{'trace' if op == 'register' else 'bench'}_user_{entry['user']}"
+            form = {'username': name, 'password': PASSWORD, 'confirm': PASSWORD}
+            return client.post(path, data=form), expected
+        if op == 'submit_score':
+            return client.post(path, json={'score': entry['score']}), expected
+        return client.get(path), expected
+
+    def work(lane):
+        clients = {}
+        for entry in lane:
+            op = entry['op']
+            user = entry.get('user')
+            client = clients.get(user)
+            if client is None:
+                client = clients[user] = game_app.app.test_client()
+            if OPS[op][2] and not getattr(client, 'logged_in', False):
+                # 軌跡中沒有先登入：直接設定 session (不計入統計)
+                username = f'bench_user_{user}'
+                with client.session_transaction() as sess:
+                    sess['user_id'] = ids.get(username)
+                    sess['username'] = username
+                client.logged_in = True
+            probe.local.route = op
+            started = time.perf_counter()
+            try:
+                response, expected = send(client, entry)
+                status = response.status_code
+                ok = status == expected if expected != 200 else 200 <= status < 300
+                if op == 'login' and ok:
+                    client.logged_in = True
+                response.close()
+            except Exception as e:
+                print(f"{op} error: {e}", file=sys.stderr)
+                status, ok = type(e).__name__, False
+            elapsed = time.perf_counter() - started
+            probe.local.route = 'background'
+            with lock:
+                statuses[op][str(status)] += 1
+                if ok:
+                    latencies[op].append(elapsed)
+                else:
+                    errors[op] += 1
+
+    workers = [threading.Thread(target=work, args=(lane,)) for lane in lanes]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    # 等待 write-behind 佇列寫完，背景寫入的鎖等待才會完整
+    if game_app.score_writer is not None:
+        game_app.score_writer.stop()
+
+    routes = {}
+    for op in OPS:
+        count = len(latencies[op]) + errors[op]
+        if not count:
+            continue
+        db_stats = {key: round(probe.stats[op][key], 3) for key in DB_KEYS}
+        routes[op] = {'count': count, 'errors': errors[op], 'statuses': dict(statuses[op]), **percentiles(latencies[op]),
+                      'req_per_s': round(count / elapsed, 1), **db_stats}
+    all_latencies = [value for samples in latencies.values() for value in samples]
+    total = {'count': len(trace), 'errors': sum(errors.values()), 'elapsed_s': round(elapsed, 3),
+             'req_per_s': round(len(trace) / elapsed, 1), **percentiles(all_latencies)}
+    background = {key: round(probe.stats['background'][key], 3) for key in DB_KEYS}
+    print(json.dumps({'routes': routes, 'total': total, 'background': background}))
+
+
+# --- 主行程 ---
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    """與先前的結果比較 p95 與吞吐量 (比值 > 1 代表變慢 / 變快)"""
+    print(f"{'route':<14}{'p95 ms':>12}{'base p95':>12}{'ratio':>8}{'req/s':>10}{'base req/s':>12}{'ratio':>8}")
+    for op, row in report['routes'].items():
+        base = baseline['routes'].get(op)
+        if not base or not row['p95_ms'] or not base['p95_ms']:
+            continue
+        print(f"{op:<14}{row['p95_ms']:>12.2f}{base['p95_ms']:>12.2f}{row['p95_ms'] / base['p95_ms']:>8.2f}"
+              f"{row['req_per_s']:>10.1f}{base['req_per_s']:>12.1f}{row['req_per_s'] / base['req_per_s']:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--scores', type=int, default=20000)
+    parser.add_argument('--days', type=int, default=14, help='預先建立的分數分散的天數')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--trace', help='JSONL 請求軌跡；未指定時依 --mix 產生合成軌跡')
+    parser.add_argument('--requests', type=int, default=5000, help='合成軌跡的請求數')
+    parser.add_argument('--mix', default=DEFAULT_MIX)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--lock-threshold-ms', type=float, default=2.0)
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='傳給 app.py 的環境變數 (可重複)，例如 SCORE_WRITE_MODE=behind')
+    parser.add_argument('--write-trace', help='把合成軌跡寫到檔案後結束')
+    parser.add_argument('--output', help='結果 JSON 的輸出檔案 (預設輸出到標準輸出)')
+    parser.add_argument('--compare', help='與先前的結果 JSON 比較')
+    parser.add_argument('--worker', choices=('seed', 'replay'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker == 'seed':
+        seed_worker(args.users, args.scores, args.days)
+        return
+    if args.worker == 'replay':
+        run_worker(load_trace(args.trace), args.users, args.threads, args.lock_threshold_ms)
+        return
+
+    trace = load_trace(args.trace) if args.trace else generate_trace(args.requests, args.users,
+                                                                     parse_mix(args.mix), args.seed)
+    if args.write_trace:
+        with open(args.write_trace, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(entry) + '\n' for entry in trace)
+        return
+
+    overrides = dict(item.split('=', 1) for item in args.env)
+    with tempfile.TemporaryDirectory() as tmp:
+        # 直接送分數，不附重播；其餘設定沿用目前環境，可用 --env 覆寫
+        env = dict(os.environ, DB_PATH=os.path.join(tmp, 'bench.db'), REQUIRE_REPLAY='0', **overrides)
+        common = [sys.executable, os.path.abspath(__file__), '--users', str(args.users),
+                  '--scores', str(args.scores), '--days', str(args.days)]
+        subprocess.run(common + ['--worker', 'seed'], env=env, cwd=tmp, check=True, capture_output=True)
+        trace_path = os.path.join(tmp, 'trace.jsonl')
+        with open(trace_path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(entry) + '\n' for entry in trace)
+        output = subprocess.run(common + ['--worker', 'replay', '--trace', trace_path,
+                                          '--threads', str(args.threads),
+                                          '--lock-threshold-ms', str(args.lock_threshold_ms)],
+                                env=env, cwd=tmp, check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'config': {'users': args.users, 'scores': args.scores, 'threads': args.threads,
+                   'trace': args.trace or f'synthetic:{args.mix}:{args.requests}:{args.seed}',
+                   'lock_threshold_ms': args.lock_threshold_ms, 'env': overrides},
+        **result,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
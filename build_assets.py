@@ -0,0 +1,152 @@
+# pip install brython==3.11.2 (brotli 為選用，安裝後會多產生 .br 檔)
+"""建置 /game 使用的 Brython bundle
+
+把 Brython 執行環境、game.py / physics.py 以及它們實際 import 到的標準函式庫模組
+打包成單一個以內容雜湊命名的 JS 檔，輸出到 static/dist/，並預先產生 .gz / .br 壓縮檔。
+app.py 透過 static/dist/manifest.json 找到最新的檔名。
+
+用法：python build_assets.py
+"""
+import argparse
+import ast
+import gzip
+import hashlib
+import json
+import os
+import sys
+
+try:
+    import brotli
+except ImportError:  # 沒有 brotli 時只產生 gzip
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+# 打包進 bundle 的自有模組 (位於 static/)
+APP_MODULES = ['game', 'physics']
+ENTRY_MODULE = 'game'
+
+
+def brython_data_dir():
+    try:
+        import brython
+    except ImportError:
+        sys.exit('Brython is not installed: pip install brython==3.11.2')
+    return os.path.join(os.path.dirname(brython.__file__), 'data')
+
+
+def read_text(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def load_stdlib_vfs(path):
+    """解析 brython_stdlib.js，回傳 {模組名稱: [副檔名, 原始碼, imports, (is_package)]}"""
+    source = read_text(path)
+    start = source.index('var scripts = ') + len('var scripts = ')
+    end = source.index('\n__BRYTHON__.update_VFS(scripts)', start)
+    scripts = json.loads(source[start:end].rstrip().rstrip(';'))
+    scripts.pop('$timestamp', None)
+    return scripts
+
+
+def _module_level_nodes(node):
+    # 不進入函式內部：函式內的 import (例如 physics.new_seed) 只會在伺服器端執行
+    for child in ast.iter_child_nodes(node):
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            continue
+        yield child
+        yield from _module_level_nodes(child)
+
+
+def module_imports(source):
+    """列出模組層級 import 的模組名稱 (含 from x import y 的 x.y 候選)"""
+    names = set()
+    for node in _module_level_nodes(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+            names.update(f'{node.module}.{alias.name}' for alias in node.names)
+    return sorted(names)
+
+
+def resolve_modules(app_sources, stdlib):
+    """從入口模組開始追蹤 import，只保留實際用到的標準函式庫模組"""
+    known = set(stdlib) | set(app_sources)
+    needed = {}
+    pending = [ENTRY_MODULE]
+    while pending:
+        name = pending.pop()
+        if name in needed or name not in known:
+            continue
+        if name in app_sources:
+            imports = [n for n in module_imports(app_sources[name]) if n in known]
+            needed[name] = ['.py', app_sources[name], imports]
+        else:
+            needed[name] = stdlib[name]
+            imports = stdlib[name][2] if len(stdlib[name]) > 2 else []
+        for imported in imports:
+            # 套件的子模組需要連同上層套件一起載入
+            parts = imported.split('.')
+            pending.extend('.'.join(parts[:i]) for i in range(1, len(parts) + 1))
+    return needed
+
+
+def write_compressed(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    with open(path + '.gz', 'wb') as f:
+        # mtime=0 讓相同內容每次都產生相同的壓縮檔
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def build():
+    data_dir = brython_data_dir()
+    stdlib = load_stdlib_vfs(os.path.join(data_dir, 'brython_stdlib.js'))
+    app_sources = {name: read_text(os.path.join(STATIC_DIR, name + '.py')) for name in APP_MODULES}
+    modules = resolve_modules(app_sources, stdlib)
+
+    # Brython 以 VFS 時間戳判斷瀏覽器端的編譯快取是否過期；取來源內容的雜湊 (而非修改時間)，內容不變時 bundle 也不變
+    sources = [os.path.join(STATIC_DIR, name + '.py') for name in APP_MODULES]
+    sources.append(os.path.join(data_dir, 'brython_stdlib.js'))
+    source_hash = hashlib.sha256()
+    for path in sources:
+        with open(path, 'rb') as f:
+            source_hash.update(f.read())
+    vfs = {'$timestamp': int(source_hash.hexdigest()[:12], 16)}
+    vfs.update(sorted(modules.items()))
+    bundle = '\n'.join([
+        read_text(os.path.join(data_dir, 'brython.js')),
+        '__BRYTHON__.use_VFS = true;',
+        'var scripts = ' + json.dumps(vfs, ensure_ascii=False, separators=(',', ':')),
+        '__BRYTHON__.update_VFS(scripts)',
+    ]).encode('utf-8')
+
+    digest = hashlib.sha256(bundle).hexdigest()[:12]
+    filename = f'game.{digest}.js'
+    os.makedirs(DIST_DIR, exist_ok=True)
+    # 移除舊版本，只保留這次建置的檔案
+    for old in os.listdir(DIST_DIR):
+        if old.startswith('game.') and not old.startswith(filename):
+            os.remove(os.path.join(DIST_DIR, old))
+    write_compressed(os.path.join(DIST_DIR, filename), bundle)
+    with open(os.path.join(DIST_DIR, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({'game.js': filename}, f, indent=2)
+
+    stdlib_names = sorted(name for name in modules if name not in app_sources)
+    print(f"Built static/dist/{filename}: {len(bundle) / 1024:.0f} KiB, "
+          f"{len(stdlib_names)} stdlib modules ({', '.join(stdlib_names)})")
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__.splitlines()[0]).parse_args()
+    build()
+
+
+if __name__ == '__main__':
+    main()
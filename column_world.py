@@ -0,0 +1,147 @@
+"""以欄位 (struct-of-arrays) 儲存小豬狀態的無繪圖模擬，供伺服器端與基準測試使用
+
+小豬的 x、y、vx、vy、alive、move_counter、move_duration 各是一個 NumPy 陣列，
+移動、反彈與碰撞判定一次處理整個關卡；只有會消耗亂數的事件 (換方向、重新定位)
+依小豬順序逐一處理，所以結果與 physics.World 完全一致。
+沒有 NumPy 時 ColumnWorld 就是 physics.World。
+"""
+from static import physics
+
+try:
+    import numpy as np
+except ImportError:  # 沒有 NumPy 時退回逐隻小豬的物件模擬
+    np = None
+
+
+def _column(name):
+    def get(self):
+        return self._columns[name][self.index].item()
+
+    def set(self, value):
+        self._columns[name][self.index] = value
+    return property(get, set)
+
+
+class PigView:
+    """ColumnWorld 中一隻小豬的物件介面，屬性與 physics.Pig 相同 (讀寫直接對應到欄位)"""
+    __slots__ = ('_columns', 'index')
+    w = h = physics.PIG_SIZE
+    house_blocks = physics.HOUSE_BLOCKS
+
+    x = _column('x')
+    y = _column('y')
+    vx = _column('vx')
+    vy = _column('vy')
+    alive = _column('alive')
+    move_counter = _column('move_counter')
+    move_duration = _column('move_duration')
+
+    def __init__(self, columns, index):
+        self._columns = columns
+        self.index = index
+
+    def hit(self, px, py):
+        return self.alive and self.x <= px <= self.x + self.w and self.y <= py <= self.y + self.h
+
+
+class _ColumnWorld(physics.World):
+    """與 physics.World 相同的介面，pigs 為 PigView 串列"""
+
+    def __init__(self, seed=None, pig_count=physics.PIG_COUNT, pig_cls=physics.Pig, bird_cls=physics.Bird,
+                 use_grid=False):
+        # 初始擺放沿用 physics.World (一次性的成本)，再把小豬狀態搬進欄位
+        super().__init__(seed, pig_count, pig_cls, bird_cls, use_grid=False)
+        pigs = self.pigs
+        self.columns = {
+            'x': np.array([p.x for p in pigs], dtype=np.float64),
+            'y': np.array([p.y for p in pigs], dtype=np.float64),
+            'vx': np.array([p.vx for p in pigs], dtype=np.float64),
+            'vy': np.array([p.vy for p in pigs], dtype=np.float64),
+            'alive': np.array([p.alive for p in pigs], dtype=bool),
+            'move_counter': np.array([p.move_counter for p in pigs], dtype=np.int64),
+            'move_duration': np.array([p.move_duration for p in pigs], dtype=np.int64),
+        }
+        self.pigs = [PigView(self.columns, i) for i in range(pig_count)]
+
+    def _retarget(self, j):
+        c = self.columns
+        c['vx'][j], c['vy'][j], c['move_duration'][j] = physics.random_motion(self.rng)
+        c['move_counter'][j] = 0
+
+    def _update_pigs(self):
+        """向量化的 physics.Pig.update()"""
+        c = self.columns
+        alive = c['alive']
+        vx, vy = c['vx'], c['vy']
+        counter = c['move_counter']
+        counter += alive
+        x = np.where(alive, c['x'] + vx, c['x'])
+        y = np.where(alive, c['y'] + vy, c['y'])
+
+        # 邊界檢查，碰到邊界就反彈
+        low, high = alive & (x < physics.PIG_MIN_X), alive & (x > physics.PIG_MAX_X)
+        x[low], vx[low] = physics.PIG_MIN_X, np.abs(vx[low])
+        x[high], vx[high] = physics.PIG_MAX_X, -np.abs(vx[high])
+        low, high = alive & (y < physics.PIG_MIN_Y), alive & (y > physics.PIG_MAX_Y)
+        y[low], vy[low] = physics.PIG_MIN_Y, np.abs(vy[low])
+        y[high], vy[high] = physics.PIG_MAX_Y, -np.abs(vy[high])
+        c['x'], c['y'] = x, y
+
+        # 換方向會消耗亂數，依小豬順序處理
+        for j in np.flatnonzero(alive & (counter >= c['move_duration'])).tolist():
+            self._retarget(j)
+
+    def _bird_hit(self, bird):
+        """與 physics.Bird.update() 相同的碰撞判定，回傳打中的小豬編號 (沒有則為 None)"""
+        c = self.columns
+        cx, cy = bird.x + bird.w / 2, bird.y + bird.h / 2
+        x, y = c['x'], c['y']
+        hits = c['alive'] & (x <= cx) & (cx <= x + physics.PIG_SIZE) & (y <= cy) & (cy <= y + physics.PIG_SIZE)
+        if not hits.any():
+            return None
+        return int(np.argmax(hits))
+
+    def _relocate(self, j):
+        """向量化的 physics.Pig.relocate()：亂數的消耗順序與 find_free_spot() 相同"""
+        c = self.columns
+        others = c['alive'].copy()
+        others[j] = False
+        ox, oy = c['x'][others], c['y'][others]
+        spacing = self.spacing
+        rand = self.rng.random
+        for _ in range(50):
+            new_x = physics.PIG_MIN_X + rand() * (physics.PIG_MAX_X - physics.PIG_MIN_X)
+            new_y = physics.PIG_MIN_Y + rand() * (physics.PIG_MAX_Y - physics.PIG_MIN_Y)
+            if not ((np.abs(new_x - ox) < spacing) & (np.abs(new_y - oy) < spacing)).any():
+                c['x'][j], c['y'][j] = new_x, new_y
+                self._retarget(j)
+                return
+
+    def step(self):
+        """前進一個時間步長，回傳這一步打中的小豬 (PigView，沒有則為 None)"""
+        self.tick += 1
+        self._update_pigs()
+
+        bird = self.projectile
+        hit_pig = None
+        if bird is not None:
+            # 沒有小豬可比對時 Bird.update() 只負責飛行與出界判定
+            was_active = bird.active
+            bird.update(())
+            j = self._bird_hit(bird) if was_active else None
+            if j is not None:
+                bird.active = False
+                self._relocate(j)
+                self.score += physics.HIT_SCORE
+                hit_pig = self.pigs[j]
+            if not bird.active:
+                self.projectile = None
+        return hit_pig
+
+
+ColumnWorld = _ColumnWorld if np is not None else physics.World
+
+
+def simulate_game(seed, shots, pig_count=physics.PIG_COUNT):
+    """與 physics.simulate_game() 相同，但以 ColumnWorld 模擬 (適合小豬很多的關卡)"""
+    return physics.simulate_game(seed, shots, pig_count, world_cls=ColumnWorld)
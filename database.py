@@ -0,0 +1,60 @@
+import heapq
+import threading
+import time
+from peewee import SqliteDatabase
+from playhouse.pool import PooledSqliteDatabase, PoolConnection
+
+
+class AffinityPooledSqliteDatabase(PooledSqliteDatabase):
+    """具執行緒親和性的連線池：waitress 執行緒歸還連線後，下次優先取回自己上次用的連線
+
+    SQLite 的 page cache 是跟著連線走的，固定配對可以讓每個執行緒的快取保持溫熱。
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._affinity = threading.local()
+        super().__init__(*args, **kwargs)
+
+    def _connect(self):
+        preferred = getattr(self._affinity, 'conn', None)
+        if preferred is not None:
+            with self._pool_lock:
+                for i, (ts, _counter, conn) in enumerate(self._connections):
+                    if conn is preferred:
+                        self._connections.pop(i)
+                        heapq.heapify(self._connections)
+                        if self._is_closed(conn):
+                            break
+                        if self._stale_timeout and self._is_stale(ts):
+                            self._close_raw(conn)
+                            break
+                        self._in_use[self.conn_key(conn)] = PoolConnection(ts, conn, time.time())
+                        return conn
+        conn = super()._connect()
+        self._affinity.conn = conn
+        return conn
+
+
+def create_database(path, pooled=True, max_connections=16, stale_timeout=300,
+                    journal_mode='wal', synchronous='normal', cache_size=-16000,
+                    mmap_size=256 * 1024 * 1024, busy_timeout=5000, pool_timeout=10, auto_vacuum='incremental'):
+    """依設定建立 SQLite 資料庫物件；pragmas 會在每條新連線建立時套用
+
+    cache_size 為負數時單位是 KiB (SQLite 慣例)，busy_timeout 單位為毫秒，
+    pool_timeout 為連線池用盡時等待可用連線的秒數。auto_vacuum 只對尚未建立任何資料表的新資料庫有效
+    (必須在 journal_mode 之前設定)，既有資料庫需要一次完整的 VACUUM 才能切換。
+    """
+    pragmas = {
+        'auto_vacuum': auto_vacuum,
+        'journal_mode': journal_mode,
+        'synchronous': synchronous,
+        'cache_size': cache_size,
+        'mmap_size': mmap_size,
+        'busy_timeout': busy_timeout,
+    }
+    if pooled:
+        # 連線會在不同執行緒間重複使用，因此關閉 sqlite3 的同執行緒檢查
+        return AffinityPooledSqliteDatabase(path, max_connections=max_connections,
+                                            stale_timeout=stale_timeout, timeout=pool_timeout,
+                                            pragmas=pragmas, check_same_thread=False)
+    return SqliteDatabase(path, pragmas=pragmas)
@@ -0,0 +1,61 @@
+"""資料匯出的格式化：把逐批讀出的資料列轉成 NDJSON 或 CSV，並可選擇以 gzip 分段壓縮
+
+資料來源是產生「一批資料列」的 generator (app.py 以 keyset 分頁查詢)，每一批各自編碼成一個區塊送出，
+整個匯出過程只有一批資料與壓縮器的緩衝區在記憶體中，與總列數無關。
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class ExportError(ValueError):
+    """匯出參數不合法 (未知的格式或資料表、無法解析的 since)"""
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def encode_ndjson(columns, batches):
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(columns, map(_plain, row))), ensure_ascii=False) + '\n'
+                      for row in rows)
+
+
+def encode_csv(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows([_plain(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # 沒有任何資料時仍要送出表頭
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def encode(fmt, columns, batches):
+    """依格式 (FORMATS 的鍵) 把 batches (每個元素是一批 tuple) 編碼成 UTF-8 位元組區塊"""
+    encoder = encode_ndjson if fmt == 'ndjson' else encode_csv
+    for chunk in encoder(columns, batches):
+        if chunk:
+            yield chunk.encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    """把位元組區塊串流壓縮成單一 gzip 檔；每個輸入區塊結束時 flush，客戶端可以邊收邊解壓"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,105 @@
+import threading
+import time
+from bisect import insort
+
+
+class LeaderboardCache:
+    """行程內的英雄榜快取：保存前 N 名，submit_score() 時就地更新，首頁讀取不需查詢資料庫"""
+
+    def __init__(self, loader, size=10, ttl=300):
+        # loader(limit) 需回傳依名次排序好的 [(key, username, score), ...]
+        self._loader = loader
+        self.size = size
+        # ttl <= 0 代表永不過期，只在啟動或 invalidate() 時重建
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = None  # [(-score, seq, key, username), ...] 由高到低排序
+        self._seq = 0
+        self._loaded_at = 0.0
+        # 前 N 名內容每次改變就加一，頁面快取與 ETag 以此判斷英雄榜是否更新
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+        self.updates = 0
+
+    def _expired(self):
+        return self.ttl > 0 and time.monotonic() - self._loaded_at > self.ttl
+
+    def _next_seq(self):
+        self._seq += 1
+        return self._seq
+
+    def _rebuild_locked(self):
+        rows = self._loader(self.size)
+        old = [(key, username, -neg_score) for neg_score, _, key, username in self._entries or ()]
+        self._entries = [(-score, self._next_seq(), key, username)
+                         for key, username, score in rows[:self.size]]
+        if [tuple(row) for row in rows[:self.size]] != old:
+            self.version += 1
+        self._loaded_at = time.monotonic()
+        self.rebuilds += 1
+
+    def rebuild(self):
+        """從資料庫重新載入前 N 名 (啟動時呼叫)"""
+        with self._lock:
+            self._rebuild_locked()
+
+    def invalidate(self):
+        """丟棄快取內容，下一次讀取時重建"""
+        with self._lock:
+            self._entries = None
+
+    def top(self, n=None):
+        """回傳 [{'username': ..., 'score': ...}, ...]，供 index.html 使用"""
+        return self.top_with_version(n)[1]
+
+    def top_with_version(self, n=None):
+        """回傳 (版本, top(n))，兩者在同一次加鎖內取得，不會對不上"""
+        with self._lock:
+            if self._entries is None or self._expired():
+                self.misses += 1
+                self._rebuild_locked()
+            else:
+                self.hits += 1
+            entries = self._entries if n is None else self._entries[:n]
+            return self.version, [{'username': username, 'score': -neg_score}
+                                  for neg_score, _, _, username in entries]
+
+    def offer(self, key, username, score):
+        """新分數寫入後呼叫；若能進榜就更新快取，回傳前 N 名是否有變動"""
+        with self._lock:
+            if self._entries is None:
+                # 尚未載入或已失效，等下次讀取時重建即可
+                return False
+            entries = self._entries
+            for i, (neg_score, _, entry_key, _) in enumerate(entries):
+                if entry_key == key:
+                    if score <= -neg_score:
+                        return False
+                    del entries[i]
+                    break
+            else:
+                if len(entries) >= self.size and score <= -entries[-1][0]:
+                    return False
+            insort(entries, (-score, self._next_seq(), key, username))
+            del entries[self.size:]
+            self.version += 1
+            self.updates += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': self.size,
+                'ttl': self.ttl,
+                'entries': len(self._entries) if self._entries is not None else 0,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'rebuilds': self.rebuilds,
+                'updates': self.updates,
+                'version': self.version,
+                'age_seconds': time.monotonic() - self._loaded_at if self._entries is not None else None,
+            }
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+
+
+class TooManySubscribers(Exception):
+    """即時英雄榜的連線數已達上限"""
+
+
+class Subscription:
+    """一個 SSE 連線的待送訊息佇列；跟不上時改送完整快照 (resync)，不會無限制累積"""
+
+    def __init__(self, size):
+        self.queue = queue.Queue(maxsize=size)
+        self.resync = False
+
+    def deliver(self, message):
+        """由發布執行緒呼叫"""
+        if self.resync:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            # 慢速客戶端：丟掉積壓的 diff，下次改送完整快照
+            self.resync = True
+
+
+class AsyncSubscription(Subscription):
+    """asyncio 版本 (asgi.py 使用)：訊息透過 call_soon_threadsafe 交給事件迴圈，不佔用執行緒"""
+
+    def __init__(self, size, loop):
+        self.queue = asyncio.Queue(maxsize=size)
+        self.resync = False
+        self.loop = loop
+
+    def deliver(self, message):
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        if self.resync:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.resync = True
+
+
+class LeaderboardBroadcaster:
+    """即時英雄榜的單一發布者
+
+    notify() 只負責喚醒發布執行緒；發布執行緒取一次前 N 名 (snapshot_fn，通常命中英雄榜快取)，
+    與上一次比較後把同一則 diff 訊息扇出給所有訂閱者，不會因為連線數而重複查詢。
+    """
+
+    def __init__(self, snapshot_fn, max_clients=4, queue_size=16, heartbeat=15.0, debounce=0.1):
+        self._snapshot_fn = snapshot_fn
+        self.max_clients = max_clients
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.debounce = debounce
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+        self._rows = []
+        self.version = 0
+        self.published = 0
+        self.resyncs = 0
+        self.rejected = 0
+
+    def start(self):
+        if self._thread is None:
+            self._rows = self._snapshot()
+            self._thread = threading.Thread(target=self._run, name='leaderboard-stream', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._closed = True
+        self._wake.set()
+
+    def notify(self):
+        """前 N 名可能有變動 (LeaderboardCache.offer() 回傳 True 時呼叫)"""
+        self._wake.set()
+
+    def _snapshot(self):
+        try:
+            return [(row['username'], row['score']) for row in self._snapshot_fn()]
+        except Exception as e:
+            print(f"Leaderboard stream snapshot error: {e}")
+            return self._rows
+
+    @staticmethod
+    def _event(name, version, payload):
+        data = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+        return f"event: {name}\nid: {version}\ndata: {data}\n\n".encode('utf-8')
+
+    def _snapshot_event(self, rows, version):
+        return self._event('snapshot', version, {'rows': [{'username': u, 'score': s} for u, s in rows]})
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait()
+            self._wake.clear()
+            if self._closed:
+                break
+            # 合併短時間內連續送來的分數，一次發布 (期間的 notify() 會留到下一輪)
+            time.sleep(self.debounce)
+            rows = self._snapshot()
+            old = self._rows
+            changes = [{'rank': i + 1, 'username': row[0], 'score': row[1]}
+                       for i, row in enumerate(rows) if i >= len(old) or old[i] != row]
+            if not changes and len(rows) == len(old):
+                continue
+            self._rows = rows
+            self.version += 1
+            message = self._event('diff', self.version, {'size': len(rows), 'changes': changes})
+            self._publish(message)
+
+    def _publish(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            try:
+                sub.deliver(message)
+            except RuntimeError:
+                # 事件迴圈已關閉
+                self.unsubscribe(sub)
+        with self._lock:
+            self.published += 1
+
+    def subscribe(self, loop=None):
+        """建立新的訂閱 (指定 loop 時為 asyncio 版本)；超過 max_clients 時拋出 TooManySubscribers"""
+        with self._lock:
+            if self._closed or len(self._subscribers) >= self.max_clients:
+                self.rejected += 1
+                raise TooManySubscribers('Too many live leaderboard connections.')
+            sub = Subscription(self.queue_size) if loop is None else AsyncSubscription(self.queue_size, loop)
+            self._subscribers.add(sub)
+            return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def stream(self, sub):
+        """SSE 回應本體：先送完整快照，之後送 diff；閒置時送 heartbeat 註解，讓斷線能被偵測到"""
+        try:
+            yield b"retry: 5000\n\n" + self._snapshot_event(self._rows, self.version)
+            while not self._closed:
+                if sub.resync:
+                    yield self._resync(sub)
+                    continue
+                try:
+                    yield sub.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield b": heartbeat\n\n"
+        finally:
+            self.unsubscribe(sub)
+
+    async def astream(self, sub):
+        """stream() 的 async 版本，搭配 subscribe(loop)"""
+        try:
+            yield b"retry: 5000\n\n" + self._snapshot_event(self._rows, self.version)
+            while not self._closed:
+                if sub.resync:
+                    yield self._resync(sub)
+                    continue
+                try:
+                    yield await asyncio.wait_for(sub.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": heartbeat\n\n"
+        finally:
+            self.unsubscribe(sub)
+
+    def _resync(self, sub):
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.resync = False
+        with self._lock:
+            self.resyncs += 1
+        return self._snapshot_event(self._rows, self.version)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'clients': len(self._subscribers),
+                'max_clients': self.max_clients,
+                'version': self.version,
+                'published': self.published,
+                'resyncs': self.resyncs,
+                'rejected': self.rejected,
+            }
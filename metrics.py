@@ -0,0 +1,341 @@
+"""行程內的效能指標，以 Prometheus 文字格式輸出 (/metrics)，不依賴 prometheus_client
+
+- 每個 endpoint 的請求延遲直方圖與各狀態碼的請求數 (Flask before_request / after_request)
+- 每種 SQL 語句 (操作 + 資料表) 的次數與耗時 (包裝 peewee 的 execute_sql / commit)
+- bcrypt 雜湊 / 驗證耗時 (PasswordHasher 的 observer)
+- SQLite 鎖：busy handler 在 C 層重試，無法直接觀察；耗時超過門檻的寫入視為曾等待寫入鎖，
+  另計 "database is locked" 錯誤
+- 既有元件的 stats() 字典 (英雄榜快取、寫入佇列等) 以 gauge 輸出
+- 選用的取樣分析器：保留最慢請求的呼叫堆疊，輸出 flamegraph.pl / speedscope 可讀的 folded 格式
+"""
+import heapq
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+WRITE_OPERATIONS = frozenset(('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'BEGIN', 'COMMIT'))
+_SQL_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+"?(\w+)"?', re.IGNORECASE)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = defaultdict(float)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        lines += [f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}' for labels, value in items]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [各區間的次數..., 總和, 次數]
+
+    def observe(self, value, *labels):
+        i = 0
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-2])}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}')
+        return lines
+
+
+class StatsCollector:
+    """把 stats() 回傳字典中的數值以 gauge 輸出 (<prefix>_<key>)"""
+
+    def __init__(self, name, stats_fn):
+        self.name = name
+        self._stats_fn = stats_fn
+
+    def render(self):
+        try:
+            stats = self._stats_fn()
+        except Exception as e:
+            print(f"Metrics collector {self.name} error: {e}")
+            return []
+        lines = []
+        for key, value in sorted(stats.items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f'{self.name}_{re.sub(r"[^a-zA-Z0-9_]", "_", key)}'
+            lines += [f'# TYPE {name} gauge', f'{name} {_number(value)}']
+        return lines
+
+
+class SlowRequestProfiler:
+    """取樣式分析器：每 interval 秒記錄一次處理中請求的呼叫堆疊，只保留最慢的 keep 個請求
+
+    取樣執行緒只讀取 sys._current_frames()，不會中斷請求執行緒；沒有處理中的請求時幾乎不佔資源。
+    """
+
+    def __init__(self, interval=0.005, keep=20, min_seconds=0.0):
+        self.interval = interval
+        self.keep = keep
+        self.min_seconds = min_seconds
+        self._lock = threading.Lock()
+        self._active = {}   # 執行緒 id -> (標籤, {堆疊: 次數})
+        self._slowest = []  # [(秒數, 序號, 標籤, {堆疊: 次數})] 以秒數為鍵的 min-heap
+        self._seq = itertools.count()
+        self._thread = None
+        self.samples = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+            self._thread.start()
+        return self
+
+    def begin(self, label):
+        with self._lock:
+            self._active[threading.get_ident()] = (label, defaultdict(int))
+
+    def end(self, seconds):
+        with self._lock:
+            entry = self._active.pop(threading.get_ident(), None)
+            if entry is None or seconds < self.min_seconds or not entry[1]:
+                return
+            item = (seconds, next(self._seq), entry[0], entry[1])
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, item)
+            elif seconds > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, item)
+
+    @staticmethod
+    def _fold(frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}'.replace(' ', '_').replace(';', ':'))
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for ident, (_, stacks) in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[self._fold(frame)] += 1
+                        self.samples += 1
+
+    def folded(self):
+        """最慢請求的 folded stacks，最慢的在前；根節點為「請求標籤 耗時」"""
+        with self._lock:
+            slowest = sorted(self._slowest, reverse=True)
+        lines = []
+        for seconds, _, label, stacks in slowest:
+            root = f'{label}_{seconds * 1000:.1f}ms'.replace(' ', '_').replace(';', ':')
+            lines += [f'{root};{stack} {count}' for stack, count in sorted(stacks.items())]
+        return '\n'.join(lines) + '\n' if lines else ''
+
+
+class Metrics:
+    """指標集合；由 app.py 建立並掛到 Flask app、peewee 資料庫與 PasswordHasher 上"""
+
+    def __init__(self, prefix='angrybird', busy_threshold_ms=5.0, profiler=None):
+        self.prefix = prefix
+        self.busy_threshold = busy_threshold_ms / 1000
+        self.profiler = profiler
+        self._metrics = []
+        self._sql_kinds = {}
+        self._db_observers = []
+        self.requests = self.counter('http_requests_total', 'HTTP requests by endpoint and status.',
+                                     ('endpoint', 'method', 'status'))
+        self.request_seconds = self.histogram('http_request_duration_seconds', 'HTTP request latency.',
+                                              ('endpoint', 'method'))
+        self.query_seconds = self.histogram('db_query_duration_seconds', 'SQL statement latency.',
+                                            ('operation', 'table'), buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                                                                            0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0, 5.0))
+        self.query_errors = self.counter('db_query_errors_total', 'Failed SQL statements.', ('operation', 'error'))
+        self.busy_waits = self.counter('sqlite_busy_waits_total',
+                                       'Write statements slower than the busy threshold (waited for the write lock).',
+                                       ('operation',))
+        self.busy_seconds = self.counter('sqlite_busy_wait_seconds_total',
+                                         'Time spent in write statements counted as busy waits.', ('operation',))
+        self.connect_seconds = self.histogram('db_connect_duration_seconds',
+                                              'Time to open or check out a pooled database connection.',
+                                              buckets=(0.0001, 0.001, 0.01, 0.1, 1.0, 10.0))
+        self.bcrypt_seconds = self.histogram('bcrypt_duration_seconds', 'bcrypt hash / verify latency (including queueing).',
+                                             ('operation',), buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+
+    def counter(self, name, help, labelnames=()):
+        metric = Counter(f'{self.prefix}_{name}', help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(f'{self.prefix}_{name}', help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collect(self, name, stats_fn):
+        """每次輸出時呼叫 stats_fn()，數值欄位以 <prefix>_<name>_<key> gauge 輸出"""
+        self._metrics.append(StatsCollector(f'{self.prefix}_{name}', stats_fn))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+    # --- 請求 ---
+
+    def observe_request(self, endpoint, method, status, seconds):
+        self.requests.inc(endpoint, method, str(status))
+        self.request_seconds.observe(seconds, endpoint, method)
+
+    def instrument_app(self, app):
+        from flask import g, request
+
+        @app.before_request
+        def _metrics_start():
+            g.metrics_started = time.perf_counter()
+            if self.profiler is not None:
+                self.profiler.begin(f'{request.method} {request.endpoint}')
+
+        @app.after_request
+        def _metrics_finish(response):
+            started = g.pop('metrics_started', None)
+            if started is not None:
+                seconds = time.perf_counter() - started
+                self.observe_request(request.endpoint or 'unknown', request.method, response.status_code, seconds)
+                if self.profiler is not None:
+                    self.profiler.end(seconds)
+            return response
+
+    # --- 資料庫 ---
+
+    def _sql_kind(self, sql):
+        kind = self._sql_kinds.get(sql)
+        if kind is None:
+            operation = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else 'EMPTY'
+            match = _SQL_TABLE.search(sql)
+            kind = (operation, match.group(1) if match else '')
+            # 參數化查詢的 SQL 字串種類有限；上限只是避免意外的無限成長
+            if len(self._sql_kinds) < 4096:
+                self._sql_kinds[sql] = kind
+        return kind
+
+    def observe_db(self, observer):
+        """observer(operation, seconds, write, busy, error) 會在每個 SQL 語句、COMMIT 與取得連線 ('CONNECT') 後呼叫
+
+        busy 與 error 的判定與 /metrics 相同 (基準測試工具依路由累計時使用)。
+        """
+        self._db_observers.append(observer)
+
+    def _notify(self, operation, seconds, write, busy, error):
+        for observer in self._db_observers:
+            observer(operation, seconds, write, busy, error)
+
+    def _timed(self, fn, kind, args):
+        started = time.perf_counter()
+        error = None
+        try:
+            return fn(*args)
+        except Exception as e:
+            message = str(e).lower()
+            error = 'locked' if 'locked' in message or 'busy' in message else type(e).__name__
+            self.query_errors.inc(kind[0], error)
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            self.query_seconds.observe(seconds, *kind)
+            write = kind[0] in WRITE_OPERATIONS
+            busy = write and seconds >= self.busy_threshold
+            if busy:
+                self.busy_waits.inc(kind[0])
+                self.busy_seconds.inc(kind[0], amount=seconds)
+            if self._db_observers:
+                self._notify(kind[0], seconds, write, busy, error)
+
+    def instrument_db(self, db):
+        """包裝 db.execute_sql 與 db.commit (peewee 的所有查詢都經過這兩個方法)，以及取得連線的 db._connect"""
+        execute_sql, commit, connect = db.execute_sql, db.commit, db._connect
+
+        def timed_execute_sql(sql, params=None):
+            return self._timed(execute_sql, self._sql_kind(sql), (sql, params))
+
+        def timed_commit():
+            return self._timed(commit, ('COMMIT', ''), ())
+
+        def timed_connect():
+            started = time.perf_counter()
+            try:
+                return connect()
+            finally:
+                seconds = time.perf_counter() - started
+                self.connect_seconds.observe(seconds)
+                if self._db_observers:
+                    self._notify('CONNECT', seconds, False, False, None)
+
+        db.execute_sql = timed_execute_sql
+        db.commit = timed_commit
+        db._connect = timed_connect
+        return db
+
+    # --- bcrypt ---
+
+    def observe_bcrypt(self, operation, seconds):
+        self.bcrypt_seconds.observe(seconds, operation)
@@ -0,0 +1,81 @@
+import gzip
+import hashlib
+import threading
+from collections import defaultdict
+
+
+class PageEntry:
+    """快取的整頁內容：UTF-8 位元組與預先壓縮的 gzip 版本"""
+    __slots__ = ('version', 'body', 'gzip_body')
+
+    def __init__(self, version, body, gzip_body):
+        self.version = version
+        self.body = body
+        self.gzip_body = gzip_body
+
+
+class PageCache:
+    """渲染後頁面的快取：匿名頁面的整頁位元組與英雄榜等片段，每個名稱只保留目前版本
+
+    版本由呼叫端提供 (例如英雄榜版本)；版本改變時舊內容直接被取代，不需要另外失效。
+    ETag 由 (啟動代號, 頁面, 版本, 使用者) 算出，不必渲染就能判斷能否回應 304。
+    """
+
+    def __init__(self, token, compress_level=6, min_gzip_bytes=512):
+        # token 每次啟動都不同，樣板或程式更新後舊的 ETag 自然失效
+        self.token = token
+        self.compress_level = compress_level
+        self.min_gzip_bytes = min_gzip_bytes
+        self._lock = threading.Lock()
+        self._pages = {}      # 頁面名稱 -> PageEntry
+        self._fragments = {}  # 片段名稱 -> (版本, 內容)
+        self._counts = defaultdict(int)
+
+    def etag(self, name, version, user=None):
+        raw = f'{self.token}|{name}|{version}|{"" if user is None else user}'
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+    def count(self, kind):
+        with self._lock:
+            self._counts[kind] += 1
+
+    def get(self, name, version):
+        with self._lock:
+            entry = self._pages.get(name)
+            if entry is not None and entry.version == version:
+                self._counts['page_hits'] += 1
+                return entry
+            self._counts['page_misses'] += 1
+            return None
+
+    def put(self, name, version, html):
+        """存入渲染好的頁面 (壓縮在鎖外進行)，回傳 PageEntry"""
+        body = html.encode('utf-8')
+        gzip_body = None
+        if len(body) >= self.min_gzip_bytes:
+            gzip_body = gzip.compress(body, self.compress_level, mtime=0)
+        entry = PageEntry(version, body, gzip_body)
+        with self._lock:
+            self._pages[name] = entry
+        return entry
+
+    def fragment(self, name, version, render):
+        """回傳片段目前版本的內容；版本不同時呼叫 render() 重新產生 (同時未命中時可能重複渲染，結果相同)"""
+        with self._lock:
+            cached = self._fragments.get(name)
+            if cached is not None and cached[0] == version:
+                self._counts['fragment_hits'] += 1
+                return cached[1]
+            self._counts['fragment_misses'] += 1
+        content = render()
+        with self._lock:
+            self._fragments[name] = (version, content)
+        return content
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts)
+            stats['pages'] = len(self._pages)
+            stats['page_bytes'] = sum(len(e.body) + len(e.gzip_body or b'') for e in self._pages.values())
+            stats['fragments'] = len(self._fragments)
+        return stats
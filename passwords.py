@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from bcrypt import hashpw, gensalt, checkpw
+
+
+class PasswordPoolBusy(Exception):
+    """bcrypt 工作佇列已滿，呼叫端應回應 503"""
+
+
+# 呼叫端應一律以 503 回應的行程池錯誤：佇列已滿、等候逾時、worker 意外結束
+POOL_ERRORS = (PasswordPoolBusy, FuturesTimeoutError, BrokenProcessPool)
+
+
+def _hash_password(password, rounds):
+    return hashpw(password, gensalt(rounds))
+
+
+def _check_password(password, hashed):
+    return checkpw(password, hashed)
+
+
+def hash_rounds(hashed):
+    """從 '$2b$12$...' 格式的雜湊取出 cost factor"""
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """把 bcrypt 運算移到獨立的行程池，避免佔用 waitress 的請求執行緒
+
+    同時在處理中 + 排隊中的工作不超過 max_pending 筆，超過時立即拋出 PasswordPoolBusy。
+    workers=0 時直接在呼叫端執行緒計算 (仍受 max_pending 限制)。
+    observer(operation, seconds) 會在每次 hash / verify 完成後呼叫 (含排隊時間)，供效能指標使用。
+    """
+
+    def __init__(self, rounds=12, workers=None, max_pending=None, timeout=30, observer=None):
+        self.rounds = rounds
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending or max(self.workers, 1) * 4
+        self.timeout = timeout
+        self.observer = observer
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def start(self):
+        """建立行程池並預先啟動所有 worker
+
+        由 server.py 與 ASGI 的 startup 在開始服務前呼叫；沒有呼叫時 (flask CLI、基準測試) 第一次使用才建立。
+        請在 waitress 開始服務之前呼叫，第一個登入請求就不必等 worker 啟動；
+        worker 由 forkserver / spawn 建立，即使其他執行緒已在執行，也不會繼承它們持有的鎖。
+        """
+        if self.workers > 0:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = self._create_executor()
+            self._executor.submit(hash_rounds, '').result()
+        return self
+
+    def _create_executor(self):
+        # 建立時可能已有其他執行緒 (waitress、write-behind、請求中延遲建立)，不能直接 fork 目前的行程
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('forkserver')
+            # worker 只需要本模組；不預先載入 __main__，forkserver 才不會匯入 app
+            context.set_forkserver_preload([__name__])
+        else:
+            context = multiprocessing.get_context('spawn')
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordPoolBusy('Password hashing queue is full.')
+        started = time.perf_counter()
+        release = True
+        try:
+            if self.workers <= 0:
+                return fn(*args)
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = self._create_executor()
+                executor = self._executor
+            future = executor.submit(fn, *args)
+            try:
+                return future.result(timeout=self.timeout)
+            except FuturesTimeoutError:
+                # 已經在 worker 中執行的工作取消不了：保留名額到它真正結束，max_pending 才能限制住行程池的負載
+                if not future.cancel():
+                    release = False
+                    future.add_done_callback(lambda _: self._slots.release())
+                raise
+            except BrokenProcessPool:
+                # worker 意外結束時重建行程池，下一個請求即可恢復
+                with self._executor_lock:
+                    if self._executor is executor:
+                        self._executor = None
+                raise
+        finally:
+            if release:
+                self._slots.release()
+            if self.observer is not None:
+                self.observer('hash' if fn is _hash_password else 'verify', time.perf_counter() - started)
+
+    def hash(self, password):
+        """以目前設定的 cost factor 產生雜湊 (str)"""
+        return self._run(_hash_password, password.encode('utf-8'), self.rounds).decode('utf-8')
+
+    def verify(self, password, hashed):
+        return self._run(_check_password, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed):
+        """已儲存雜湊的 cost factor 與目前設定不同時回傳 True"""
+        return hash_rounds(hashed) != self.rounds
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,22 @@
+"""日榜 / 週榜的區間計算 (以伺服器本地時間為準，週一為一週的開始)"""
+from datetime import datetime, timedelta
+
+PERIODS = ('day', 'week')
+
+
+def period_start(period, when=None):
+    """when 所在區間的起始日期"""
+    if when is None:
+        when = datetime.now()
+    day = when.date() if isinstance(when, datetime) else when
+    if period == 'day':
+        return day
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    raise ValueError(f'Unknown period: {period}')
+
+
+def previous_start(period, start):
+    """上一個區間的起始日期"""
+    return start - timedelta(days=1 if period == 'day' else 7)
+
@@ -0,0 +1,94 @@
+import threading
+from bisect import bisect_left, bisect_right
+
+
+class RankIndex:
+    """玩家名次索引：以分數值為鍵的 Fenwick tree，名次查詢為 O(log d) (d 為不同分數的個數)
+
+    記憶體只與不同分數的數量成正比，百萬筆分數也不需要 COUNT(*) 掃描。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._best = {}      # user_id -> 最高分
+        self._values = []    # 已排序的不同分數
+        self._counts = []    # 與 _values 對應的玩家數
+        self._tree = [0]     # Fenwick tree (1-based)
+        self._total = 0
+
+    def _rebuild_tree(self):
+        n = len(self._values)
+        tree = [0] * (n + 1)
+        for i, count in enumerate(self._counts, 1):
+            tree[i] += count
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _add(self, score, delta):
+        i = bisect_left(self._values, score)
+        if i == len(self._values) or self._values[i] != score:
+            # 新的分數值：插入後重建 (分數種類很少，成本可忽略)
+            self._values.insert(i, score)
+            self._counts.insert(i, delta)
+            self._rebuild_tree()
+        else:
+            self._counts[i] += delta
+            i += 1
+            while i < len(self._tree):
+                self._tree[i] += delta
+                i += i & -i
+        self._total += delta
+
+    def _count_at_or_below(self, score):
+        i = bisect_right(self._values, score)
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def load(self, rows):
+        """以 [(user_id, best_score), ...] 重建索引 (啟動時從 UserBest 載入)"""
+        with self._lock:
+            best = dict(rows)
+            counts = {}
+            for score in best.values():
+                counts[score] = counts.get(score, 0) + 1
+            self._best = best
+            self._values = sorted(counts)
+            self._counts = [counts[v] for v in self._values]
+            self._total = len(best)
+            self._rebuild_tree()
+
+    def update(self, user_id, score):
+        """submit_score() 後呼叫；只有刷新個人最高分時才移動索引，回傳是否更新"""
+        with self._lock:
+            old = self._best.get(user_id)
+            if old is not None and score <= old:
+                return False
+            if old is not None:
+                self._add(old, -1)
+            self._add(score, 1)
+            self._best[user_id] = score
+            return True
+
+    def best_of(self, user_id):
+        with self._lock:
+            return self._best.get(user_id)
+
+    def rank_of(self, score):
+        """回傳 {'rank', 'total', 'percentile'}；同分同名次，percentile 為不高於此分數的玩家比例"""
+        with self._lock:
+            at_or_below = self._count_at_or_below(score)
+            total = self._total
+        above = total - at_or_below
+        return {
+            'rank': above + 1,
+            'total': total,
+            'percentile': round(100.0 * at_or_below / total, 2) if total else 100.0,
+        }
+
+    def __len__(self):
+        return self._total
@@ -0,0 +1,66 @@
+"""精簡的二進位重播格式 (第 1 版)
+
+    header  '<4sBBI'  magic b'ABRP'、版本、射擊次數、種子
+    ticks   uint16 x n  每一發與上一發的時間差 (物理步數)
+    pulls   int16 x 2n  (dx, dy) 交錯排列，以 1/QUANT_SCALE 像素為單位
+
+10 發的一局只佔 70 bytes。所有多位元組整數皆為 little-endian。
+"""
+import struct
+import sys
+from array import array
+from static.physics import QUANT_SCALE, ReplayError
+
+MAGIC = b'ABRP'
+VERSION = 1
+_HEADER = struct.Struct('<4sBBI')
+
+
+def _to_le(values):
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_le(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def encode_replay(seed, shots):
+    """把 seed 與 [(dx, dy, tick), ...] (已量化) 打包成 bytes"""
+    ticks = array('H')
+    pulls = array('h')
+    last_tick = 0
+    for dx, dy, tick in shots:
+        ticks.append(tick - last_tick)
+        last_tick = tick
+        pulls.append(round(dx * QUANT_SCALE))
+        pulls.append(round(dy * QUANT_SCALE))
+    return _HEADER.pack(MAGIC, VERSION, len(shots), seed) + _to_le(ticks) + _to_le(pulls)
+
+
+def decode_replay(data):
+    """解開 encode_replay() 的結果，回傳 (seed, [(dx, dy, tick), ...])；格式錯誤時拋出 ReplayError"""
+    data = bytes(data)
+    if len(data) < _HEADER.size:
+        raise ReplayError('Replay blob is truncated.')
+    magic, version, count, seed = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ReplayError('Not a replay blob.')
+    if version != VERSION:
+        raise ReplayError(f'Unsupported replay version {version}.')
+    body = data[_HEADER.size:]
+    if len(body) != count * 6:
+        raise ReplayError('Replay blob length does not match its shot count.')
+    ticks = _from_le('H', body[:count * 2])
+    pulls = _from_le('h', body[count * 2:])
+    shots = []
+    tick = 0
+    for i in range(count):
+        tick += ticks[i]
+        shots.append((pulls[2 * i] / QUANT_SCALE, pulls[2 * i + 1] / QUANT_SCALE, tick))
+    return seed, shots
@@ -0,0 +1,263 @@
+import math
+import threading
+import time
+from collections import namedtuple
+from score_writer import ScoreWriter
+from static import physics
+
+try:
+    import numpy as np
+except ImportError:  # 沒有 NumPy 時逐局以純 Python 模擬
+    np = None
+
+# 重播的最大長度 (約 10 分鐘)，避免惡意的超長重播拖垮驗證執行緒
+MAX_REPLAY_TICKS = 20000
+
+ReplayJob = namedtuple('ReplayJob', 'user_id username seed shots score')
+
+
+def parse_replay(seed, shots):
+    """驗證客戶端送來的 seed 與 [[dx, dy, tick], ...]，回傳量化後的 (seed, shots)；格式錯誤時拋出 ReplayError
+
+    超出範圍的拉動量與 World.launch() 一樣截到 ±physics.MAX_PULL，不會讓整局被拒絕。
+    """
+    if not isinstance(seed, int) or isinstance(seed, bool) or not 0 <= seed < 2 ** 32:
+        raise physics.ReplayError('Invalid seed.')
+    if not isinstance(shots, list) or len(shots) > physics.MAX_SHOTS:
+        raise physics.ReplayError('Invalid shot list.')
+    parsed = []
+    last_tick = 0
+    for shot in shots:
+        if not isinstance(shot, list) or len(shot) != 3:
+            raise physics.ReplayError('Each shot must be [dx, dy, tick].')
+        dx, dy, tick = shot
+        for value in (dx, dy):
+            if (not isinstance(value, (int, float)) or isinstance(value, bool)
+                    or not math.isfinite(value)):
+                raise physics.ReplayError('Invalid launch vector.')
+        if not isinstance(tick, int) or isinstance(tick, bool) or not last_tick <= tick <= MAX_REPLAY_TICKS:
+            raise physics.ReplayError('Invalid shot tick.')
+        last_tick = tick
+        parsed.append((physics.quantize_pull(dx), physics.quantize_pull(dy), tick))
+    return seed, parsed
+
+
+def _simulate_one(seed, shots):
+    try:
+        return physics.simulate_game(seed, shots)
+    except physics.ReplayError:
+        return None
+
+
+def _uniform(state, active, a, b):
+    """對 active 中的每一局各抽一個亂數 (與 physics.Rng.uniform 相同的 xorshift32 運算)"""
+    x = state[active]
+    x ^= x << np.uint32(13)
+    x ^= x >> np.uint32(17)
+    x ^= x << np.uint32(5)
+    state[active] = x
+    return a + (b - a) * (x / 4294967296.0)
+
+
+def _init_worlds(seeds, pig_count):
+    """向量化的 physics.World(seed) 初始化：每局小豬的位置、速度、移動時間與初始化後的亂數狀態"""
+    count = len(seeds)
+    state = np.array([physics.Rng(seed).state for seed in seeds], dtype=np.uint32)
+    everyone = np.ones(count, dtype=bool)
+    shape = (count, pig_count)
+    px, py = np.zeros(shape), np.zeros(shape)
+    pvx, pvy = np.zeros(shape), np.zeros(shape)
+    duration = np.zeros(shape, dtype=np.int64)
+
+    def motion(j, active):
+        pvx[active, j] = _uniform(state, active, -physics.PIG_SPEED, physics.PIG_SPEED)
+        pvy[active, j] = _uniform(state, active, -physics.PIG_SPEED, physics.PIG_SPEED)
+        duration[active, j] = _uniform(state, active, *physics.MOVE_DURATION).astype(np.int64)
+
+    for j in range(pig_count):
+        motion(j, everyone)
+    # 依序重新定位每隻小豬 (find_free_spot 的拒絕取樣，每局各自在成功後停止抽樣)
+    for j in range(pig_count):
+        others = [k for k in range(pig_count) if k != j]
+        searching = everyone.copy()
+        for _ in range(50):
+            if not searching.any():
+                break
+            new_x = np.zeros(count)
+            new_y = np.zeros(count)
+            new_x[searching] = physics.PIG_MIN_X + _uniform(state, searching, 0.0, 1.0) * (physics.PIG_MAX_X - physics.PIG_MIN_X)
+            new_y[searching] = physics.PIG_MIN_Y + _uniform(state, searching, 0.0, 1.0) * (physics.PIG_MAX_Y - physics.PIG_MIN_Y)
+            too_close = np.zeros(count, dtype=bool)
+            for k in others:
+                too_close |= ((np.abs(new_x - px[:, k]) < physics.MIN_DISTANCE)
+                              & (np.abs(new_y - py[:, k]) < physics.MIN_DISTANCE))
+            found = searching & ~too_close
+            px[found, j] = new_x[found]
+            py[found, j] = new_y[found]
+            motion(j, found)
+            searching &= ~found
+    return px, py, pvx, pvy, duration, state
+
+
+def simulate_batch(replays):
+    """以 NumPy 同步推進一批重播，回傳每局分數 (不合法的重播為 None)
+
+    逐格的移動、反彈與碰撞判定全部向量化；只有會消耗亂數的事件 (換方向、被打中後重新定位)
+    依照與 physics.World 相同的順序逐一以 Python 處理，因此結果與 simulate_game() 完全一致。
+    """
+    if np is None or len(replays) < 2:
+        return [_simulate_one(seed, shots) for seed, shots in replays]
+
+    count = len(replays)
+    px, py, pvx, pvy, duration, state = _init_worlds([seed for seed, _ in replays], physics.PIG_COUNT)
+    counter = np.zeros(px.shape, dtype=np.int64)
+    # 之後的亂數事件很少，交回各局的 physics.Rng 逐一處理
+    rngs = []
+    for seed, value in zip((seed for seed, _ in replays), state.tolist()):
+        rng = physics.Rng(seed)
+        rng.state = value
+        rngs.append(rng)
+
+    # 發射紀錄補齊成 (count, MAX_SHOTS) 的陣列
+    shot_dx = np.zeros((count, physics.MAX_SHOTS + 1))
+    shot_dy = np.zeros((count, physics.MAX_SHOTS + 1))
+    shot_tick = np.zeros((count, physics.MAX_SHOTS + 1), dtype=np.int64)
+    n_shots = np.array([len(shots) for _, shots in replays], dtype=np.int64)
+    for g, (_, shots) in enumerate(replays):
+        for i, (dx, dy, tick) in enumerate(shots):
+            shot_dx[g, i], shot_dy[g, i], shot_tick[g, i] = dx, dy, tick
+
+    bx = np.zeros(count)
+    by = np.zeros(count)
+    bvx = np.zeros(count)
+    bvy = np.zeros(count)
+    flying = np.zeros(count, dtype=bool)
+    next_shot = np.zeros(count, dtype=np.int64)
+    score = np.zeros(count, dtype=np.int64)
+    valid = np.ones(count, dtype=bool)
+    running = np.ones(count, dtype=bool)
+    rows = np.arange(count)
+    half_bird = physics.BIRD_SIZE / 2
+    tick = 0
+
+    while True:
+        # 發射：沒有鳥在飛、且下一發的時間點到了
+        idle = running & ~flying
+        running &= ~(idle & (next_shot >= n_shots))
+        ready = running & ~flying
+        due = shot_tick[rows, next_shot]
+        late = ready & (due < tick)
+        valid &= ~late
+        running &= ~late
+        fire = ready & (due == tick)
+        if fire.any():
+            bx[fire] = physics.SLING_X
+            by[fire] = physics.SLING_Y
+            bvx[fire] = shot_dx[rows[fire], next_shot[fire]] * physics.LAUNCH_POWER
+            bvy[fire] = shot_dy[rows[fire], next_shot[fire]] * physics.LAUNCH_POWER
+            flying |= fire
+            next_shot[fire] += 1
+        if not running.any() or tick >= MAX_REPLAY_TICKS * 2:
+            break
+
+        # 小豬移動與反彈 (與 physics.Pig.update 相同)
+        tick += 1
+        counter += 1
+        x = px + pvx
+        y = py + pvy
+        low, high = x < physics.PIG_MIN_X, x > physics.PIG_MAX_X
+        x[low], pvx[low] = physics.PIG_MIN_X, np.abs(pvx[low])
+        x[high], pvx[high] = physics.PIG_MAX_X, -np.abs(pvx[high])
+        low, high = y < physics.PIG_MIN_Y, y > physics.PIG_MAX_Y
+        y[low], pvy[low] = physics.PIG_MIN_Y, np.abs(pvy[low])
+        y[high], pvy[high] = physics.PIG_MAX_Y, -np.abs(pvy[high])
+        px, py = x, y
+        # 換方向會消耗亂數，依局內小豬順序處理
+        for g, j in zip(*np.nonzero((counter >= duration) & running[:, None])):
+            pvx[g, j], pvy[g, j], duration[g, j] = physics.random_motion(rngs[g])
+            counter[g, j] = 0
+
+        # 鳥的飛行與碰撞 (與 physics.Bird.update 相同)
+        vy = bvy + physics.GRAVITY
+        nx = bx + bvx
+        ny = by + vy
+        bx = np.where(flying, nx, bx)
+        by = np.where(flying, ny, by)
+        bvy = np.where(flying, vy, bvy)
+        gone = flying & ((ny > physics.HEIGHT - physics.BIRD_SIZE) | (nx > physics.WIDTH) | (nx < 0))
+        cx = (nx + half_bird)[:, None]
+        cy = (ny + half_bird)[:, None]
+        hits = (flying[:, None] & (px <= cx) & (cx <= px + physics.PIG_SIZE)
+                & (py <= cy) & (cy <= py + physics.PIG_SIZE))
+        struck = hits.any(axis=1)
+        for g in np.nonzero(struck)[0]:
+            j = int(np.argmax(hits[g]))
+            others = [(ox, oy) for k, (ox, oy) in enumerate(zip(px[g].tolist(), py[g].tolist())) if k != j]
+            spot = physics.find_free_spot(rngs[g], others)
+            if spot is not None:
+                px[g, j], py[g, j] = spot
+                pvx[g, j], pvy[g, j], duration[g, j] = physics.random_motion(rngs[g])
+                counter[g, j] = 0
+            score[g] += physics.HIT_SCORE
+        flying &= ~(gone | struck)
+
+    return [int(s) if ok else None for s, ok in zip(score.tolist(), (valid & ~running).tolist())]
+
+
+class ReplayVerifier:
+    """在背景批次重新模擬客戶端送來的重播，比對分數後呼叫 on_accept 或 on_reject"""
+
+    def __init__(self, on_accept, on_reject, batch_size=256, interval_ms=100):
+        self._on_accept = on_accept
+        self._on_reject = on_reject
+        self._queue = ScoreWriter(self._process, batch_size=batch_size, interval_ms=interval_ms,
+                                  retries=1, name='replay-verifier')
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.simulated = 0
+        self.simulate_seconds = 0.0
+
+    def start(self):
+        self._queue.start()
+        return self
+
+    def submit(self, job):
+        """排入一筆 ReplayJob；佇列滿載時拋出 WriterBusy"""
+        self._queue.submit(job)
+
+    def stop(self, timeout=10):
+        self._queue.stop(timeout)
+
+    def oldest_pending(self):
+        """最早一筆尚未驗證完的重播排入的時間 (通過驗證的分數時間戳一定晚於此)；沒有時回傳 None"""
+        return self._queue.oldest_pending()
+
+    def _process(self, jobs):
+        started = time.perf_counter()
+        scores = simulate_batch([(job.seed, job.shots) for job in jobs])
+        elapsed = time.perf_counter() - started
+        accepted = rejected = 0
+        for job, score in zip(jobs, scores):
+            if score is not None and score == job.score:
+                accepted += 1
+                self._on_accept(job, score)
+            else:
+                rejected += 1
+                self._on_reject(job, score)
+        with self._lock:
+            self.accepted += accepted
+            self.rejected += rejected
+            self.simulated += len(jobs)
+            self.simulate_seconds += elapsed
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'backend': 'numpy' if np is not None else 'python',
+                'accepted': self.accepted,
+                'rejected': self.rejected,
+                'replays_per_second': round(self.simulated / self.simulate_seconds, 1) if self.simulate_seconds else None,
+            }
+        stats.update(self._queue.stats())
+        return stats
@@ -0,0 +1,151 @@
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+_STOP = object()
+
+
+class WriterBusy(Exception):
+    """寫入佇列已滿或寫入器已關閉"""
+
+
+class ScoreWriter:
+    """Write-behind 分數寫入器：請求執行緒只負責排入佇列，由單一寫入執行緒批次寫入資料庫
+
+    每累積 batch_size 筆或距離批次第一筆超過 interval_ms 毫秒就呼叫一次 flush_fn(batch)。
+    每筆資料的第一個欄位是 user_id (丟棄批次時只記錄筆數與 user_id)。
+    timestamp_fn(row) 為寫入後該筆的時間戳 (預設為排入佇列的時間)，供 oldest_pending() 使用。
+    """
+
+    def __init__(self, flush_fn, batch_size=200, interval_ms=50, max_queue=10000, retries=3,
+                 name='score-writer', timestamp_fn=None):
+        self._flush_fn = flush_fn
+        self._timestamp_fn = timestamp_fn
+        self.name = name
+        self.batch_size = batch_size
+        self.interval = interval_ms / 1000.0
+        self.retries = retries
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._closed = False
+        # 檢查 _closed 與排入佇列在同一把鎖內，停止後不會有資料排在 _STOP 之後
+        self._submit_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        # 尚未寫入 (排隊中或正在寫入) 各筆的時間戳，順序與佇列相同；批次寫入或丟棄後才移除
+        self._pending = deque()
+        self.batches = 0
+        self.rows = 0
+        self.errors = 0
+        self.dropped = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, row):
+        """排入一筆分數；佇列滿載時立即拋出 WriterBusy 讓呼叫端回應 503"""
+        with self._submit_lock:
+            if self._closed:
+                raise WriterBusy('Score writer is shutting down.')
+            timestamp = datetime.now() if self._timestamp_fn is None else self._timestamp_fn(row)
+            with self._stats_lock:
+                self._pending.append(timestamp)
+            # 持有 _submit_lock 時不能阻塞等待，否則一個等待中的請求會擋住其他請求與 stop()
+            try:
+                self._queue.put_nowait(row)
+            except queue.Full:
+                with self._stats_lock:
+                    self._pending.pop()
+                raise WriterBusy('Score queue is full.')
+
+    def oldest_pending(self):
+        """尚未寫入的資料中最早的時間戳；沒有待寫入的資料時回傳 None"""
+        with self._stats_lock:
+            return min(self._pending) if self._pending else None
+
+    def stop(self, timeout=10):
+        """停止接收新分數，寫完佇列中剩餘的資料後結束寫入執行緒"""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._thread is None:
+                return
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"{self.name} did not drain within {timeout}s; {self._queue.qsize()} scores pending.")
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        for attempt in range(1, self.retries + 1):
+            try:
+                self._flush_fn(batch)
+                break
+            except Exception as e:
+                print(f"CRITICAL DB ERROR flushing {len(batch)} scores (attempt {attempt}): {e}")
+                with self._stats_lock:
+                    self.errors += 1
+                time.sleep(0.05 * attempt)
+        else:
+            user_ids = sorted({row[0] for row in batch})
+            print(f"Dropped {len(batch)} scores after {self.retries} attempts; user ids: {user_ids}")
+            with self._stats_lock:
+                self.dropped += len(batch)
+                self._release(len(batch))
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self._release(len(batch))
+            self.batches += 1
+            self.rows += len(batch)
+            self.last_flush_ms = elapsed
+            self.max_flush_ms = max(self.max_flush_ms, elapsed)
+            self._total_flush_ms += elapsed
+
+    def _release(self, count):
+        # 呼叫端持有 _stats_lock
+        for _ in range(count):
+            self._pending.popleft()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'batches': self.batches,
+                'rows': self.rows,
+                'errors': self.errors,
+                'dropped': self.dropped,
+                'last_flush_ms': round(self.last_flush_ms, 3),
+                'max_flush_ms': round(self.max_flush_ms, 3),
+                'avg_flush_ms': round(self._total_flush_ms / self.batches, 3) if self.batches else 0.0,
+            }
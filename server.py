@@ -1,6 +1,12 @@
+import signal
+import sys
 from waitress import serve
-from app import app  # 假設你的 Flask 應用定義在 app.py 中，並且 `app` 是你的 Flask 應用實例
 
 if __name__ == "__main__":
-    # 使用 8 個執行緒來啟動應用
-    serve(app, host='127.0.0.1', port=8497, threads=8)
\ No newline at end of file
+    # bcrypt worker 以 spawn / forkserver 啟動時會重新匯入本檔 (__mp_main__)，app 只在主行程匯入
+    from app import WAITRESS_THREADS, app, password_hasher  # 假設你的 Flask 應用定義在 app.py 中，並且 `app` 是你的 Flask 應用實例
+    # systemd 以 SIGTERM 停止服務時正常結束，讓 atexit 把 write-behind 佇列寫完
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    password_hasher.start()
+    # 預設使用 8 個執行緒 (WAITRESS_THREADS) 來啟動應用；每個即時英雄榜 (SSE) 連線會長期佔住一個執行緒，上限見 STREAM_MAX_CLIENTS
+    serve(app, host='127.0.0.1', port=8497, threads=WAITRESS_THREADS)
\ No newline at end of file
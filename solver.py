@@ -0,0 +1,334 @@
+"""離線射擊求解器與關卡難度分析 (使用 static/physics.py，與遊戲及伺服器驗證完全相同的模擬)
+
+對每個關卡種子：
+- 命中率熱圖：在 (dx, dy) 拉動量網格上，第一發在等待 0 ~ --max-wait 個步長後放手時打中小豬的比例
+- 最高分：逐發貪婪搜尋 (等待時間 × 網格) 第一個會命中的發射，得到可達分數的下界與可重播的發射紀錄
+- 雜訊瞄準模型：玩家瞄準熱圖上命中率最高的格子，拉動量加上常態雜訊、放手時間隨機，模擬多局的分數分布
+
+所有模擬分散到 ProcessPoolExecutor (預設使用全部核心)。結果依種子、參數與 physics.py 的內容
+快取在 --cache-dir，重新執行時只計算新的種子或參數組合。
+--param 可覆寫 physics 的調校常數 (例如 --param PIG_SPEED=1.0 --param MOVE_DURATION=40,90)。
+
+用法：python solver.py --seeds 1-20 [--grid 24] [--max-wait 120] [--noise 8] [--trials 200]
+                       [--param LAUNCH_POWER=0.3] [--heatmaps] [--json report.json]
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from random import Random
+
+from static import physics
+
+# 可用 --param 覆寫的 physics 常數
+TUNABLE = ('MAX_SHOTS', 'PIG_SPEED', 'MOVE_DURATION', 'LAUNCH_POWER', 'GRAVITY', 'HIT_SCORE')
+CACHE_VERSION = 1
+HEAT_CHARS = ' .:-=+*#%@'
+TRIALS_PER_TASK = 25
+
+
+def parse_seeds(text):
+    """'1-20,35,40-42' -> [1, ..., 20, 35, 40, 41, 42]"""
+    seeds = []
+    for part in text.split(','):
+        low, sep, high = part.partition('-')
+        seeds += range(int(low), int(high) + 1) if sep else [int(low)]
+    return seeds
+
+
+def parse_param(text):
+    name, _, value = text.partition('=')
+    if name not in TUNABLE:
+        raise argparse.ArgumentTypeError(f'{name} is not tunable ({", ".join(TUNABLE)})')
+    values = [float(v) for v in value.split(',')]
+    if name in ('MAX_SHOTS', 'HIT_SCORE'):
+        values = [int(v) for v in values]
+    return name, tuple(values) if len(values) > 1 else values[0]
+
+
+def apply_params(params):
+    """在 worker 行程內套用 --param (physics 的函式在呼叫時才讀取這些全域常數)"""
+    for name, value in params.items():
+        setattr(physics, name, value)
+
+
+def linspace(low, high, count):
+    if count == 1:
+        return [(low + high) / 2]
+    return [low + (high - low) * i / (count - 1) for i in range(count)]
+
+
+def release_ticks(config):
+    return list(range(0, config['max_wait'] + 1, config['wait_step']))
+
+
+# --- 模擬 (在 worker 行程中執行) ---
+
+def shot_hits(world, dx, dy):
+    """從 world 的目前狀態發射一次，鳥落地前打中小豬時回傳 True (不改動 world)"""
+    world = copy.deepcopy(world)
+    score = world.score
+    world.launch(dx, dy)
+    while world.projectile is not None:
+        world.step()
+    return world.score > score
+
+
+def snapshots(seed, ticks, pig_count):
+    """第一發之前，在各個放手時間點的世界狀態"""
+    world = physics.World(seed, pig_count)
+    states = []
+    for tick in ticks:
+        while world.tick < tick:
+            world.step()
+        states.append(copy.deepcopy(world))
+    return states
+
+
+def heatmap_row(seed, config, dy):
+    """熱圖的一列 (固定 dy)：每個 dx 的命中率"""
+    states = snapshots(seed, release_ticks(config), config['pig_count'])
+    dxs = linspace(*config['dx'], config['grid'])
+    return [sum(shot_hits(state, dx, dy) for state in states) / len(states) for dx in dxs]
+
+
+def best_game(seed, config):
+    """逐發貪婪搜尋：每一發選擇最早放手、網格順序最前面的命中發射；找不到時射一發不會命中的"""
+    world = physics.World(seed, config['pig_count'])
+    dxs = linspace(*config['dx'], config['grid'])
+    dys = linspace(*config['dy'], config['grid'])
+    while world.can_launch():
+        choice = None
+        state = copy.deepcopy(world)
+        for wait in release_ticks(config):
+            while state.tick < world.tick + wait:
+                state.step()
+            choice = next(((wait, dx, dy) for dy in dys for dx in dxs if shot_hits(state, dx, dy)), None)
+            if choice is not None:
+                break
+        wait, dx, dy = choice or (0, dxs[0], dys[0])
+        for _ in range(wait):
+            world.step()
+        world.launch(dx, dy)
+        while world.projectile is not None:
+            world.step()
+    shots = [list(shot) for shot in world.shots]
+    # 發射紀錄必須能被伺服器的重播驗證重現
+    verified = physics.simulate_game(seed, shots, config['pig_count']) == world.score
+    return {'score': world.score, 'hits': world.score // physics.HIT_SCORE, 'shots': shots, 'verified': verified}
+
+
+def noisy_games(seed, config, target, first_trial, count):
+    """雜訊瞄準模型：回傳每局分數"""
+    scores = []
+    for trial in range(first_trial, first_trial + count):
+        rng = Random(f'{seed}:{trial}')
+        world = physics.World(seed, config['pig_count'])
+        while world.can_launch():
+            for _ in range(rng.randrange(config['max_wait'] + 1)):
+                world.step()
+            world.launch(target[0] + rng.gauss(0, config['noise']), target[1] + rng.gauss(0, config['noise']))
+            while world.projectile is not None:
+                world.step()
+        scores.append(world.score)
+    return scores
+
+
+# --- 快取 ---
+
+def physics_digest():
+    with open(physics.__file__, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+class ResultCache:
+    """以 (種類, 種子, 參數, physics.py 內容) 為鍵的 JSON 檔快取"""
+
+    def __init__(self, directory, config):
+        self.directory = directory
+        self.base = {'version': CACHE_VERSION, 'physics': physics_digest(), **config}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, kind, seed, keys):
+        key = {'kind': kind, 'seed': seed, **{k: self.base[k] for k in keys}}
+        digest = hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()[:24]
+        return os.path.join(self.directory, f'{kind}-{seed}-{digest}.json')
+
+    def get(self, kind, seed, keys):
+        try:
+            with open(self._path(kind, seed, keys), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, kind, seed, keys, value):
+        path = self._path(kind, seed, keys)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(value, f)
+        os.replace(path + '.tmp', path)
+
+
+# 每種結果實際依賴的設定 (其餘設定變動時不必重算)
+HEATMAP_KEYS = ('version', 'physics', 'params', 'pig_count', 'dx', 'dy', 'grid', 'max_wait', 'wait_step')
+BEST_KEYS = HEATMAP_KEYS
+NOISY_KEYS = HEATMAP_KEYS + ('noise', 'trials')
+
+
+# --- 主流程 ---
+
+def best_cell(heatmap, config):
+    dxs = linspace(*config['dx'], config['grid'])
+    dys = linspace(*config['dy'], config['grid'])
+    p, i, j = max((p, i, j) for i, row in enumerate(heatmap) for j, p in enumerate(row))
+    return dxs[j], dys[i], p
+
+
+def analyze(seeds, config, workers, cache):
+    results = {seed: {} for seed in seeds}
+    with ProcessPoolExecutor(workers, initializer=apply_params, initargs=(config['params'],)) as pool:
+        # 第一階段：熱圖 (每列一個工作) 與貪婪最高分
+        rows, best = {}, {}
+        for seed in seeds:
+            cached = cache.get('heatmap', seed, HEATMAP_KEYS)
+            if cached is not None:
+                results[seed]['heatmap'] = cached
+            else:
+                rows[seed] = [pool.submit(heatmap_row, seed, config, dy) for dy in linspace(*config['dy'], config['grid'])]
+            cached = cache.get('best', seed, BEST_KEYS)
+            if cached is not None:
+                results[seed]['best'] = cached
+            else:
+                best[seed] = pool.submit(best_game, seed, config)
+        for seed, futures in rows.items():
+            results[seed]['heatmap'] = [future.result() for future in futures]
+            cache.put('heatmap', seed, HEATMAP_KEYS, results[seed]['heatmap'])
+        for seed, future in best.items():
+            results[seed]['best'] = future.result()
+            cache.put('best', seed, BEST_KEYS, results[seed]['best'])
+
+        # 第二階段：以熱圖上命中率最高的格子為目標的雜訊瞄準模擬
+        noisy = {}
+        for seed in seeds:
+            cached = cache.get('noisy', seed, NOISY_KEYS)
+            if cached is not None:
+                results[seed]['noisy'] = cached
+                continue
+            target = best_cell(results[seed]['heatmap'], config)[:2]
+            noisy[seed] = [pool.submit(noisy_games, seed, config, target, first,
+                                       min(TRIALS_PER_TASK, config['trials'] - first))
+                           for first in range(0, config['trials'], TRIALS_PER_TASK)]
+        for seed, futures in noisy.items():
+            results[seed]['noisy'] = [score for future in futures for score in future.result()]
+            cache.put('noisy', seed, NOISY_KEYS, results[seed]['noisy'])
+    computed = len(set(rows) | set(best) | set(noisy))
+    return results, computed
+
+
+def distribution(scores):
+    counts = {}
+    for score in scores:
+        counts[score] = counts.get(score, 0) + 1
+    return dict(sorted(counts.items()))
+
+
+def percentile(sorted_scores, q):
+    return sorted_scores[min(len(sorted_scores) - 1, int(q * len(sorted_scores)))]
+
+
+def summarize(seed, result, config):
+    scores = sorted(result['noisy'])
+    dx, dy, p = best_cell(result['heatmap'], config)
+    return {
+        'seed': seed,
+        'best_score': result['best']['score'],
+        'max_possible': physics.MAX_SHOTS * physics.HIT_SCORE,
+        'best_shots': result['best']['shots'],
+        'verified': result['best']['verified'],
+        'best_cell': {'dx': round(dx, 2), 'dy': round(dy, 2), 'hit_probability': round(p, 3)},
+        'mean_hit_probability': round(sum(map(sum, result['heatmap'])) / config['grid'] ** 2, 4),
+        'noisy_mean': round(sum(scores) / len(scores), 1) if scores else None,
+        'noisy_p10': percentile(scores, 0.1) if scores else None,
+        'noisy_p50': percentile(scores, 0.5) if scores else None,
+        'noisy_p90': percentile(scores, 0.9) if scores else None,
+        'noisy_distribution': distribution(scores),
+        'heatmap': [[round(p, 3) for p in row] for row in result['heatmap']],
+    }
+
+
+def render_heatmap(heatmap, config):
+    """ASCII 熱圖：列為 dy (由上而下遞增)，欄為 dx (由左而右遞增)"""
+    lines = [f"  dy\\dx {config['dx'][0]:g} .. {config['dx'][1]:g}"]
+    for dy, row in zip(linspace(*config['dy'], config['grid']), heatmap):
+        cells = ''.join(HEAT_CHARS[min(len(HEAT_CHARS) - 1, int(p * len(HEAT_CHARS)))] for p in row)
+        lines.append(f'  {dy:7.1f} |{cells}|')
+    return '\n'.join(lines)
+
+
+def parse_range(text):
+    low, _, high = text.partition(':')
+    return [float(low), float(high)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seeds', default='1-10', help='種子清單，例如 1-20,35')
+    parser.add_argument('--pig-count', type=int, default=physics.PIG_COUNT)
+    parser.add_argument('--dx', type=parse_range, default=[40.0, 200.0], metavar='MIN:MAX', help='拉動量 dx 範圍')
+    parser.add_argument('--dy', type=parse_range, default=[-160.0, 0.0], metavar='MIN:MAX', help='拉動量 dy 範圍')
+    parser.add_argument('--grid', type=int, default=24, help='每個軸的網格點數')
+    parser.add_argument('--max-wait', type=int, default=120, help='每一發最多等待的步長數')
+    parser.add_argument('--wait-step', type=int, default=10, help='搜尋放手時間的間隔 (步長)')
+    parser.add_argument('--noise', type=float, default=8.0, help='雜訊瞄準模型的拉動量標準差 (像素)')
+    parser.add_argument('--trials', type=int, default=200, help='每個種子的雜訊瞄準模擬局數')
+    parser.add_argument('--param', type=parse_param, action='append', default=[], metavar='NAME=VALUE',
+                        help=f'覆寫 physics 常數：{", ".join(TUNABLE)}')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--cache-dir', default='.solver_cache')
+    parser.add_argument('--heatmaps', action='store_true', help='輸出每個種子的 ASCII 熱圖')
+    parser.add_argument('--json', help='完整結果 (含熱圖與發射紀錄) 的輸出檔案')
+    args = parser.parse_args()
+
+    config = {
+        'params': dict(args.param), 'pig_count': args.pig_count, 'dx': args.dx, 'dy': args.dy, 'grid': args.grid,
+        'max_wait': args.max_wait, 'wait_step': args.wait_step, 'noise': args.noise, 'trials': args.trials,
+    }
+    seeds = parse_seeds(args.seeds)
+    cache = ResultCache(args.cache_dir, config)
+    results, computed = analyze(seeds, config, args.workers, cache)
+    print(f"{len(seeds)} seeds, {computed} computed, {len(seeds) - computed} from cache", file=sys.stderr)
+
+    # 報表要以覆寫後的常數計算上限
+    apply_params(config['params'])
+    report = [summarize(seed, results[seed], config) for seed in seeds]
+    print(f"{'seed':>10} {'best':>9} {'cell dx,dy':>15} {'p(hit)':>7} {'mean p':>7} "
+          f"{'noisy mean':>10} {'p10/p50/p90':>14}")
+    for row in report:
+        cell = row['best_cell']
+        flag = '' if row['verified'] else ' (replay mismatch!)'
+        print(f"{row['seed']:>10} {row['best_score']:>4}/{row['max_possible']:<4} "
+              f"{cell['dx']:>7.1f},{cell['dy']:<7.1f} {cell['hit_probability']:>7.2f} {row['mean_hit_probability']:>7.3f} "
+              f"{row['noisy_mean']:>10} {row['noisy_p10']:>4}/{row['noisy_p50']}/{row['noisy_p90']}{flag}")
+        if args.heatmaps:
+            print(render_heatmap(row['heatmap'], config))
+
+    all_scores = [score for seed in seeds for score in results[seed]['noisy']]
+    summary = {
+        'seeds': len(seeds),
+        'mean_best_score': round(sum(r['best_score'] for r in report) / len(report), 1),
+        'perfect_levels': sum(r['best_score'] == r['max_possible'] for r in report),
+        'noisy_mean': round(sum(all_scores) / len(all_scores), 1) if all_scores else None,
+        'noisy_distribution': distribution(all_scores),
+    }
+    print(f"levels with a perfect game found: {summary['perfect_levels']}/{len(seeds)}, "
+          f"mean best {summary['mean_best_score']}, noisy-aim mean {summary['noisy_mean']}")
+    print('noisy-aim score distribution: ' + ', '.join(f'{s}:{n}' for s, n in summary['noisy_distribution'].items()))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'config': config, 'summary': summary, 'levels': report}, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
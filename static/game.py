@@ -1,164 +1,148 @@
-from browser import document, html, timer, ajax, window
-from random import random, uniform
+from math import floor, ceil
+from browser import document, html, ajax, window
+import physics
+from physics import WIDTH, HEIGHT, SLING_X, SLING_Y, MAX_SHOTS, PIG_SIZE, HOUSE_BLOCKS
 
 canvas = document["gameCanvas"]
 ctx = canvas.getContext("2d")
-WIDTH, HEIGHT = 800, 400
 
 # --- 圖片處理：確保載入完成 ---
 bird_img = html.IMG(src="/static/images/bird.png")
 pig_img = html.IMG(src="/static/images/pig.png")
 
-# 遊戲常數
-SLING_X, SLING_Y = 120, 300
-MAX_SHOTS = 10
-
-# 遊戲狀態
-shots_fired = 0
-total_score = 0
+# 遊戲狀態 (物理狀態集中在 physics.World)
+world = None
 mouse_down = False
 mouse_pos = (SLING_X, SLING_Y)
-projectile = None
 sent = False
 game_phase = "playing"
 game_over_countdown = 0
 
+# 主迴圈：requestAnimationFrame 驅動，物理以固定的 TICK_MS 步長推進
+MAX_FRAME_MS = 250          # 單一畫格最多補算的時間，避免分頁切回或卡頓後一次補算太多步
+MAX_STEPS_PER_FRAME = 5     # 裝置跟不上時寧可讓遊戲變慢，也不要陷入越補越慢的死亡螺旋
+accumulator = 0.0
+last_frame = None
+frame_request = None
+last_bird = None            # 上一步開始時在飛的鳥，讓最後一格 (落地或命中) 仍會畫出來
+show_stats = "fps" in window.location.search  # ?fps=1 或按 F 鍵顯示畫格時間
+frame_ms_avg = 0.0
+
+# 分數離線佇列：每局結果先存進 localStorage，再分批送到 /submit_scores；
+# 失敗時以指數退避加隨機抖動重試，網路恢復時大量客戶端不會同時重送
+PENDING_KEY = "pending_scores"
+PENDING_MAX = 100           # 佇列上限，超過時丟掉最舊的結果
+FLUSH_BATCH = 20            # 每次請求最多送出的筆數 (伺服器上限為 SUBMIT_BATCH_MAX)
+RETRY_BASE_MS = 1000
+RETRY_MAX_MS = 60000
+pending_scores = []         # localStorage 無法使用時 (例如隱私模式) 的記憶體備援
+flushing = False
+retry_attempt = 0
+retry_timer = None
+
+# 瞄準預覽：拖曳時以封閉解 (physics.trajectory_points) 算出飛行軌跡畫成虛線，
+# 依量化後的滑鼠位置放進小型 LRU，滑鼠停住或來回移動時不必重算
+PREVIEW_DOTS = 15
+PREVIEW_EVERY = 3           # 每隔幾個物理步長畫一個點
+PREVIEW_QUANT = 1           # 快取鍵的量化間距 (px)
+PREVIEW_CACHE_SIZE = 64
+PREVIEW_DOT_SIZE = 4
+preview_cache = {}          # 量化後的滑鼠位置 -> [(x, y), ...]；dict 保留插入順序，最舊的在前
+
+# 畫面快取：背景畫在離屏 canvas，每一格只還原並重畫有變動的矩形
+BACKGROUND_COLOR = "#f0fff0"
+STATS_RECT = (5, 5, 150, 22)
+drawn = {}                  # 物件 key -> 上一格畫出的矩形
+full_redraw = True          # 下一格整張重畫 (開新局、圖片載入完成、遊戲結束畫面)
+
+def make_canvas(w, h):
+    return html.CANVAS(width=w, height=h)
+
+background = make_canvas(WIDTH, HEIGHT)
+background_ctx = background.getContext("2d")
+background_ctx.fillStyle = BACKGROUND_COLOR
+background_ctx.fillRect(0, 0, WIDTH, HEIGHT)
+
+# 小豬連同房舍預先畫成一張 sprite，之後每隻小豬每格只需一次 drawImage
+SPRITE_DX = min(0, min(rx - 40 for rx, ry, rw, rh in HOUSE_BLOCKS))
+SPRITE_DY = min(0, min(ry for rx, ry, rw, rh in HOUSE_BLOCKS))
+SPRITE_W = max(PIG_SIZE, max(rx - 40 + rw for rx, ry, rw, rh in HOUSE_BLOCKS)) - SPRITE_DX
+SPRITE_H = max(PIG_SIZE, max(ry + rh for rx, ry, rw, rh in HOUSE_BLOCKS)) - SPRITE_DY
+pig_sprite = make_canvas(SPRITE_W, SPRITE_H)
+
+def render_pig_sprite():
+    sprite_ctx = pig_sprite.getContext("2d")
+    sprite_ctx.clearRect(0, 0, SPRITE_W, SPRITE_H)
+    sprite_ctx.fillStyle = "saddlebrown"
+    for rx, ry, rw, rh in HOUSE_BLOCKS:
+        sprite_ctx.fillRect(rx - 40 - SPRITE_DX, ry - SPRITE_DY, rw, rh)
+    # 只有當圖片載入後才繪製
+    if pig_img.complete:
+        sprite_ctx.drawImage(pig_img, -SPRITE_DX, -SPRITE_DY, PIG_SIZE, PIG_SIZE)
+
+def image_loaded(evt):
+    global full_redraw
+    render_pig_sprite()
+    full_redraw = True
+
+render_pig_sprite()
+pig_img.bind("load", image_loaded)
+bird_img.bind("load", image_loaded)
+
 # ------------------------------------------
-# 類別
+# 類別：物理邏輯在 physics.py，這裡只負責繪圖
 # ------------------------------------------
-class Pig:
-    def __init__(self, x, y):
-        self.x, self.y = x, y
-        self.w, self.h = 40, 40
-        self.alive = True
-        self.house_blocks = [
-            (0, 40, 120, 15),
-            (0, -10, 15, 50),
-            (105, -10, 15, 50),
-            (0, -25, 120, 15)
-        ]
-        # 新增移動屬性
-        self.vx = uniform(-1.5, 1.5)  # 隨機水平速度
-        self.vy = uniform(-1.5, 1.5)  # 隨機垂直速度
-        self.move_counter = 0
-        self.move_duration = int(uniform(60, 120))  # 隨機移動持續時間
-
-    def update(self):
+def lerp(a, b, alpha):
+    return a + (b - a) * alpha
+
+class Pig(physics.Pig):
+    def __init__(self, rng, x, y):
+        super().__init__(rng, x, y)
+        self.prev_x, self.prev_y = x, y
+
+    def frame_rect(self, alpha):
+        """這一格 sprite 要畫的位置；在上一步與目前位置之間內插，畫面更新率高於物理步長時移動才會平順"""
         if not self.alive:
-            return
-            
-        self.move_counter += 1
-        
-        # 移動小豬
-        self.x += self.vx
-        self.y += self.vy
-        
-        # 邊界檢查
-        if self.x < 450:
-            self.x = 450
-            self.vx = abs(self.vx)  # 向右反彈
-        elif self.x > WIDTH - self.w - 120:
-            self.x = WIDTH - self.w - 120
-            self.vx = -abs(self.vx)  # 向左反彈
-            
-        if self.y < 200:
-            self.y = 200
-            self.vy = abs(self.vy)  # 向下反彈
-        elif self.y > HEIGHT - self.h - 15:
-            self.y = HEIGHT - self.h - 15
-            self.vy = -abs(self.vy)  # 向上反彈
-        
-        # 定期改變移動方向
-        if self.move_counter >= self.move_duration:
-            self.vx = uniform(-1.5, 1.5)
-            self.vy = uniform(-1.5, 1.5)
-            self.move_counter = 0
-            self.move_duration = int(uniform(60, 120))
-
-    def draw(self):
-        if self.alive:
-            ctx.fillStyle = "saddlebrown"
-            for rx, ry, rw, rh in self.house_blocks:
-                ctx.fillRect(self.x + rx - 40, self.y + ry, rw, rh)
-            # 只有當圖片載入後才繪製
-            if pig_img.complete:
-                ctx.drawImage(pig_img, self.x, self.y, self.w, self.h)
-
-    def hit(self, px, py):
-        return self.alive and self.x <= px <= self.x + self.w and self.y <= py <= self.y + self.h
-
-    def relocate(self, other_pigs):
-        MIN_DISTANCE = 120
-        MIN_X, MAX_X = 450, WIDTH - self.w - 120
-        MIN_Y, MAX_Y = 200, HEIGHT - self.h - 15
-        for _ in range(50): # 限制嘗試次數防止死循環
-            new_x = MIN_X + random() * (MAX_X - MIN_X)
-            new_y = MIN_Y + random() * (MAX_Y - MIN_Y)
-            too_close = any(abs(new_x - p.x) < MIN_DISTANCE and abs(new_y - p.y) < MIN_DISTANCE 
-                            for p in other_pigs if p is not self and p.alive)
-            if not too_close:
-                self.x, self.y = new_x, new_y
-                # 重置移動屬性
-                self.vx = uniform(-1.5, 1.5)
-                self.vy = uniform(-1.5, 1.5)
-                self.move_counter = 0
-                self.move_duration = int(uniform(60, 120))
-                break
+            return None
+        x, y = lerp(self.prev_x, self.x, alpha), lerp(self.prev_y, self.y, alpha)
+        return (x + SPRITE_DX, y + SPRITE_DY, SPRITE_W, SPRITE_H)
 
-class Bird:
+    def draw(self, rect):
+        ctx.drawImage(pig_sprite, rect[0], rect[1])
+
+class Bird(physics.Bird):
     def __init__(self, x, y, vx, vy):
-        self.x, self.y, self.vx, self.vy = x, y, vx, vy
-        self.w, self.h = 35, 35
-        self.active = True
-
-    def update(self):
-        global total_score
-        if not self.active: 
-            return
-            
-        self.vy += 0.35
-        self.x += self.vx
-        self.y += self.vy
-        
-        if self.y > HEIGHT - self.h or self.x > WIDTH or self.x < 0:
-            self.active = False
-            
-        for p in pigs:
-            if p.hit(self.x + self.w / 2, self.y + self.h / 2):
-                p.relocate(pigs)
-                total_score += 50
-                document["score_display"].text = str(total_score)
-                self.active = False
-                break
+        super().__init__(x, y, vx, vy)
+        self.prev_x, self.prev_y = x, y
+
+    def frame_rect(self, alpha):
+        x, y = lerp(self.prev_x, self.x, alpha), lerp(self.prev_y, self.y, alpha)
+        return (x, y, self.w, self.h)
 
-    def draw(self):
+    def draw(self, rect):
         if bird_img.complete:
-            ctx.drawImage(bird_img, self.x, self.y, self.w, self.h)
+            ctx.drawImage(bird_img, rect[0], rect[1], self.w, self.h)
 
 # ------------------------------------------
 # 遊戲邏輯與輸入處理
 # ------------------------------------------
-pigs = []
-
-def init_level():
-    global pigs
-    # 改為創建四隻小豬
-    pigs = [Pig(0, 0) for _ in range(4)]
-    for p in pigs: 
-        p.relocate(pigs)
-
 def start_new_game():
-    global shots_fired, total_score, projectile, sent, game_phase, game_over_countdown
-    total_score, shots_fired = 0, 0
+    global world, sent, game_phase, game_over_countdown, full_redraw
+    # 以瀏覽器的亂數產生種子，避免載入 Brython 的 random 模組
+    seed = int(window.Math.random() * 4294967296)
+    world = physics.World(seed, pig_cls=Pig, bird_cls=Bird)
+    # World 建立時小豬會從 (0, 0) 重新定位，起點要跟著更新才不會從角落內插過來
+    for p in world.pigs:
+        p.prev_x, p.prev_y = p.x, p.y
     document["score_display"].text = "0"
-    projectile, sent = None, False
+    sent = False
     game_phase = "playing"
     game_over_countdown = 0
-    init_level()
+    full_redraw = True
     update_shots_remaining()
 
 def update_shots_remaining():
-    document["shots_remaining"].text = str(MAX_SHOTS - shots_fired)
+    document["shots_remaining"].text = str(MAX_SHOTS - world.shots_fired)
 
 def get_pos(evt):
     # 重要：處理手機縮放後的精確座標
@@ -179,7 +163,7 @@ def get_pos(evt):
 def mousedown(evt):
     global mouse_down, mouse_pos
     evt.preventDefault()
-    if game_phase == "playing" and projectile is None and shots_fired < MAX_SHOTS:
+    if game_phase == "playing" and world.can_launch():
         mouse_down = True
         mouse_pos = get_pos(evt)
 
@@ -190,14 +174,13 @@ def mousemove(evt):
         mouse_pos = get_pos(evt)
 
 def mouseup(evt):
-    global mouse_down, projectile, shots_fired
+    global mouse_down
     evt.preventDefault()
     if mouse_down:
         mouse_down = False
         end_pos = get_pos(evt)
         dx, dy = SLING_X - end_pos[0], SLING_Y - end_pos[1]
-        projectile = Bird(SLING_X, SLING_Y, dx * 0.25, dy * 0.25)
-        shots_fired += 1
+        world.launch(dx, dy)
         update_shots_remaining()
 
 # 綁定事件
@@ -211,10 +194,19 @@ canvas.bind("touchend", mouseup)
 # ------------------------------------------
 # 繪圖與主迴圈
 # ------------------------------------------
-def draw_sling():
-    if game_phase != "playing": 
-        return
-        
+def sling_rect():
+    """彈弓 (橡皮筋與待發射的鳥) 這一格佔用的矩形；沒有東西要畫時回傳 None"""
+    if game_phase != "playing":
+        return None
+    if mouse_down:
+        mx, my = mouse_pos
+        left, top = min(SLING_X - 5, mx - 17), min(SLING_Y, my - 17)
+        return (left - 2, top - 2, max(SLING_X + 5, mx + 18) - left + 4, max(SLING_Y, my + 18) - top + 4)
+    if world.can_launch():
+        return (SLING_X - 17, SLING_Y - 17, 35, 35)
+    return None
+
+def draw_sling(rect):
     ctx.strokeStyle, ctx.lineWidth = "black", 4
     if mouse_down:
         mx, my = mouse_pos
@@ -225,54 +217,300 @@ def draw_sling():
             ctx.stroke()
         if bird_img.complete:
             ctx.drawImage(bird_img, mx - 17, my - 17, 35, 35)
-    elif projectile is None and shots_fired < MAX_SHOTS:
-        if bird_img.complete:
-            ctx.drawImage(bird_img, SLING_X - 17, SLING_Y - 17, 35, 35)
+    elif bird_img.complete:
+        ctx.drawImage(bird_img, SLING_X - 17, SLING_Y - 17, 35, 35)
+
+def preview_points():
+    """目前瞄準位置的軌跡預覽點 (鳥中心座標)"""
+    qx, qy = round(mouse_pos[0] / PREVIEW_QUANT), round(mouse_pos[1] / PREVIEW_QUANT)
+    key = (qx, qy)
+    points = preview_cache.pop(key, None)
+    if points is None:
+        dx, dy = SLING_X - qx * PREVIEW_QUANT, SLING_Y - qy * PREVIEW_QUANT
+        points = physics.trajectory_points(dx, dy, PREVIEW_DOTS, PREVIEW_EVERY)
+        if len(preview_cache) >= PREVIEW_CACHE_SIZE:
+            del preview_cache[next(iter(preview_cache))]
+    preview_cache[key] = points
+    return points
+
+def draw_preview_dot(rect):
+    ctx.fillStyle = "rgba(0, 0, 0, 0.45)"
+    ctx.fillRect(*rect)
+
+def new_score_key():
+    """冪等鍵：同一局重送時伺服器只會計分一次"""
+    try:
+        return window.crypto.randomUUID()
+    except Exception:
+        return f"{window.Date.now()}-{int(window.Math.random() * 4294967296)}"
+
+def load_pending():
+    """讀取離線佇列 (其他分頁也可能寫入，所以每次都重新讀取)"""
+    global pending_scores
+    try:
+        text = window.localStorage.getItem(PENDING_KEY)
+        pending_scores = [{"key": item.key, "score": item.score, "seed": item.seed, "shots": item.shots}
+                          for item in window.JSON.parse(text)] if text else []
+    except Exception:
+        # 沒有 localStorage 或內容損毀時沿用記憶體中的佇列
+        pass
+    return pending_scores
+
+def save_pending(queue):
+    global pending_scores
+    pending_scores = queue[-PENDING_MAX:]
+    try:
+        window.localStorage.setItem(PENDING_KEY, window.JSON.stringify(pending_scores))
+    except Exception:
+        pass
 
 def send_score():
+    """把這一局的結果排入離線佇列並嘗試送出"""
     global sent
-    if sent: 
+    if sent or world.score <= 0:
         return
-        
     sent = True
+    # 附上種子與發射紀錄，讓伺服器重新模擬並驗證分數
+    shots = [[dx, dy, tick] for dx, dy, tick in world.shots]
+    queue = load_pending()
+    queue.append({"key": new_score_key(), "score": world.score, "seed": world.seed, "shots": shots})
+    save_pending(queue)
+    flush_scores()
+
+def flush_scores():
+    """送出佇列最前面的一批；同一時間只有一個請求在途中"""
+    global flushing, retry_timer
+    retry_timer = None
+    if flushing:
+        return
+    batch = load_pending()[:FLUSH_BATCH]
+    if not batch:
+        return
+    flushing = True
+    keys = [item["key"] for item in batch]
     req = ajax.ajax()
-    req.open("POST", "/submit_score", True)
+    req.bind("complete", lambda req: scores_sent(req, keys))
+    req.open("POST", "/submit_scores", True)
     req.set_header("Content-Type", "application/json")
-    req.send(window.JSON.stringify({"score": total_score}))
+    req.send(window.JSON.stringify({"scores": batch}))
 
-def loop():
-    global projectile, game_phase, game_over_countdown
-    ctx.clearRect(0, 0, WIDTH, HEIGHT)
-    
-    # 更新每隻小豬的位置
-    for p in pigs: 
-        p.update()
-    
-    # 繪製所有小豬
-    for p in pigs: 
-        p.draw()
-        
-    if projectile:
-        projectile.update()
-        projectile.draw()
-        if not projectile.active: 
-            projectile = None
-
-    if game_phase == "playing":
-        draw_sling()
-        if shots_fired >= MAX_SHOTS and projectile is None:
-            game_phase, game_over_countdown = "game_over", 90
-            send_score()
-    elif game_phase == "game_over":
+def scores_sent(req, keys):
+    global flushing, retry_attempt
+    flushing = False
+    done = set()
+    if req.status == 200:
+        try:
+            # retry 代表伺服器忙碌，留在佇列中稍後重送；其餘 (含 duplicate 與 invalid) 都已處理完畢
+            for result in window.JSON.parse(req.text).results:
+                if result.status != "retry":
+                    done.add(result.key)
+        except Exception:
+            # 例如 session 過期被轉到登入頁 (回應為 HTML)，保留佇列等重新登入
+            done = set()
+    elif 400 <= req.status < 500 and req.status not in (401, 408, 429):
+        # 重送也不會成功的請求，丟掉這一批以免卡住整個佇列
+        done = set(keys)
+    if done:
+        save_pending([item for item in load_pending() if item["key"] not in done])
+    if done and len(done) == len(keys):
+        retry_attempt = 0
+        flush_scores()
+    else:
+        schedule_retry()
+
+def schedule_retry():
+    global retry_attempt, retry_timer
+    if retry_timer is not None or not pending_scores:
+        return
+    # 等待時間在上限的一半到全部之間隨機，避免所有客戶端在同一時間重試
+    delay = min(RETRY_MAX_MS, RETRY_BASE_MS * 2 ** retry_attempt)
+    retry_attempt = min(retry_attempt + 1, 16)
+    retry_timer = window.setTimeout(flush_scores, delay / 2 + window.Math.random() * delay / 2)
+
+def online(evt):
+    global retry_attempt, retry_timer
+    # 網路恢復時從最短的退避時間重新開始 (仍帶隨機抖動)
+    if retry_timer is not None:
+        window.clearTimeout(retry_timer)
+        retry_timer = None
+    retry_attempt = 0
+    schedule_retry()
+
+def step():
+    """前進一個物理步長 (含遊戲結束畫面的倒數)"""
+    global game_phase, game_over_countdown, last_bird, full_redraw
+    if game_phase == "game_over":
+        game_over_countdown -= 1
+        if game_over_countdown <= 0:
+            start_new_game()
+        return
+
+    for p in world.pigs:
+        p.prev_x, p.prev_y = p.x, p.y
+    last_bird = world.projectile
+    if last_bird is not None:
+        last_bird.prev_x, last_bird.prev_y = last_bird.x, last_bird.y
+
+    hit_pig = world.step()
+    if hit_pig is not None:
+        # 被打中的小豬是瞬間移動，不做內插
+        hit_pig.prev_x, hit_pig.prev_y = hit_pig.x, hit_pig.y
+        document["score_display"].text = str(world.score)
+
+    if world.finished:
+        game_phase, game_over_countdown = "game_over", 90
+        last_bird = None
+        full_redraw = True
+        send_score()
+
+def snap(rect):
+    """把矩形往外對齊到整數像素 (多留 1px 給反鋸齒邊緣)，並裁切到畫布範圍內"""
+    x, y, w, h = rect
+    left, top = max(0, floor(x) - 1), max(0, floor(y) - 1)
+    right, bottom = min(WIDTH, ceil(x + w) + 1), min(HEIGHT, ceil(y + h) + 1)
+    if right <= left or bottom <= top:
+        return None
+    return (left, top, right - left, bottom - top)
+
+def overlaps(a, b):
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+def scene(alpha):
+    """這一格要畫的物件：[(key, 矩形, 繪圖函式), ...]，依繪製順序排列"""
+    items = []
+    for i, p in enumerate(world.pigs):
+        rect = p.frame_rect(alpha)
+        if rect is not None:
+            items.append((i, rect, p.draw))
+    # 剛發射的鳥還沒走過任何一步，此時 last_bird 仍是 None
+    bird = world.projectile if world.projectile is not None else last_bird
+    if bird is not None:
+        items.append(("bird", bird.frame_rect(alpha), bird.draw))
+    if mouse_down and game_phase == "playing":
+        half = PREVIEW_DOT_SIZE / 2
+        for i, (x, y) in enumerate(preview_points()):
+            items.append((("preview", i), (x - half, y - half, PREVIEW_DOT_SIZE, PREVIEW_DOT_SIZE), draw_preview_dot))
+    rect = sling_rect()
+    if rect is not None:
+        items.append(("sling", rect, draw_sling))
+    if show_stats:
+        items.append(("stats", STATS_RECT, draw_stats))
+    return items
+
+def render(alpha):
+    global drawn, full_redraw
+    if game_phase == "game_over" and not full_redraw:
+        return  # 遊戲結束畫面是靜態的，畫一次就好
+
+    items = []
+    current = {}
+    for key, rect, draw in scene(alpha):
+        bounds = snap(rect)
+        if bounds is not None:
+            items.append((bounds, rect, draw))
+            current[key] = bounds
+
+    # 髒矩形：位置有變動 (或內容每格都會變) 的物件，這一格與上一格的範圍
+    if full_redraw:
+        dirty = [(0, 0, WIDTH, HEIGHT)]
+    else:
+        dirty = []
+        for key, bounds in current.items():
+            old = drawn.get(key)
+            if old != bounds or key == "stats":
+                dirty.append(bounds)
+                if old is not None:
+                    dirty.append(old)
+        for key, old in drawn.items():
+            if key not in current:
+                dirty.append(old)
+    drawn = current
+    full_redraw = False
+    if not dirty:
+        return
+
+    # 從背景層還原髒矩形，再只在這些範圍內重畫與它們重疊的物件
+    ctx.save()
+    ctx.beginPath()
+    for x, y, w, h in dirty:
+        ctx.drawImage(background, x, y, w, h, x, y, w, h)
+        ctx.rect(x, y, w, h)
+    ctx.clip()
+    for bounds, rect, draw in items:
+        for area in dirty:
+            if overlaps(bounds, area):
+                draw(rect)
+                break
+    ctx.restore()
+
+    if game_phase == "game_over":
         ctx.fillStyle = "rgba(0, 0, 0, 0.7)"
         ctx.fillRect(0, 0, WIDTH, HEIGHT)
         ctx.fillStyle, ctx.textAlign = "white", "center"
         ctx.font = "40px Arial"
         ctx.fillText("Game Over", WIDTH // 2, HEIGHT // 2 - 20)
-        ctx.fillText(f"Score: {total_score}", WIDTH // 2, HEIGHT // 2 + 30)
-        game_over_countdown -= 1
-        if game_over_countdown <= 0: 
-            start_new_game()
+        ctx.fillText(f"Score: {world.score}", WIDTH // 2, HEIGHT // 2 + 30)
+
+def draw_stats(rect):
+    x, y, w, h = rect
+    ctx.fillStyle = "rgba(0, 0, 0, 0.6)"
+    ctx.fillRect(x, y, w, h)
+    ctx.fillStyle, ctx.textAlign = "white", "left"
+    ctx.font = "14px monospace"
+    fps = 1000 / frame_ms_avg if frame_ms_avg else 0
+    ctx.fillText(f"{frame_ms_avg:5.1f} ms {fps:5.1f} fps", x + 5, y + 16)
+
+def frame(now):
+    global accumulator, last_frame, frame_request, frame_ms_avg
+    frame_request = window.requestAnimationFrame(frame)
+    if last_frame is None:
+        last_frame = now
+    elapsed = now - last_frame
+    last_frame = now
+    frame_ms_avg = elapsed if not frame_ms_avg else frame_ms_avg * 0.9 + elapsed * 0.1
+
+    accumulator += min(elapsed, MAX_FRAME_MS)
+    steps = 0
+    while accumulator >= physics.TICK_MS and steps < MAX_STEPS_PER_FRAME:
+        step()
+        accumulator -= physics.TICK_MS
+        steps += 1
+    if steps == MAX_STEPS_PER_FRAME:
+        # 丟棄補不完的時間
+        accumulator %= physics.TICK_MS
+    render(accumulator / physics.TICK_MS)
+
+def start_loop():
+    global frame_request, last_frame, accumulator
+    if frame_request is None:
+        last_frame, accumulator = None, 0.0
+        frame_request = window.requestAnimationFrame(frame)
+
+def stop_loop():
+    global frame_request
+    if frame_request is not None:
+        window.cancelAnimationFrame(frame_request)
+        frame_request = None
+
+def visibility_change(evt):
+    # 分頁隱藏時完全停止；回來後從頭計時，不補算隱藏期間的時間
+    if document.hidden:
+        stop_loop()
+    else:
+        start_loop()
+
+def keydown(evt):
+    global show_stats
+    if evt.key in ("f", "F"):
+        show_stats = not show_stats
+
+document.bind("visibilitychange", visibility_change)
+window.bind("keydown", keydown)
+window.bind("online", online)
 
-timer.set_interval(loop, 30)
 start_new_game()
+if not document.hidden:
+    start_loop()
+# 上次離線時沒送出的分數
+load_pending()
+schedule_retry()
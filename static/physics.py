@@ -0,0 +1,488 @@
+"""遊戲物理核心：不依賴 browser 模組，Brython 客戶端與伺服器端 CPython 共用
+
+以固定時間步長 (TICK_MS) 推進，亂數來自可指定種子的 Rng，
+相同的種子與相同的發射紀錄一定會得到相同的結果。
+"""
+from math import floor, sqrt
+
+WIDTH, HEIGHT = 800, 400
+SLING_X, SLING_Y = 120, 300
+MAX_SHOTS = 10
+
+TICK_MS = 30            # 每個物理步長代表的毫秒數
+GRAVITY = 0.35
+LAUNCH_POWER = 0.25     # 拉彈弓距離換算成初速的倍率
+QUANT_SCALE = 8         # 拉動量量化到 1/8 像素，重播才能以整數精簡儲存
+MAX_PULL = 2000         # 每個方向的最大拉動量 (滑鼠可在畫布外放開)；超過時截到這個值，仍在重播 int16 的範圍內
+HIT_SCORE = 50
+
+PIG_COUNT = 4
+PIG_SIZE = 40
+PIG_SPEED = 1.5
+MOVE_DURATION = (60, 120)
+MIN_DISTANCE = 120
+BIRD_SIZE = 35
+GRID_MIN_PIGS = 500     # 小豬數量達到這個值才以空間索引重新定位 (見 benchmarks/bench_pigs.py)，較少時逐一比對反而較快
+GRID_CELL = PIG_SIZE / 2
+GRID_STALE_STEPS = 10   # 空間索引最多延後幾步才重新分桶 (期間小豬最多移動 PIG_SPEED * 步數)
+
+# 小豬活動範圍
+PIG_MIN_X, PIG_MAX_X = 450, WIDTH - PIG_SIZE - 120
+PIG_MIN_Y, PIG_MAX_Y = 200, HEIGHT - PIG_SIZE - 15
+
+# 房舍相對於小豬的位置：地基、左牆、右牆、屋頂
+HOUSE_BLOCKS = (
+    (0, 40, 120, 15),
+    (0, -10, 15, 50),
+    (105, -10, 15, 50),
+    (0, -25, 120, 15),
+)
+
+_MASK32 = 0xFFFFFFFF
+
+
+class ReplayError(ValueError):
+    """發射紀錄無法在模擬中重現 (射擊次數或時間點不合法)"""
+
+
+class Rng:
+    """xorshift32 亂數產生器：只用 32 位元整數運算，Brython 與 CPython 產生完全相同的序列"""
+
+    def __init__(self, seed=None):
+        if seed is None:
+            seed = new_seed()
+        self.seed = seed & _MASK32
+        # 先打散種子，避免相鄰種子產生相近的序列
+        state = (self.seed * 2654435761 + 0x6D2B79F5) & _MASK32
+        self.state = state or 0x9E3779B9
+        for _ in range(4):
+            self.next_u32()
+
+    def next_u32(self):
+        x = self.state
+        x ^= (x << 13) & _MASK32
+        x ^= x >> 17
+        x ^= (x << 5) & _MASK32
+        self.state = x
+        return x
+
+    def random(self):
+        # 與 next_u32() 相同的運算，展開以減少呼叫成本 (重新定位時會連續抽上百次)
+        x = self.state
+        x ^= (x << 13) & _MASK32
+        x ^= x >> 17
+        x ^= (x << 5) & _MASK32
+        self.state = x
+        return x / 4294967296.0
+
+    def uniform(self, a, b):
+        return a + (b - a) * self.random()
+
+
+def new_seed():
+    """產生隨機種子 (僅供伺服器端使用；瀏覽器端由 game.py 自行產生，bundle 才不必包含 random 模組)"""
+    from random import getrandbits
+    return getrandbits(32)
+
+
+def quantize_pull(value):
+    """把拉動量截到 ±MAX_PULL 並四捨五入到 1/QUANT_SCALE 像素 (不用 round()，避免各平台的銀行家捨入差異)"""
+    value = max(-MAX_PULL, min(MAX_PULL, value))
+    return floor(value * QUANT_SCALE + 0.5) / QUANT_SCALE
+
+
+def trajectory_points(dx, dy, count, every=1):
+    """以拉動量 (dx, dy) 發射後，第 every、2 * every、... 步時鳥中心的位置，最多 count 個，出界即停止
+
+    Bird.update() 是先加速度再位移的逐步積分，第 n 步的位置有封閉解：
+    x = x0 + n * vx，y = y0 + n * vy + GRAVITY * n * (n + 1) / 2，不必逐步模擬 (瞄準預覽使用)。
+    """
+    vx, vy = quantize_pull(dx) * LAUNCH_POWER, quantize_pull(dy) * LAUNCH_POWER
+    half = BIRD_SIZE / 2
+    points = []
+    for i in range(1, count + 1):
+        n = i * every
+        x = SLING_X + n * vx
+        y = SLING_Y + n * vy + GRAVITY * n * (n + 1) / 2
+        if y > HEIGHT - BIRD_SIZE or x > WIDTH or x < 0:
+            break
+        points.append((x + half, y + half))
+    return points
+
+
+def random_motion(rng):
+    """隨機的移動方向與持續時間：(vx, vy, move_duration)"""
+    vx = rng.uniform(-PIG_SPEED, PIG_SPEED)
+    vy = rng.uniform(-PIG_SPEED, PIG_SPEED)
+    return vx, vy, int(rng.uniform(MOVE_DURATION[0], MOVE_DURATION[1]))
+
+
+def level_spacing(pig_count):
+    """pig_count 隻小豬在活動範圍內還放得下的最小間距 (預設關卡為 MIN_DISTANCE)"""
+    if pig_count <= PIG_COUNT:
+        return MIN_DISTANCE
+    area = (PIG_MAX_X - PIG_MIN_X) * (PIG_MAX_Y - PIG_MIN_Y)
+    # Poisson-disk 取樣大約只能填到最密排列的 6~7 成
+    return min(MIN_DISTANCE, 0.7 * sqrt(area / pig_count))
+
+
+def find_free_spot(rng, others, spacing=MIN_DISTANCE):
+    """在活動範圍內找一個與 others [(x, y), ...] 保持 spacing 的位置，嘗試 50 次都失敗時回傳 None"""
+    rand = rng.random
+    for _ in range(50):
+        new_x = PIG_MIN_X + rand() * (PIG_MAX_X - PIG_MIN_X)
+        new_y = PIG_MIN_Y + rand() * (PIG_MAX_Y - PIG_MIN_Y)
+        for ox, oy in others:
+            if abs(new_x - ox) < spacing and abs(new_y - oy) < spacing:
+                break
+        else:
+            return new_x, new_y
+    return None
+
+
+def find_free_spot_in(rng, grid, exclude, spacing):
+    """與 find_free_spot() 相同的取樣，但只和 grid 中鄰近格子的小豬比較 (亂數消耗順序完全一致)"""
+    rand = rng.random
+    query = grid.query
+    for _ in range(50):
+        new_x = PIG_MIN_X + rand() * (PIG_MAX_X - PIG_MIN_X)
+        new_y = PIG_MIN_Y + rand() * (PIG_MAX_Y - PIG_MIN_Y)
+        for p in query(new_x - spacing, new_y - spacing, new_x + spacing, new_y + spacing):
+            if p is not exclude and p.alive and abs(new_x - p.x) < spacing and abs(new_y - p.y) < spacing:
+                break
+        else:
+            return new_x, new_y
+    return None
+
+
+def poisson_layout(rng, pigs, grid, spacing, attempts=30):
+    """以 Poisson-disk 取樣 (Bridson 演算法) 擺放 pigs，回傳成功擺放的數量
+
+    距離採用與 find_free_spot() 相同的方框判定；候選點在 [-2r, 2r] 的方框內取樣，
+    不使用三角函數，Brython 與 CPython 的結果才會一致。
+    """
+    if not pigs:
+        return 0
+    rand = rng.random
+    first = pigs[0]
+    first.x = PIG_MIN_X + rand() * (PIG_MAX_X - PIG_MIN_X)
+    first.y = PIG_MIN_Y + rand() * (PIG_MAX_Y - PIG_MIN_Y)
+    grid.move(first)
+    first.placed = True
+    placed = 1
+    active = [first]
+    while active and placed < len(pigs):
+        i = int(rand() * len(active))
+        base = active[i]
+        for _ in range(attempts):
+            x = base.x + (rand() * 4 - 2) * spacing
+            y = base.y + (rand() * 4 - 2) * spacing
+            if abs(x - base.x) < spacing and abs(y - base.y) < spacing:
+                continue
+            if not (PIG_MIN_X <= x <= PIG_MAX_X and PIG_MIN_Y <= y <= PIG_MAX_Y):
+                continue
+            for p in grid.query(x - spacing, y - spacing, x + spacing, y + spacing):
+                if p.placed and abs(x - p.x) < spacing and abs(y - p.y) < spacing:
+                    break
+            else:
+                pig = pigs[placed]
+                pig.x, pig.y = x, y
+                grid.move(pig)
+                pig.placed = True
+                active.append(pig)
+                placed += 1
+                break
+        else:
+            active[i] = active[-1]
+            active.pop()
+    return placed
+
+
+class SpatialGrid:
+    """均勻格狀空間索引：依物件左上角 (x, y) 所在的格子分桶
+
+    移動中的物件 (items) 不必每一步重新分桶：每一步呼叫 advance()，查詢時若距離上次分桶
+    已超過 stale_after 步才整批重建；期間物件最多移動 slack，query() 把範圍往外擴 slack 就不會漏掉。
+    瞬間移動的物件 (重新定位) 要立即呼叫 move()。位置記錄在物件的 cell 屬性上。
+    """
+
+    def __init__(self, cell_size, items=None, stale_after=0, max_speed=0.0):
+        self.cell_size = cell_size
+        self.items = items
+        self.stale_after = stale_after
+        self.slack = stale_after * max_speed
+        self.cells = {}
+        self.age = 0
+        if items is not None:
+            self.rebuild()
+
+    def _key(self, x, y):
+        size = self.cell_size
+        return int(x // size), int(y // size)
+
+    def insert(self, item):
+        key = self._key(item.x, item.y)
+        item.cell = key
+        bucket = self.cells.get(key)
+        if bucket is None:
+            self.cells[key] = [item]
+        else:
+            bucket.append(item)
+
+    def remove(self, item):
+        bucket = self.cells[item.cell]
+        bucket.remove(item)
+        if not bucket:
+            del self.cells[item.cell]
+        item.cell = None
+
+    def move(self, item):
+        if self.age > self.stale_after:
+            self.rebuild()
+        if self._key(item.x, item.y) != item.cell:
+            self.remove(item)
+            self.insert(item)
+
+    def advance(self):
+        """items 各移動了一步"""
+        self.age += 1
+
+    def invalidate(self):
+        """items 的位移可能超過 slack (例如瞬間移動)，下次查詢前整批重建"""
+        self.age = self.stale_after + 1
+
+    def rebuild(self):
+        size = self.cell_size
+        cells = {}
+        for item in self.items:
+            key = (int(item.x // size), int(item.y // size))
+            item.cell = key
+            bucket = cells.get(key)
+            if bucket is None:
+                cells[key] = [item]
+            else:
+                bucket.append(item)
+        self.cells = cells
+        self.age = 0
+
+    def query(self, x0, y0, x1, y1):
+        """左上角可能落在 [x0, x1] x [y0, y1] 內的物件 (呼叫端需再精確比對)"""
+        if self.age > self.stale_after:
+            self.rebuild()
+        size = self.cell_size
+        slack = self.slack
+        cells = self.cells
+        found = []
+        for cx in range(int((x0 - slack) // size), int((x1 + slack) // size) + 1):
+            for cy in range(int((y0 - slack) // size), int((y1 + slack) // size) + 1):
+                bucket = cells.get((cx, cy))
+                if bucket is not None:
+                    found.extend(bucket)
+        return found
+
+
+class Pig:
+    house_blocks = HOUSE_BLOCKS   # 所有小豬共用同一份房舍形狀
+    # 由 World 設定：在關卡中的順序、空間索引與最小間距
+    index = 0
+    grid = None
+    cell = None
+    spacing = MIN_DISTANCE
+    placed = False
+
+    def __init__(self, rng, x, y):
+        self.rng = rng
+        self.x, self.y = x, y
+        self.w, self.h = PIG_SIZE, PIG_SIZE
+        self.alive = True
+        self.retarget()
+
+    def retarget(self):
+        """隨機選擇新的移動方向與持續時間"""
+        self.vx, self.vy, self.move_duration = random_motion(self.rng)
+        self.move_counter = 0
+
+    def update(self):
+        if not self.alive:
+            return
+
+        self.move_counter += 1
+        x = self.x + self.vx
+        y = self.y + self.vy
+
+        # 邊界檢查，碰到邊界就反彈
+        if x < PIG_MIN_X:
+            x = PIG_MIN_X
+            self.vx = abs(self.vx)
+        elif x > PIG_MAX_X:
+            x = PIG_MAX_X
+            self.vx = -abs(self.vx)
+
+        if y < PIG_MIN_Y:
+            y = PIG_MIN_Y
+            self.vy = abs(self.vy)
+        elif y > PIG_MAX_Y:
+            y = PIG_MAX_Y
+            self.vy = -abs(self.vy)
+        self.x, self.y = x, y
+
+        # 定期改變移動方向
+        if self.move_counter >= self.move_duration:
+            self.retarget()
+
+    def hit(self, px, py):
+        return self.alive and self.x <= px <= self.x + self.w and self.y <= py <= self.y + self.h
+
+    def relocate(self, other_pigs):
+        """移到與其他小豬保持 spacing 的隨機位置 (最多嘗試 50 次)"""
+        grid = self.grid
+        if grid is not None:
+            spot = find_free_spot_in(self.rng, grid, self, self.spacing)
+        else:
+            # 嘗試期間其他小豬不會移動，先取出座標避免每次重新篩選
+            others = [(p.x, p.y) for p in other_pigs if p is not self and p.alive]
+            spot = find_free_spot(self.rng, others, self.spacing)
+        if spot is not None:
+            self.x, self.y = spot
+            if grid is not None:
+                grid.move(self)
+            self.retarget()
+
+
+class Bird:
+    def __init__(self, x, y, vx, vy):
+        self.x, self.y, self.vx, self.vy = x, y, vx, vy
+        self.w, self.h = BIRD_SIZE, BIRD_SIZE
+        self.active = True
+
+    def update(self, pigs):
+        """前進一個時間步長；打中小豬時回傳該小豬 (同時打中多隻時取 pigs 中最前面的一隻)
+
+        每一步只有一個點要比對，逐一掃描在 1000 隻小豬時仍比查詢空間索引快 (見 benchmarks/bench_pigs.py)。
+        """
+        if not self.active:
+            return None
+
+        vy = self.vy + GRAVITY
+        x = self.x + self.vx
+        y = self.y + vy
+        self.x, self.y, self.vy = x, y, vy
+
+        if y > HEIGHT - self.h or x > WIDTH or x < 0:
+            self.active = False
+
+        # 與 Pig.hit 相同的判定，展開在迴圈內以減少呼叫成本
+        cx, cy = x + self.w / 2, y + self.h / 2
+        # World.step() 先更新小豬，邊界檢查保證小豬都在活動範圍內；鳥在範圍外時不可能打中
+        if not (PIG_MIN_X <= cx <= PIG_MAX_X + PIG_SIZE and PIG_MIN_Y <= cy <= PIG_MAX_Y + PIG_SIZE):
+            return None
+        for p in pigs:
+            if p.alive and p.x <= cx <= p.x + p.w and p.y <= cy <= p.y + p.h:
+                self.active = False
+                return p
+        return None
+
+
+class World:
+    """一局遊戲的完整狀態；step() 每呼叫一次前進一個固定時間步長
+
+    預設關卡 (PIG_COUNT 隻) 依序以拒絕取樣擺放小豬；更大的關卡改用 Poisson-disk 取樣，
+    間距縮小到 level_spacing()。use_grid 為 None 時，小豬數量達到 GRID_MIN_PIGS 才以空間索引重新定位
+    (擺放一律使用空間索引，碰撞判定一律逐一比對)。
+    """
+
+    def __init__(self, seed=None, pig_count=PIG_COUNT, pig_cls=Pig, bird_cls=Bird, use_grid=None):
+        self.rng = Rng(seed)
+        self.seed = self.rng.seed
+        self.pig_cls = pig_cls
+        self.bird_cls = bird_cls
+        self.tick = 0
+        self.score = 0
+        self.shots_fired = 0
+        self.shots = []          # 發射紀錄 [(dx, dy, tick), ...]
+        self.projectile = None
+        self.spacing = level_spacing(pig_count)
+        if use_grid is None:
+            use_grid = pig_count >= GRID_MIN_PIGS
+        self.pigs = [pig_cls(self.rng, 0, 0) for _ in range(pig_count)]
+        self.grid = SpatialGrid(max(GRID_CELL, self.spacing / 2), self.pigs, GRID_STALE_STEPS, PIG_SPEED) if use_grid else None
+        for i, p in enumerate(self.pigs):
+            p.index = i
+            p.spacing = self.spacing
+            p.grid = self.grid
+        if pig_count <= PIG_COUNT:
+            for p in self.pigs:
+                p.relocate(self.pigs)
+        else:
+            self._layout()
+        if self.grid is not None:
+            # 擺放失敗而留在 (0, 0) 的小豬第一步會被邊界檢查拉進活動範圍
+            self.grid.invalidate()
+
+    def _layout(self):
+        """Poisson-disk 擺放所有小豬；放不下的小豬改用 relocate() 逐一嘗試"""
+        grid = self.grid if self.grid is not None else SpatialGrid(max(GRID_CELL, self.spacing / 2), self.pigs)
+        placed = poisson_layout(self.rng, self.pigs, grid, self.spacing)
+        for p in self.pigs[placed:]:
+            p.relocate(self.pigs)
+        for p in self.pigs:
+            p.placed = False
+
+    def can_launch(self):
+        return self.projectile is None and self.shots_fired < MAX_SHOTS
+
+    def launch(self, dx, dy):
+        """以彈弓拉動量 (dx, dy) 發射一隻鳥 (先量化)；不能發射時回傳 None"""
+        if not self.can_launch():
+            return None
+        dx, dy = quantize_pull(dx), quantize_pull(dy)
+        self.projectile = self.bird_cls(SLING_X, SLING_Y, dx * LAUNCH_POWER, dy * LAUNCH_POWER)
+        self.shots_fired += 1
+        self.shots.append((dx, dy, self.tick))
+        return self.projectile
+
+    @property
+    def finished(self):
+        return self.shots_fired >= MAX_SHOTS and self.projectile is None
+
+    def step(self):
+        """前進一個時間步長，回傳這一步打中的小豬 (沒有則為 None)"""
+        self.tick += 1
+        pigs = self.pigs
+        for p in pigs:
+            p.update()
+        grid = self.grid
+        if grid is not None:
+            grid.advance()
+
+        bird = self.projectile
+        hit_pig = None
+        if bird is not None:
+            hit_pig = bird.update(pigs)
+            if hit_pig is not None:
+                hit_pig.relocate(pigs)
+                self.score += HIT_SCORE
+            if not bird.active:
+                self.projectile = None
+        return hit_pig
+
+
+def simulate_game(seed, shots, pig_count=PIG_COUNT, world_cls=World):
+    """不繪圖地模擬一整局並回傳分數
+
+    shots 為 [(dx, dy), ...] 或含發射時間點的 [(dx, dy, tick), ...]；
+    省略 tick 時在上一隻鳥結束後立即發射。world_cls 可換成 column_world.ColumnWorld。
+    """
+    if len(shots) > MAX_SHOTS:
+        raise ReplayError('Too many shots.')
+    world = world_cls(seed, pig_count)
+    for shot in shots:
+        tick = shot[2] if len(shot) > 2 else None
+        while world.projectile is not None or (tick is not None and world.tick < tick):
+            world.step()
+        if tick is not None and world.tick != tick:
+            raise ReplayError('Shot released while a bird was still in flight.')
+        world.launch(shot[0], shot[1])
+    while world.projectile is not None:
+        world.step()
+    return world.score
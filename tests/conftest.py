@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# app.py 匯入時就讀取設定並開啟資料庫：改用暫存目錄，bcrypt 以最低成本在呼叫端執行緒計算，分數同步寫入
+_TMP = tempfile.mkdtemp(prefix='angrybird-tests-')
+os.environ.update({
+    'DB_PATH': os.path.join(_TMP, 'database.db'),
+    'ARCHIVE_DIR': os.path.join(_TMP, 'archive'),
+    'BCRYPT_ROUNDS': '4',
+    'BCRYPT_WORKERS': '0',
+    'SCORE_WRITE_MODE': 'sync',
+    'REQUIRE_REPLAY': '0',
+})
+
+
+@pytest.fixture
+def web():
+    """app 模組；每個測試前清空所有資料表與行程內的英雄榜快取、名次索引"""
+    import app
+    with app.db.atomic():
+        for model in (app.Replay, app.ReplayRejection, app.ScoreSubmission, app.PeriodBest, app.PeriodResult,
+                      app.ArchiveSummary, app.UserBest, app.Score, app.User):
+            model.delete().execute()
+    app.leaderboard_cache.invalidate()
+    for cache in app.period_caches.values():
+        cache.invalidate()
+    app.late_rollover.clear()
+    app.rank_index.load([])
+    yield app
+    app.db.close()
+
+
+@pytest.fixture
+def player(web):
+    """已登入的玩家：(user_id, username, test client)"""
+    user = web.User.create(username='player', password_hash='x')
+    client = web.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user.id
+        sess['username'] = user.username
+    return user.id, user.username, client
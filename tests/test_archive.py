@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from archive import ArchiveReader, ScoreArchiver, month_bounds
+from database import create_database
+
+SCHEMA = (
+    'CREATE TABLE score (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, score_value INTEGER NOT NULL, '
+    'timestamp DATETIME NOT NULL)',
+    'CREATE TABLE replay (score_id INTEGER PRIMARY KEY, data BLOB NOT NULL)',
+    'CREATE TABLE archivesummary (month VARCHAR(7) NOT NULL, user_id INTEGER NOT NULL, games INTEGER NOT NULL, '
+    'best_score INTEGER NOT NULL, best_at DATETIME NOT NULL, PRIMARY KEY (month, user_id))',
+)
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = create_database(str(tmp_path / 'main.db'), pooled=False)
+    db.connect()
+    for statement in SCHEMA:
+        db.execute_sql(statement)
+    start = datetime(2024, 1, 20)
+    with db.atomic():
+        for i in range(1, 301):
+            # 每 8 小時一筆，跨 2024 年 1 ~ 4 月
+            db.execute_sql('INSERT INTO score (id, user_id, score_value, timestamp) VALUES (?, ?, ?, ?)',
+                           (i, i % 7, (i * 37) % 500, str(start + timedelta(hours=8 * i))))
+            if i % 3 == 0:
+                db.execute_sql('INSERT INTO replay (score_id, data) VALUES (?, ?)', (i, b'blob-%d' % i))
+    yield db
+    db.close()
+
+
+def rows(db, sql):
+    return db.execute_sql(sql).fetchall()
+
+
+def test_month_bounds():
+    assert month_bounds('2024-02') == ('2024-02-01 00:00:00', '2024-03-01 00:00:00')
+    assert month_bounds('2023-12') == ('2023-12-01 00:00:00', '2024-01-01 00:00:00')
+
+
+def test_archive_moves_old_rows_and_summarises(db, tmp_path):
+    expected = rows(db, "SELECT substr(timestamp, 1, 7), user_id, COUNT(*), MAX(score_value) FROM score "
+                        "WHERE timestamp < '2024-03-15' GROUP BY 1, 2 ORDER BY 1, 2")
+    kept = rows(db, "SELECT COUNT(*) FROM score WHERE timestamp >= '2024-03-15'")[0][0]
+    archiver = ScoreArchiver(str(tmp_path / 'archive'), batch_size=17)
+
+    moved = archiver.archive(db, datetime(2024, 3, 15))
+
+    assert sorted(moved) == ['2024-01', '2024-02', '2024-03']
+    assert sum(moved.values()) == sum(games for _, _, games, _ in expected)
+    assert rows(db, 'SELECT COUNT(*) FROM score')[0][0] == kept
+    assert rows(db, "SELECT COUNT(*) FROM replay WHERE score_id NOT IN (SELECT id FROM score)")[0][0] == 0
+    assert rows(db, 'SELECT month, user_id, games, best_score FROM archivesummary ORDER BY 1, 2') == expected
+
+    reader = ArchiveReader(str(tmp_path / 'archive'))
+    assert reader.months() == ['2024-01', '2024-02', '2024-03']
+    archived = reader.scores('2024-02', limit=1000)
+    assert len(archived) == moved['2024-02']
+    assert reader.query('2024-02', 'SELECT COUNT(*) FROM {schema}.replay')[0][0] > 0
+    with pytest.raises(KeyError):
+        reader.scores('2023-12')
+
+
+def test_rerun_is_idempotent(db, tmp_path):
+    archiver = ScoreArchiver(str(tmp_path / 'archive'), batch_size=50)
+    archiver.archive(db, datetime(2024, 3, 15))
+    summary = rows(db, 'SELECT * FROM archivesummary ORDER BY month, user_id')
+
+    assert sum(archiver.archive(db, datetime(2024, 3, 15)).values()) == 0
+    assert rows(db, 'SELECT * FROM archivesummary ORDER BY month, user_id') == summary
+    reader = ArchiveReader(str(tmp_path / 'archive'))
+    assert sum(len(reader.scores(month, limit=1000)) for month in reader.months()) == \
+        sum(games for _, _, games, _, _ in summary)
+
+
+def test_rerun_after_interrupted_batch(db, tmp_path, monkeypatch):
+    archiver = ScoreArchiver(str(tmp_path / 'archive'), batch_size=20)
+    expected_games = rows(db, "SELECT COUNT(*) FROM score WHERE timestamp < '2024-02-01'")[0][0]
+    original = ScoreArchiver._move_batch
+    calls = []
+
+    def interrupted(self, db, month):
+        # 第二批寫入歸檔檔後、刪除主資料庫前中斷
+        calls.append(month)
+        if len(calls) == 2:
+            with db.atomic():
+                db.execute_sql('INSERT OR IGNORE INTO archive.score (id, user_id, score_value, timestamp) '
+                               'SELECT id, user_id, score_value, timestamp FROM main.score '
+                               'WHERE id IN temp.archive_batch')
+            raise RuntimeError('interrupted')
+        return original(self, db, month)
+
+    monkeypatch.setattr(ScoreArchiver, '_move_batch', interrupted)
+    with pytest.raises(RuntimeError):
+        archiver.archive(db, datetime(2024, 2, 1))
+    monkeypatch.setattr(ScoreArchiver, '_move_batch', original)
+
+    archiver.archive(db, datetime(2024, 2, 1))
+    reader = ArchiveReader(str(tmp_path / 'archive'))
+    archived = reader.scores('2024-01', limit=1000)
+    assert len(archived) == len({row[0] for row in archived}) == expected_games
+    assert rows(db, "SELECT SUM(games) FROM archivesummary WHERE month = '2024-01'")[0][0] == expected_games
+    assert rows(db, "SELECT COUNT(*) FROM score WHERE timestamp < '2024-02-01'")[0][0] == 0
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+
+def add_scores(web, rows):
+    web.Score.insert_many(rows, fields=[web.Score.user, web.Score.score_value, web.Score.timestamp]).execute()
+
+
+def bests(web):
+    return {b.user_id: b.best_score for b in web.UserBest.select()}
+
+
+def test_backfill_user_best_from_history(web):
+    alice = web.User.create(username='alice', password_hash='x')
+    bob = web.User.create(username='bob', password_hash='x')
+    old = datetime(2024, 1, 1)
+    add_scores(web, [(alice.id, 10, old), (alice.id, 70, old + timedelta(hours=1)), (alice.id, 40, old),
+                     (bob.id, 20, old)])
+    assert web.backfill_user_best() == 2
+    assert bests(web) == {alice.id: 70, bob.id: 20}
+    best = web.UserBest.get(web.UserBest.user == alice.id)
+    assert best.achieved_at == old + timedelta(hours=1)
+    # 重跑結果相同
+    assert web.backfill_user_best() == 2
+    assert bests(web) == {alice.id: 70, bob.id: 20}
+
+
+def test_backfill_includes_archived_months(web):
+    alice = web.User.create(username='alice', password_hash='x')
+    carol = web.User.create(username='carol', password_hash='x')
+    add_scores(web, [(alice.id, 30, datetime(2024, 6, 1))])
+    web.ArchiveSummary.insert_many([('2024-01', alice.id, 5, 90, datetime(2024, 1, 3)),
+                                    ('2024-02', alice.id, 2, 20, datetime(2024, 2, 3)),
+                                    ('2024-01', carol.id, 1, 15, datetime(2024, 1, 9))],
+                                   fields=[web.ArchiveSummary.month, web.ArchiveSummary.user,
+                                           web.ArchiveSummary.games, web.ArchiveSummary.best_score,
+                                           web.ArchiveSummary.best_at]).execute()
+    assert web.backfill_user_best() == 2
+    assert bests(web) == {alice.id: 90, carol.id: 15}
+
+
+def test_backfill_period_best_only_current_periods(web):
+    alice = web.User.create(username='alice', password_hash='x')
+    now = datetime.now()
+    add_scores(web, [(alice.id, 50, now), (alice.id, 80, now - timedelta(days=400))])
+    web.backfill_period_best()
+    rows = {(b.period, b.period_start): b.best_score for b in web.PeriodBest.select()}
+    assert rows == {('day', web.period_start('day')): 50, ('week', web.period_start('week')): 50}
+
+
+def test_startup_backfills_empty_user_best(web):
+    alice = web.User.create(username='alice', password_hash='x')
+    add_scores(web, [(alice.id, 60, datetime.now())])
+    web.db.close()
+    web.initialize_db(web.db)
+    assert bests(web) == {alice.id: 60}
+
+    # UserBest 已有資料時啟動不會重建
+    web.UserBest.update(best_score=1).execute()
+    web.db.close()
+    web.initialize_db(web.db)
+    assert bests(web) == {alice.id: 1}
+
+
+def test_record_user_best_keeps_maximum(web):
+    alice = web.User.create(username='alice', password_hash='x')
+    now = datetime.now()
+    for score in (40, 90, 60):
+        web.record_user_best(alice.id, score, now)
+    assert bests(web) == {alice.id: 90}
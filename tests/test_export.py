@@ -0,0 +1,62 @@
+import csv
+import gzip
+import io
+import json
+import zlib
+from datetime import datetime
+
+import pytest
+
+from export import ExportError, encode, gzip_chunks
+
+COLUMNS = ('id', 'username', 'score_value', 'timestamp')
+BATCHES = [
+    [(1, 'alice', 100, datetime(2024, 5, 1, 12, 0, 0)), (2, '小明', 50, datetime(2024, 5, 1, 12, 0, 1, 500))],
+    [],
+    [(3, 'bob, "the builder"', 70, datetime(2024, 5, 2))],
+]
+
+
+def test_ndjson_one_object_per_line():
+    data = b''.join(encode('ndjson', COLUMNS, BATCHES)).decode('utf-8')
+    rows = [json.loads(line) for line in data.splitlines()]
+    assert data.endswith('\n')
+    assert [row['id'] for row in rows] == [1, 2, 3]
+    assert rows[1] == {'id': 2, 'username': '小明', 'score_value': 50, 'timestamp': '2024-05-01T12:00:01.000500'}
+
+
+def test_csv_header_and_quoting():
+    data = b''.join(encode('csv', COLUMNS, BATCHES)).decode('utf-8')
+    rows = list(csv.reader(io.StringIO(data)))
+    assert rows[0] == list(COLUMNS)
+    assert rows[3] == ['3', 'bob, "the builder"', '70', '2024-05-02T00:00:00']
+    assert len(rows) == 4
+
+
+def test_csv_without_rows_still_has_header():
+    assert b''.join(encode('csv', COLUMNS, [])) == b'id,username,score_value,timestamp\n'
+    assert b''.join(encode('ndjson', COLUMNS, [[]])) == b''
+
+
+def test_one_chunk_per_batch():
+    assert len(list(encode('ndjson', COLUMNS, BATCHES))) == 2
+
+
+@pytest.mark.parametrize('fmt', ['ndjson', 'csv'])
+def test_gzip_matches_plain_output(fmt):
+    plain = b''.join(encode(fmt, COLUMNS, BATCHES))
+    compressed = b''.join(gzip_chunks(encode(fmt, COLUMNS, BATCHES)))
+    assert gzip.decompress(compressed) == plain
+
+
+def test_gzip_chunks_can_be_decoded_incrementally():
+    chunks = [b'first batch\n', b'second batch\n']
+    decoder = zlib.decompressobj(31)
+    out = list(gzip_chunks(iter(chunks)))
+    # 每個輸入區塊都已 flush，收到對應的輸出後就能解出該區塊
+    assert decoder.decompress(out[0]) == chunks[0]
+    assert decoder.decompress(b''.join(out[1:])) == chunks[1]
+
+
+def test_export_error_is_value_error():
+    assert issubclass(ExportError, ValueError)
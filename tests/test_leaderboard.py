@@ -0,0 +1,83 @@
+from leaderboard import LeaderboardCache
+
+
+class Loader:
+    """模擬 load_top_scores：rows 為 [(key, username, score), ...]，依分數由高到低回傳"""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.calls = 0
+
+    def __call__(self, limit):
+        self.calls += 1
+        return sorted(self.rows, key=lambda row: -row[2])[:limit]
+
+
+def board(cache, n=None):
+    return [(row['username'], row['score']) for row in cache.top(n)]
+
+
+def test_loads_once_and_serves_from_cache():
+    loader = Loader([(1, 'alice', 30), (2, 'bob', 20), (3, 'carol', 10)])
+    cache = LeaderboardCache(loader, size=2, ttl=0)
+    assert board(cache) == [('alice', 30), ('bob', 20)]
+    assert board(cache, 1) == [('alice', 30)]
+    assert loader.calls == 1
+    assert cache.stats()['hits'] == 1
+
+
+def test_offer_updates_in_place():
+    cache = LeaderboardCache(Loader([(1, 'alice', 30), (2, 'bob', 20)]), size=3, ttl=0)
+    cache.rebuild()
+    assert cache.offer(3, 'carol', 25) is True
+    assert board(cache) == [('alice', 30), ('carol', 25), ('bob', 20)]
+    # 榜滿且分數不夠高
+    assert cache.offer(4, 'dave', 5) is False
+    # 同一位玩家只佔一列，刷新最高分時移動位置
+    assert cache.offer(2, 'bob', 40) is True
+    assert board(cache) == [('bob', 40), ('alice', 30), ('carol', 25)]
+    assert cache.offer(2, 'bob', 35) is False
+
+
+def test_equal_scores_keep_earlier_entry_first():
+    cache = LeaderboardCache(Loader([(1, 'alice', 30)]), size=3, ttl=0)
+    cache.rebuild()
+    cache.offer(2, 'bob', 30)
+    assert board(cache) == [('alice', 30), ('bob', 30)]
+
+
+def test_version_changes_only_with_content():
+    loader = Loader([(1, 'alice', 30)])
+    cache = LeaderboardCache(loader, size=2, ttl=0)
+    cache.rebuild()
+    version = cache.version
+    cache.rebuild()
+    assert cache.version == version
+    cache.offer(1, 'alice', 10)
+    assert cache.version == version
+    cache.offer(2, 'bob', 20)
+    assert cache.version == version + 1
+    assert cache.top_with_version()[0] == cache.version
+
+
+def test_offer_before_load_is_ignored_until_rebuild():
+    loader = Loader([(1, 'alice', 30)])
+    cache = LeaderboardCache(loader, size=2, ttl=0)
+    assert cache.offer(2, 'bob', 50) is False
+    loader.rows.append((2, 'bob', 50))
+    assert board(cache) == [('bob', 50), ('alice', 30)]
+
+
+def test_invalidate_and_ttl_reload():
+    loader = Loader([(1, 'alice', 30)])
+    cache = LeaderboardCache(loader, size=2, ttl=0)
+    cache.top()
+    cache.invalidate()
+    cache.top()
+    assert loader.calls == 2
+
+    expiring = LeaderboardCache(loader, size=2, ttl=0.0001)
+    expiring.top()
+    expiring._loaded_at -= 1
+    expiring.top()
+    assert loader.calls == 4
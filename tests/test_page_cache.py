@@ -0,0 +1,49 @@
+import gzip
+
+from page_cache import PageCache
+
+
+def test_etag_depends_on_every_part():
+    cache = PageCache(token='a')
+    etag = cache.etag('index', 3)
+    assert etag == cache.etag('index', 3)
+    assert len({etag, cache.etag('index', 4), cache.etag('game', 3), cache.etag('index', 3, user='alice'),
+                PageCache(token='b').etag('index', 3)}) == 5
+
+
+def test_get_only_returns_current_version():
+    cache = PageCache(token='t')
+    assert cache.get('index', 1) is None
+    cache.put('index', 1, '<p>one</p>')
+    assert cache.get('index', 1).body == b'<p>one</p>'
+    assert cache.get('index', 2) is None
+    cache.put('index', 2, '<p>two</p>')
+    assert cache.get('index', 1) is None
+    assert cache.get('index', 2).body == b'<p>two</p>'
+    stats = cache.stats()
+    assert (stats['page_hits'], stats['page_misses'], stats['pages']) == (2, 3, 1)
+
+
+def test_gzip_only_above_threshold():
+    cache = PageCache(token='t', min_gzip_bytes=100)
+    assert cache.put('small', 1, 'x' * 99).gzip_body is None
+    html = '<li>遊戲</li>' * 100
+    entry = cache.put('large', 1, html)
+    assert gzip.decompress(entry.gzip_body) == html.encode('utf-8')
+    # mtime=0：同樣的內容壓縮結果相同
+    assert cache.put('large', 2, html).gzip_body == entry.gzip_body
+
+
+def test_fragment_renders_once_per_version():
+    cache = PageCache(token='t')
+    renders = []
+
+    def render():
+        renders.append(1)
+        return f'render {len(renders)}'
+
+    assert cache.fragment('table', 1, render) == 'render 1'
+    assert cache.fragment('table', 1, render) == 'render 1'
+    assert cache.fragment('table', 2, render) == 'render 2'
+    stats = cache.stats()
+    assert (stats['fragment_hits'], stats['fragment_misses'], stats['fragments']) == (1, 2, 1)
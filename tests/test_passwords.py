@@ -0,0 +1,29 @@
+import time
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+import pytest
+
+from passwords import PasswordHasher, PasswordPoolBusy
+
+
+def test_inline_hash_and_verify():
+    hasher = PasswordHasher(rounds=4, workers=0)
+    hashed = hasher.hash('secret')
+    assert hasher.verify('secret', hashed)
+    assert not hasher.verify('wrong', hashed)
+    assert not hasher.needs_rehash(hashed)
+    assert PasswordHasher(rounds=5, workers=0).needs_rehash(hashed)
+
+
+def test_timed_out_job_keeps_its_slot_until_it_finishes():
+    hasher = PasswordHasher(rounds=4, workers=1, max_pending=1, timeout=0.2).start()
+    try:
+        with pytest.raises(FuturesTimeoutError):
+            hasher._run(time.sleep, 1.0)
+        # 逾時的工作仍在 worker 中執行，名額不會提前釋放
+        with pytest.raises(PasswordPoolBusy):
+            hasher.hash('secret')
+        time.sleep(1.5)
+        assert hasher.verify('secret', hasher.hash('secret'))
+    finally:
+        hasher.shutdown()
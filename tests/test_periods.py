@@ -0,0 +1,95 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from periods import PERIODS, period_start, previous_start
+
+
+def test_day_boundaries():
+    assert period_start('day', datetime(2024, 3, 5, 0, 0)) == date(2024, 3, 5)
+    assert period_start('day', datetime(2024, 3, 5, 23, 59, 59, 999999)) == date(2024, 3, 5)
+    assert period_start('day', datetime(2024, 3, 6, 0, 0)) == date(2024, 3, 6)
+
+
+def test_week_starts_on_monday():
+    # 2024-03-04 是星期一
+    monday = date(2024, 3, 4)
+    for day in range(4, 11):
+        assert period_start('week', datetime(2024, 3, day, 12)) == monday
+    assert period_start('week', datetime(2024, 3, 10, 23, 59, 59)) == monday
+    assert period_start('week', datetime(2024, 3, 11, 0, 0)) == date(2024, 3, 11)
+
+
+def test_week_across_month_and_year():
+    assert period_start('week', datetime(2024, 3, 2)) == date(2024, 2, 26)
+    assert period_start('week', datetime(2025, 1, 1)) == date(2024, 12, 30)
+
+
+def test_accepts_date_and_defaults_to_now():
+    assert period_start('day', date(2024, 2, 29)) == date(2024, 2, 29)
+    assert period_start('week', date(2024, 2, 29)) == date(2024, 2, 26)
+    assert period_start('day') == datetime.now().date()
+
+
+def test_previous_start():
+    assert previous_start('day', date(2024, 3, 1)) == date(2024, 2, 29)
+    assert previous_start('week', date(2024, 1, 1)) == date(2023, 12, 25)
+    for period in PERIODS:
+        start = period_start(period, datetime(2024, 7, 17))
+        assert period_start(period, previous_start(period, start)) == previous_start(period, start)
+
+
+def test_unknown_period():
+    with pytest.raises(ValueError):
+        period_start('month', datetime(2024, 1, 1))
+
+
+def results(web, period, start):
+    query = (web.PeriodResult
+             .select(web.PeriodResult.user, web.PeriodResult.score)
+             .where((web.PeriodResult.period == period) & (web.PeriodResult.period_start == start))
+             .order_by(web.PeriodResult.rank))
+    return list(query.tuples())
+
+
+def test_rollover_closes_finished_periods(web):
+    alice = web.User.create(username='alice', password_hash='x')
+    bob = web.User.create(username='bob', password_hash='x')
+    now = datetime.now()
+    old = now - timedelta(days=8)
+    web.save_scores([(alice.id, 40, old, None), (bob.id, 70, old, None), (alice.id, 50, old, None),
+                     (alice.id, 10, now, None)])
+    assert web.rollover_periods() == 2
+    for period in PERIODS:
+        assert results(web, period, period_start(period, old)) == [(bob.id, 70), (alice.id, 50)]
+    # 目前區間的 PeriodBest 保留，已結算的刪除
+    assert {(b.period, b.period_start) for b in web.PeriodBest.select()} == {(p, period_start(p)) for p in PERIODS}
+    # 重複執行是安全的
+    assert web.rollover_periods() == 0
+    assert results(web, 'day', period_start('day', old)) == [(bob.id, 70), (alice.id, 50)]
+
+
+def test_late_score_merges_into_closed_period(web, monkeypatch):
+    alice = web.User.create(username='alice', password_hash='x')
+    bob = web.User.create(username='bob', password_hash='x')
+    carol = web.User.create(username='carol', password_hash='x')
+    old = datetime.now() - timedelta(days=8)
+    web.save_scores([(alice.id, 50, old, None), (bob.id, 30, old, None)])
+    web.rollover_periods()
+
+    def broken(now=None):
+        raise RuntimeError('rollover failed')
+
+    # 延遲寫入不在寫入路徑上結算：結算失敗也不影響已提交的分數
+    monkeypatch.setattr(web, 'rollover_periods', broken)
+    web.save_scores([(bob.id, 90, old, None), (carol.id, 20, old, None)])
+    assert web.Score.select().count() == 4
+    assert web.late_rollover.is_set()
+    assert results(web, 'day', period_start('day', old)) == [(alice.id, 50), (bob.id, 30)]
+
+    monkeypatch.undo()
+    web.period_board('day')
+    assert not web.late_rollover.is_set()
+    for period in PERIODS:
+        assert results(web, period, period_start(period, old)) == [(bob.id, 90), (alice.id, 50), (carol.id, 20)]
+    assert not web.PeriodBest.select().where(web.PeriodBest.period_start < period_start('week')).exists()
@@ -0,0 +1,56 @@
+from random import Random
+
+from rank_index import RankIndex
+
+
+def expected_rank(best, score):
+    """以排序後的列表直接計算：同分同名次"""
+    scores = sorted(best.values(), reverse=True)
+    above = sum(1 for s in scores if s > score)
+    at_or_below = len(scores) - above
+    return {
+        'rank': above + 1,
+        'total': len(scores),
+        'percentile': round(100.0 * at_or_below / len(scores), 2) if scores else 100.0,
+    }
+
+
+def test_empty_index():
+    index = RankIndex()
+    assert len(index) == 0
+    assert index.rank_of(100) == {'rank': 1, 'total': 0, 'percentile': 100.0}
+
+
+def test_rank_of_matches_sorted_list():
+    rng = Random(3)
+    best = {user_id: rng.randrange(0, 2000, 10) for user_id in range(500)}
+    index = RankIndex()
+    index.load(best.items())
+    assert len(index) == len(best)
+    for score in list(best.values())[:100] + [-1, 0, 5, 1995, 5000]:
+        assert index.rank_of(score) == expected_rank(best, score)
+
+
+def test_update_only_moves_personal_best():
+    rng = Random(7)
+    best = {}
+    index = RankIndex()
+    for _ in range(2000):
+        user_id, score = rng.randrange(200), rng.randrange(0, 1000, 10)
+        improved = user_id not in best or score > best[user_id]
+        assert index.update(user_id, score) is improved
+        if improved:
+            best[user_id] = score
+    assert len(index) == len(best)
+    for user_id, score in best.items():
+        assert index.best_of(user_id) == score
+        assert index.rank_of(score) == expected_rank(best, score)
+
+
+def test_ties_share_rank():
+    index = RankIndex()
+    index.load([(1, 300), (2, 200), (3, 200), (4, 100)])
+    assert index.rank_of(300)['rank'] == 1
+    assert index.rank_of(200)['rank'] == 2
+    assert index.rank_of(100)['rank'] == 4
+    assert index.rank_of(250) == {'rank': 2, 'total': 4, 'percentile': 75.0}
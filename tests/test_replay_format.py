@@ -0,0 +1,51 @@
+import struct
+from random import Random
+
+import pytest
+
+from replay_format import MAGIC, VERSION, decode_replay, encode_replay
+from static.physics import MAX_PULL, MAX_SHOTS, ReplayError, quantize_pull
+
+
+def random_shots(rng, count):
+    shots, tick = [], 0
+    for _ in range(count):
+        tick += rng.randrange(0, 400)
+        shots.append((quantize_pull(rng.uniform(-MAX_PULL, MAX_PULL)),
+                      quantize_pull(rng.uniform(-MAX_PULL, MAX_PULL)), tick))
+    return shots
+
+
+def test_round_trip():
+    rng = Random(11)
+    for count in range(MAX_SHOTS + 1):
+        seed = rng.getrandbits(32)
+        shots = random_shots(rng, count)
+        assert decode_replay(encode_replay(seed, shots)) == (seed, shots)
+
+
+def test_round_trip_extremes():
+    shots = [(MAX_PULL, -MAX_PULL, 0), (-MAX_PULL, MAX_PULL, 0), (0.125, -0.125, 65535)]
+    assert decode_replay(encode_replay(2 ** 32 - 1, shots)) == (2 ** 32 - 1, shots)
+
+
+def test_ten_shots_take_70_bytes():
+    assert len(encode_replay(1, random_shots(Random(1), 10))) == 70
+
+
+def test_decode_accepts_memoryview():
+    blob = encode_replay(5, [(1.5, -2.25, 3)])
+    assert decode_replay(memoryview(blob)) == (5, [(1.5, -2.25, 3)])
+
+
+@pytest.mark.parametrize('blob', [
+    b'',
+    b'ABRP',
+    b'XXXX' + bytes(6),
+    struct.pack('<4sBBI', MAGIC, VERSION + 1, 0, 1),
+    struct.pack('<4sBBI', MAGIC, VERSION, 2, 1) + bytes(6),
+    encode_replay(1, [(1, 1, 1)]) + b'\0',
+])
+def test_malformed_blobs_raise(blob):
+    with pytest.raises(ReplayError):
+        decode_replay(blob)
@@ -0,0 +1,40 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from score_writer import ScoreWriter, WriterBusy
+
+
+def test_full_queue_rejects_without_blocking():
+    writer = ScoreWriter(lambda batch: None, max_queue=2, timestamp_fn=lambda row: row[1])
+    first = datetime(2024, 1, 1)
+    writer.submit((1, first))
+    writer.submit((2, datetime(2024, 1, 2)))
+    started = time.perf_counter()
+    with pytest.raises(WriterBusy):
+        writer.submit((3, datetime(2023, 1, 1)))
+    assert time.perf_counter() - started < 0.1
+    # 排不進佇列的那筆不會留在待寫入的時間戳中
+    assert writer.oldest_pending() == first
+
+
+def test_flushes_batches_and_rejects_after_stop():
+    flushed = []
+    done = threading.Event()
+
+    def flush(batch):
+        flushed.extend(batch)
+        if len(flushed) == 3:
+            done.set()
+
+    writer = ScoreWriter(flush, batch_size=2, interval_ms=10).start()
+    for user_id in (1, 2, 3):
+        writer.submit((user_id, 10))
+    assert done.wait(2)
+    writer.stop()
+    assert flushed == [(1, 10), (2, 10), (3, 10)]
+    assert writer.oldest_pending() is None
+    with pytest.raises(WriterBusy):
+        writer.submit((4, 10))
@@ -0,0 +1,83 @@
+from score_writer import WriterBusy
+
+
+def submit(client, items):
+    response = client.post('/submit_scores', json={'scores': items})
+    return response.status_code, response.get_json()
+
+
+def statuses(body):
+    return [(result['key'], result['status']) for result in body['results']]
+
+
+def test_saves_new_keys(web, player):
+    user_id, _, client = player
+    status, body = submit(client, [{'key': 'a', 'score': 30}, {'key': 'b', 'score': 50}])
+    assert status == 200
+    assert statuses(body) == [('a', 'saved'), ('b', 'saved')]
+    assert sorted(s.score_value for s in web.Score.select()) == [30, 50]
+    assert web.UserBest.get(web.UserBest.user == user_id).best_score == 50
+
+
+def test_duplicate_keys_are_not_scored_twice(web, player):
+    _, _, client = player
+    submit(client, [{'key': 'a', 'score': 30}])
+    status, body = submit(client, [{'key': 'a', 'score': 30}, {'key': 'b', 'score': 40}])
+    assert status == 200
+    assert statuses(body) == [('a', 'duplicate'), ('b', 'saved')]
+    # 同一個請求內重複的 key 只處理第一筆
+    status, body = submit(client, [{'key': 'c', 'score': 10}, {'key': 'c', 'score': 99}])
+    assert statuses(body) == [('c', 'saved')]
+    assert sorted(s.score_value for s in web.Score.select()) == [10, 30, 40]
+
+
+def test_keys_are_per_user(web, player):
+    _, _, client = player
+    other = web.User.create(username='other', password_hash='x')
+    submit(client, [{'key': 'a', 'score': 30}])
+    body, status = web.handle_bulk_submission(other.id, other.username, {'scores': [{'key': 'a', 'score': 30}]})
+    assert statuses(body) == [('a', 'saved')]
+
+
+def test_busy_replay_queue_releases_key_for_retry(web, player, monkeypatch):
+    _, _, client = player
+    replay = {'key': 'r', 'score': 50, 'seed': 1, 'shots': []}
+
+    def busy(job):
+        raise WriterBusy('Replay queue is full.')
+
+    monkeypatch.setattr(web.replay_verifier, 'submit', busy)
+    status, body = submit(client, [replay, {'key': 'p', 'score': 20}])
+    assert status == 200
+    assert statuses(body) == [('r', 'retry'), ('p', 'saved')]
+    assert [s.key for s in web.ScoreSubmission.select()] == ['p']
+
+    queued = []
+    monkeypatch.setattr(web.replay_verifier, 'submit', queued.append)
+    status, body = submit(client, [replay])
+    assert statuses(body) == [('r', 'queued')]
+    assert len(queued) == 1 and queued[0].score == 50
+
+
+def test_invalid_items_do_not_reject_the_batch(web, player):
+    _, _, client = player
+    status, body = submit(client, [
+        {'key': 'ok', 'score': 10},
+        {'score': 20},
+        {'key': 'x' * 65, 'score': 30},
+        {'key': 'neg', 'score': -5},
+        {'key': 'bad', 'score': 'abc'},
+        {'key': 'shots', 'score': 10, 'seed': -1, 'shots': []},
+    ])
+    assert status == 200
+    assert statuses(body) == [('ok', 'saved'), (None, 'invalid'), ('x' * 65, 'invalid'), ('neg', 'invalid'),
+                              ('bad', 'invalid'), ('shots', 'invalid')]
+    assert [s.score_value for s in web.Score.select()] == [10]
+
+
+def test_request_level_errors(web, player):
+    _, _, client = player
+    assert submit(client, [])[0] == 400
+    assert submit(client, [{'key': str(i), 'score': 1} for i in range(web.SUBMIT_BATCH_MAX + 1)])[0] == 413
+    assert client.post('/submit_scores', data='x').status_code == 415
+    assert web.app.test_client().post('/submit_scores', json={'scores': []}).status_code == 302